@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+非同步多閘道輪詢效能測試：單一事件迴圈線程輪詢大量 Modbus TCP 端點
+
+模擬閘道在另一個行程中執行 (避免與輪詢引擎搶同一個 CPU 核心)，每個端點各自一條 TCP 連線。
+輸出每秒完成的請求數、成功率、延遲百分位數，以及輪詢行程的線程數與 CPU 使用率。
+
+用法: python bench_async_poller.py [端點數] [輪詢間隔秒數] [測試秒數]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+# 添加路徑
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'rs485_tester'))
+
+from async_poller import AsyncEndpoint, AsyncPoller
+from latency_histogram import LatencyHistogram
+
+
+def run_gateway(port_queue):
+    """模擬閘道：回應所有讀取請求"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(6)
+                request = header + await reader.readexactly((header[4] << 8) | header[5])
+                pdu = bytes((request[6], request[7], 0x02, 0x00, 0x01))
+                writer.write(request[:2] + b'\x00\x00' + len(pdu).to_bytes(2, 'big') + pdu)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+    
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+    
+    asyncio.run(serve())
+
+
+def main():
+    endpoints = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+    requests = [bytes.fromhex("010300000001"), bytes.fromhex("010400000002")]
+    
+    port_queue = multiprocessing.Queue()
+    gateway = multiprocessing.Process(target=run_gateway, args=(port_queue,), daemon=True)
+    gateway.start()
+    port = port_queue.get(timeout=10)
+    
+    poller = AsyncPoller()
+    poller.start()
+    for index in range(endpoints):
+        poller.add_endpoint(AsyncEndpoint(f"gw{index}", "127.0.0.1", port))
+        # 第一輪錯開，避免所有端點同時建立連線
+        poller.poll(f"gw{index}", requests, interval, start_delay=interval * index / endpoints)
+    
+    print(f"=== 非同步閘道輪詢: {endpoints} 個端點，每 {interval}s 各 {len(requests)} 筆請求 ===\n")
+    time.sleep(interval)  # 暖機：等所有端點建立連線
+    poller.results.drain()
+    
+    histogram = LatencyHistogram()
+    completed = failed = 0
+    threads = threading.active_count()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    while time.perf_counter() - wall_start < duration:
+        time.sleep(0.2)
+        for result in poller.results.drain():
+            if result.success:
+                completed += 1
+                histogram.record(result.transaction.latency_ms)
+            else:
+                failed += 1
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    skipped = sum(endpoint.skipped for endpoint in poller.endpoints.values())
+    
+    poller.stop()
+    gateway.terminate()
+    
+    target = endpoints * len(requests) / interval
+    summary = histogram.summary()
+    print(f"{'目標請求數':24} {target:10.0f} 筆/秒")
+    print(f"{'實際完成':24} {completed / wall:10.0f} 筆/秒")
+    print(f"{'失敗/逾時':24} {failed:10d} 筆")
+    print(f"{'跳過的週期':24} {skipped:10d}")
+    print(f"{'延遲 P50/P95/P99':24} {summary['p50']:6.1f} / {summary['p95']:.1f} / {summary['p99']:.1f} ms")
+    print(f"{'線程數 (含主線程)':24} {threads:10d}")
+    print(f"{'輪詢行程 CPU 使用率':24} {cpu / wall * 100:9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
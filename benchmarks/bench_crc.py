@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+CRC-16/Modbus 計算效能比較：逐位元迴圈 vs 查表法
+"""
+import os
+import sys
+import timeit
+
+# 添加路徑
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'rs485_tester'))
+
+from data_utils import ModbusCRC
+
+
+def bitwise_crc(data):
+    """原本 _calculate_modbus_crc 的逐位元計算方式"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc >>= 1
+                crc ^= 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def bench(label, func, number):
+    """執行並印出每次呼叫的平均時間"""
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    per_call_us = seconds / number * 1e6
+    print(f"{label:32} {per_call_us:10.2f} µs")
+    return per_call_us
+
+
+def main():
+    frames = {
+        "8 位元組請求": bytes.fromhex("010300000001840A"),
+        "25 位元組回應": bytes(range(25)),
+        "256 位元組最大訊框": bytes(range(256)),
+    }
+    
+    print("=== CRC-16/Modbus 效能比較 ===\n")
+    for name, frame in frames.items():
+        assert bitwise_crc(frame) == ModbusCRC.calculate(frame)
+        print(f"[{name}]")
+        slow = bench("逐位元迴圈", lambda: bitwise_crc(frame), 2000)
+        fast = bench("查表法 ModbusCRC.calculate", lambda: ModbusCRC.calculate(frame), 2000)
+        print(f"{'加速倍數':32} {slow / fast:10.1f}x\n")
+    
+    batch = [bytes.fromhex("01030200017984")] * 1000
+    print("[1000 個 7 位元組回應批次驗證]")
+    slow = bench("逐位元迴圈", lambda: [bitwise_crc(f) == 0 for f in batch], 20)
+    single = bench("ModbusCRC.check 逐一呼叫", lambda: [ModbusCRC.check(f) for f in batch], 20)
+    fast = bench("ModbusCRC.verify_many", lambda: ModbusCRC.verify_many(batch), 20)
+    print(f"{'加速倍數 (vs 逐位元)':32} {slow / fast:10.1f}x")
+    print(f"{'加速倍數 (vs 逐一 check)':32} {single / fast:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,12 @@
 Enhanced RS485/TCP 測試工具 - 清理後的主程式
 """
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 import os
 import threading
 import time
 import datetime
+import functools
 import sys
 import io
 
@@ -16,10 +17,12 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 # 導入模組
 try:
     from .serial_utils import RS485Tester, list_available_ports
+    from .bus_sniffer import BusSniffer
     from .log_exporter import LogToExcelExporter
 except ImportError:
     try:
         from serial_utils import RS485Tester, list_available_ports
+        from bus_sniffer import BusSniffer
         from log_exporter import LogToExcelExporter
     except ImportError:
         # 模擬類別用於展示
@@ -39,6 +42,19 @@ except ImportError:
             def close(self):
                 self.is_connected = False
         
+        class BusSniffer:
+            def __init__(self, port, baudrate, log_file=None, on_frame=None):
+                self.port = port
+                self.baudrate = baudrate
+                self.frame_count = 0
+                self.crc_errors = 0
+                
+            def start(self):
+                pass
+                
+            def close(self):
+                pass
+        
         def list_available_ports():
             return [("COM1", "USB Serial Port"), ("COM3", "Bluetooth Serial"), ("COM5", "Virtual Port")]
         
@@ -52,14 +68,28 @@ except ImportError:
 # 導入自定義模組
 try:
     from .constants import *
-    from .data_utils import DataFormatter, ModbusPacketAnalyzer
-    from .connection_manager import ConnectionManager, TCPConnection
-    from .ui_components import ThemeManager, LogManager, StatusBar, AnalysisPanel
+    from .data_utils import DataFormatter, ModbusPacketAnalyzer, ModbusStreamFramer, ModbusCRC
+    from .connection_manager import ConnectionManager, TCPConnection, ConnectionStats
+    from .async_poller import AsyncPoller, AsyncEndpoint, parse_endpoints
+    from .latency_histogram import LatencyTracker
+    from .scheduler import PeriodicScheduler
+    from .poll_plan import PollPlanCompiler
+    from .broadcast import BroadcastExecutor
+    from .slave_scanner import SlaveScanner, ScanTarget, parse_id_range, probe_timeout
+    from .transport import to_bytes, format_bytes
+    from .ui_components import ThemeManager, LogManager, StatusBar, AnalysisPanel, BufferedLogWriter
 except ImportError:
     from constants import *
-    from data_utils import DataFormatter, ModbusPacketAnalyzer
-    from connection_manager import ConnectionManager, TCPConnection
-    from ui_components import ThemeManager, LogManager, StatusBar, AnalysisPanel
+    from data_utils import DataFormatter, ModbusPacketAnalyzer, ModbusStreamFramer, ModbusCRC
+    from connection_manager import ConnectionManager, TCPConnection, ConnectionStats
+    from async_poller import AsyncPoller, AsyncEndpoint, parse_endpoints
+    from latency_histogram import LatencyTracker
+    from scheduler import PeriodicScheduler
+    from poll_plan import PollPlanCompiler
+    from broadcast import BroadcastExecutor
+    from slave_scanner import SlaveScanner, ScanTarget, parse_id_range, probe_timeout
+    from transport import to_bytes, format_bytes
+    from ui_components import ThemeManager, LogManager, StatusBar, AnalysisPanel, BufferedLogWriter
 
 
 class EnhancedRS485GuiApp:
@@ -84,7 +114,16 @@ class EnhancedRS485GuiApp:
         self.connection_manager = ConnectionManager()
         self.theme_manager = ThemeManager(self.root)
         self.monitoring_active = False
-        self.auto_send_threads = {}  # 追蹤自動發送線程
+        # 定時發送與監控共用一個排程線程
+        self.scheduler = PeriodicScheduler()
+        self.auto_send_jobs = {}  # 追蹤各連線的定時發送排程
+        self.monitor_job = None
+        self.broadcaster = BroadcastExecutor(self.connection_manager, self._execute_for)
+        self.scanner = SlaveScanner()
+        # 大量 TCP 閘道共用一個事件迴圈輪詢，結果由統計更新定期取回
+        self.gateway_poller = AsyncPoller()
+        self.gateway_stats = None
+        self.gateway_failures = {}
         
     def _setup_ui(self):
         """設定使用者介面"""
@@ -190,8 +229,10 @@ class EnhancedRS485GuiApp:
         # 裝置ID選擇器
         ttk.Label(input_frame, text="裝置ID:").pack(side=tk.LEFT)
         self.device_id_var = tk.StringVar(value="01")
+        # 00 為廣播位址：所有從站執行但不回應，發送後不等待逾時
         self.device_id_combo = ttk.Combobox(input_frame, textvariable=self.device_id_var, width=8, 
-                                          values=[f"{i:02X}" for i in range(1, 248)], state="readonly")
+                                          values=[f"{i:02X}" for i in range(MODBUS_BROADCAST_ADDRESS, MODBUS_MAX_SLAVE_ID + 1)],
+                                          state="readonly")
         self.device_id_combo.pack(side=tk.LEFT, padx=(5, 10))
         
         ttk.Label(input_frame, text="指令:").pack(side=tk.LEFT)
@@ -200,6 +241,7 @@ class EnhancedRS485GuiApp:
         
         ttk.Button(input_frame, text="📤 發送", command=self._send_to_selected).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(input_frame, text="📤 廣播", command=self._broadcast_command).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(input_frame, text="🔍 掃描ID", command=self._scan_slaves).pack(side=tk.LEFT, padx=(0, 5))
     
     def _insert_command(self, command_template):
         """插入指令並替換裝置ID"""
@@ -249,22 +291,9 @@ class EnhancedRS485GuiApp:
             # 移除空格並轉換為bytes
             data = bytes.fromhex(data_hex.replace(" ", ""))
             
-            crc = 0xFFFF
-            for byte in data:
-                crc ^= byte
-                for _ in range(8):
-                    if crc & 0x0001:
-                        crc >>= 1
-                        crc ^= 0xA001
-                    else:
-                        crc >>= 1
-            
             # CRC是小端序，先低字節後高字節
-            crc_low = crc & 0xFF
-            crc_high = (crc >> 8) & 0xFF
-            
-            return f"{crc_low:02X} {crc_high:02X}"
-        except:
+            return ModbusCRC.to_bytes(ModbusCRC.calculate(data)).hex(' ').upper()
+        except ValueError:
             return ""
     
     def _add_crc_if_needed(self, command):
@@ -294,30 +323,18 @@ class EnhancedRS485GuiApp:
             validated_command = self._validate_hex_string(command_with_crc)
             
             conn_info = self.connection_manager.get_connection(name)
-            connection = conn_info['connection']
-            conn_type = conn_info['type']
             
             # 記錄發送的完整指令
             timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
             
-            if conn_type == 'TCP':
-                # TCP連線發送
-                data = bytes.fromhex(validated_command.replace(" ", ""))
-                connection.send_data(data)
-                response = connection.receive_data()
-            else:
-                # Serial連線發送
-                connection.send_hex(command_with_crc)
-                response_bytes = connection.receive_response()
-                response = response_bytes.hex(' ').upper() if response_bytes else "無回應"
-            
-            # 記錄交易統計
-            success = response != "無回應" and response != "回應逾時"
-            response_time = 100.0 if success else 0.0  # 簡化的回應時間
+            transaction = self._exchange(conn_info, validated_command)
+            response = self._format_transaction_response(transaction)
+            response_time = transaction.latency_ms or 0.0
             
+            # 記錄交易統計 (實際量測的延遲與轉換時間)
             stats = self.connection_manager.get_statistics(name)
             if stats:
-                stats.add_transaction(success, response_time if success else None)
+                stats.add_exchange(transaction)
             
             # 更新日誌
             self._log_transaction(name, timestamp, command_with_crc, response, response_time)
@@ -381,6 +398,8 @@ class EnhancedRS485GuiApp:
         
         self.monitor_button = ttk.Button(control_frame, text="▶️ 開始監控", command=self._toggle_monitoring)
         self.monitor_button.pack(side=tk.LEFT)
+        self.gateway_button = ttk.Button(control_frame, text="🌐 閘道輪詢", command=self._toggle_gateway_polling)
+        self.gateway_button.pack(side=tk.LEFT, padx=(5, 0))
         
         ttk.Label(control_frame, text="監控間隔:").pack(side=tk.LEFT, padx=(20, 5))
         self.monitor_interval = ttk.Entry(control_frame, width=10)
@@ -388,6 +407,16 @@ class EnhancedRS485GuiApp:
         self.monitor_interval.pack(side=tk.LEFT)
         ttk.Label(control_frame, text="毫秒").pack(side=tk.LEFT)
         
+        ttk.Label(control_frame, text="延遲統計區間:").pack(side=tk.LEFT, padx=(20, 5))
+        window_names = list(LATENCY_WINDOWS) + [LatencyTracker.SESSION]
+        self.latency_window = ttk.Combobox(control_frame, values=window_names, state="readonly", width=12)
+        self.latency_window.set(window_names[0])
+        self.latency_window.pack(side=tk.LEFT)
+        
+        # 排程抖動：實際觸發時間落後排定時間點的分布
+        self.jitter_label = ttk.Label(control_frame, text="")
+        self.jitter_label.pack(side=tk.LEFT, padx=(20, 0))
+        
         # 統計顯示區域
         self._create_statistics_area()
         
@@ -397,17 +426,22 @@ class EnhancedRS485GuiApp:
         stats_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         # 統計樹狀檢視
-        stats_columns = ("sent", "received", "errors", "success_rate", "avg_time")
+        stats_columns = ("sent", "received", "errors", "crc_errors", "truncated", "exceptions",
+                         "success_rate", "p50", "p95", "p99", "max", "avg_turnaround",
+                         "queue_depth", "queue_wait_p95", "queue_dropped")
         self.stats_tree = ttk.Treeview(stats_frame, columns=stats_columns, show="tree headings")
         
         # 設定統計欄位標題
         stats_headers = {
             "#0": "連線", "sent": "已發送", "received": "已接收", 
-            "errors": "錯誤", "success_rate": "成功率%", "avg_time": "平均回應時間(ms)"
+            "errors": "錯誤", "crc_errors": "CRC錯誤", "truncated": "不完整", "exceptions": "例外回應",
+            "success_rate": "成功率%", "p50": "P50(ms)", "p95": "P95(ms)", "p99": "P99(ms)",
+            "max": "最大(ms)", "avg_turnaround": "平均轉換時間(ms)",
+            "queue_depth": "佇列深度", "queue_wait_p95": "排隊P95(ms)", "queue_dropped": "丟棄/合併"
         }
         for col, title in stats_headers.items():
             self.stats_tree.heading(col, text=title)
-            self.stats_tree.column(col, width=120)
+            self.stats_tree.column(col, width=80)
             
         self.stats_tree.pack(fill=tk.BOTH, expand=True)
         
@@ -444,9 +478,12 @@ class EnhancedRS485GuiApp:
         
         if messagebox.askyesno("確認", f"確定要移除連線 '{name}' 嗎？"):
             try:
-                # 停止該連線的自動發送線程
-                if name in self.auto_send_threads:
-                    del self.auto_send_threads[name]
+                # 停止該連線的定時發送排程
+                self._cancel_auto_send(name)
+                
+                log_writer = self.connection_manager.get_connection(name).get('log_writer')
+                if log_writer:
+                    log_writer.stop()
                 
                 self.connection_manager.remove_connection(name)
                 self.log_manager.remove_log_tab(name)
@@ -467,12 +504,21 @@ class EnhancedRS485GuiApp:
             
         # 重新載入連線
         for name, conn_info in self.connection_manager.get_all_connections().items():
-            status = "🟢 連線中" if conn_info.get('connected', False) else "🔴 已中斷"
+            connection = conn_info['connection']
+            if getattr(connection, 'reconnecting', False):
+                status = "🟡 重新連線中"
+            else:
+                status = "🟢 連線中" if conn_info.get('connected', False) else "🔴 已中斷"
             
             stats_text = ""
             stats = self.connection_manager.get_statistics(name)
-            if stats:
+            if conn_info['type'] == 'Sniffer':
+                sniffer = conn_info['connection']
+                stats_text = f"訊框:{sniffer.frame_count} CRC錯誤:{sniffer.crc_errors}"
+            elif stats:
                 stats_text = f"發送:{stats.total_sent} 成功率:{stats.get_success_rate():.1f}%"
+                if getattr(connection, 'reconnects', 0):
+                    stats_text += f" 重連:{connection.reconnects}"
             
             self.connection_tree.insert("", "end", text=name, values=(
                 conn_info['type'],
@@ -510,46 +556,219 @@ class EnhancedRS485GuiApp:
             messagebox.showwarning("警告", "請輸入指令")
             return
             
-        for name in self.connection_manager.get_all_connections().keys():
-            self._send_command_to_connection(name, command)
+        if not self._get_sendable_connections():
+            messagebox.showwarning("警告", "沒有可用的連線")
+            return
+        try:
+            request = to_bytes(command)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
             
-    def _send_command_to_connection(self, name, command):
-        """發送指令到指定連線"""
-        def send_thread():
+        # 各連線的工作線程同時發送，全部完成或超過期限後彙整成一張結果表
+        self.broadcaster.broadcast(request, on_complete=lambda broadcast: self.root.after(
+            0, lambda: self._log_broadcast(broadcast)))
+        
+    def _log_broadcast(self, broadcast):
+        """將廣播結果彙整記錄到總覽日誌"""
+        summary = broadcast.summary()
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        lines = [f"[{timestamp}] 📤 廣播: {format_bytes(broadcast.command)} "
+                 f"({summary['success']}/{summary['total']} 成功，耗時 {summary['elapsed_ms']:.1f}ms)"]
+        for row in broadcast.rows():
+            latency = f"{row.latency_ms:.1f}ms" if row.latency_ms is not None else "-"
+            if row.error is not None:
+                reply = row.error
+            elif row.decoded is not None:
+                reply = " ".join(f"{key}:{value}" for key, value in row.decoded.describe().items())
+            else:
+                reply = row.response.hex(' ').upper() if row.response else "無回應"
+            lines.append(f"  {row.name:<16} {row.status:<8} {latency:>9}  {reply}")
+        self.log_manager.add_log("\n".join(lines) + "\n" + "-" * 50 + "\n", "overview")
+        self._update_connection_tree()
+        
+    def _execute_for(self, name):
+        """回傳在該連線工作線程中執行指令的函式"""
+        def execute(command):
+            if callable(command):
+                # 掃描等需要連續佔用連線的工作，整段在工作線程中執行
+                return command()
+            return self._exchange(self.connection_manager.get_connection(name), command)
+        return execute
+        
+    def _scan_target(self, name):
+        """建立連線的掃描目標：串口依波特率計算探測逾時，TCP 閘道使用固定逾時"""
+        conn_info = self.connection_manager.get_connection(name)
+        connection = conn_info['connection']
+        if conn_info['type'] == 'Serial':
+            return ScanTarget(name, connection.exchange, connection.timeout, probe_timeout(connection.bus_timer),
+                              False)
+        return ScanTarget(name, connection.exchange, connection.timeout, SCAN_TCP_PROBE_TIMEOUT,
+                          not connection.rtu_over_tcp)
+        
+    def _scan_slaves(self):
+        """掃描所有連線上有回應的從站位址，各連線同時進行"""
+        names = self._get_sendable_connections()
+        if not names:
+            messagebox.showwarning("警告", "沒有可用的連線")
+            return
+        id_range = simpledialog.askstring("掃描從站", "位址範圍 (十六進位，例如 01-F7 或 01,05,10-20):",
+                                          initialvalue=f"01-{MODBUS_MAX_SLAVE_ID:02X}", parent=self.root)
+        if not id_range:
+            return
+        try:
+            slave_ids = parse_id_range(id_range)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
+        
+        started = time.perf_counter()
+        inventory = {}
+        errors = {}
+        pending = set(names)
+        lock = threading.Lock()
+        
+        def finish(name, results, error):
+            with lock:
+                if error is not None:
+                    errors[name] = error
+                inventory[name] = results or []
+                pending.discard(name)
+                if pending:
+                    return
+            rows = [row for scanned in names for row in inventory[scanned]]
+            elapsed = time.perf_counter() - started
+            self.root.after(0, lambda: self._log_scan(rows, errors, elapsed))
+        
+        self.log_manager.add_log(f"🔍 開始掃描 {len(names)} 個連線的 {len(slave_ids)} 個位址...", "overview")
+        for name in names:
+            # 每個連線的掃描是其工作線程上的一筆工作，不與其他指令同時佔用匯流排
+            def on_done(results, error, name=name):
+                finish(name, results, None if error is None else str(error))
             try:
-                conn_info = self.connection_manager.get_connection(name)
-                start_time = time.time()
-                
-                if conn_info['type'] == 'Serial':
-                    conn_info['connection'].send_hex(command.replace(" ", ""))
-                    response = conn_info['connection'].receive_response()
-                else:  # TCP
-                    hex_bytes = bytes.fromhex(command.replace(" ", ""))
-                    conn_info['connection'].send_data(hex_bytes)
-                    response = conn_info['connection'].receive_data()
-                
-                response_time = (time.time() - start_time) * 1000  # 毫秒
-                
-                # 更新統計
-                stats = self.connection_manager.get_statistics(name)
-                if stats:
-                    success = "錯誤" not in response and "逾時" not in response
-                    stats.add_transaction(success, response_time if success else None)
-                
-                # 記錄到日誌
-                timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-                self.root.after(0, lambda: self._log_transaction(name, timestamp, command, response, response_time))
-                
-            except Exception as e:
-                error_msg = f"發送錯誤: {e}"
-                stats = self.connection_manager.get_statistics(name)
-                if stats:
+                target = self._scan_target(name)
+                worker = self.connection_manager.get_worker(name, self._execute_for(name))
+                scan = lambda target=target: self.scanner.scan_port(target, slave_ids)
+                if not worker.submit(scan, on_done, QUEUE_POLICY_BLOCK, timeout=0):
+                    finish(name, None, "發送佇列已滿")
+            except (ValueError, ConnectionError) as e:
+                finish(name, None, str(e))
+        
+    def _log_scan(self, rows, errors, elapsed):
+        """將掃描結果的裝置清單記錄到總覽日誌"""
+        lines = [f"🔍 掃描完成: 找到 {len(rows)} 個從站，耗時 {elapsed:.1f}s",
+                 SlaveScanner.format_inventory(rows)]
+        for name, error in errors.items():
+            lines.append(f"❌ {name}: {error}")
+        self.log_manager.add_log("\n".join(lines) + "\n" + "-" * 50 + "\n", "overview")
+        
+    def _exchange(self, conn_info, request):
+        """送出請求 (bytes) 並取得配對後的 Transaction，串口與 TCP 使用相同的傳輸介面"""
+        return conn_info['connection'].exchange(request)
+    
+    def _format_transaction_response(self, transaction):
+        """將交易結果轉為日誌顯示文字"""
+        if transaction.status == FRAME_BROADCAST:
+            return "廣播 (從站不回應)"
+        if not transaction.response:
+            return "無回應"
+        response = transaction.response.hex(' ').upper()
+        if transaction.status != FRAME_OK:
+            response += f" ({transaction.status})"
+        turnaround = transaction.turnaround_ms
+        if turnaround is not None:
+            response += f" [轉換 {turnaround:.1f}ms]"
+        return response
+    
+    def _get_sendable_connections(self):
+        """取得可發送指令的連線名稱 (排除監聽模式)"""
+        return [name for name, conn_info in self.connection_manager.get_all_connections().items()
+                if conn_info['type'] != 'Sniffer']
+            
+    def _send_command_to_connection(self, name, command, policy=None,
+                                    priority=PRIORITY_INTERACTIVE, deadline=None, poll_request=None):
+        """將指令交給該連線的工作線程依序發送
+        
+        每個連線只有一個工作線程，一次只進行一筆交易；手動指令優先於監控查詢與定時輪詢，
+        deadline (秒) 內未輪到的輪詢直接捨棄。policy 決定佇列滿時的處理方式
+        (預設阻塞等待；定時發送與監控使用合併重複)。poll_request 為輪詢計畫中的請求，
+        成功時將回應拆回各點位數值一併記錄。command 可為 bytes 或使用者輸入的十六進位字串，
+        只在此轉換一次，之後整個傳輸路徑都以 bytes 處理。
+        """
+        conn_info = self.connection_manager.get_connection(name)
+        if conn_info['type'] == 'Sniffer':
+            self.log_manager.add_log("⚠️ 監聽模式不發送任何資料", name)
+            return
+        try:
+            request = to_bytes(command)
+        except ValueError as e:
+            error_msg = f"發送錯誤: {e}"
+            self.root.after(0, lambda: self.log_manager.add_log(error_msg, name))
+            return
+        if not isinstance(command, str):
+            command = format_bytes(request)  # 僅供日誌顯示
+        self._submit_job(name, request, self._transaction_callback(name, command, poll_request),
+                         policy, priority, deadline, self._stats_recorder(name))
+        
+    def _stats_recorder(self, name, requests=1):
+        """建立每次實際執行只呼叫一次的統計回呼：合併的重複請求共用同一筆交易，不重複計入"""
+        def on_complete(result, error):
+            stats = self.connection_manager.get_statistics(name)
+            if not stats:
+                return
+            if error is not None:
+                for _ in range(requests):
                     stats.add_transaction(False)
-                
-                timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+                return
+            # 每個訊框都已在接收時配對並檢查 CRC
+            for transaction in (result if isinstance(result, list) else (result,)):
+                stats.add_exchange(transaction)
+        return on_complete
+        
+    def _transaction_callback(self, name, command, poll_request=None):
+        """建立交易完成時的回呼：將結果交回介面線程記錄 (統計由 _stats_recorder 記錄)"""
+        def on_done(transaction, error):
+            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+            if error is not None:
+                error_msg = f"發送錯誤: {error}"
                 self.root.after(0, lambda: self._log_transaction(name, timestamp, command, error_msg, 0))
-        
-        threading.Thread(target=send_thread, daemon=True).start()
+                return
+            
+            response = self._format_transaction_response(transaction)
+            if poll_request is not None and transaction.success:
+                try:
+                    values = poll_request.split(transaction.response)
+                    response += " → " + ", ".join(f"{point}={value}" for point, value in values.items())
+                except ValueError as e:
+                    response += f" (無法拆解點位: {e})"
+            response_time = transaction.latency_ms or 0.0  # 毫秒，寫入開始到最後一個位元組
+            self.root.after(0, lambda: self._log_transaction(name, timestamp, command, response, response_time))
+        return on_done
+        
+    def _send_pipelined(self, name, job, batch, policy, priority, deadline):
+        """將 Modbus TCP 連線的多筆輪詢請求作為一個工作送出，job() 在同一連線上管線化執行並回傳各筆交易"""
+        callbacks = [self._transaction_callback(name, format_bytes(frame), request) for frame, request in batch]
+        
+        def on_done(transactions, error):
+            for index, callback in enumerate(callbacks):
+                callback(transactions[index] if error is None else None, error)
+        
+        self._submit_job(name, job, on_done, policy, priority, deadline, self._stats_recorder(name, len(batch)))
+        
+    def _submit_job(self, name, command, on_done, policy, priority, deadline, on_complete=None):
+        """交給連線的工作線程執行"""
+        # 定時發送與監控線程也會呼叫此處，日誌一律交回介面線程寫入
+        try:
+            worker = self.connection_manager.get_worker(name, self._execute_for(name))
+            accepted = worker.submit(command, on_done, policy, priority=priority, deadline=deadline,
+                                     on_complete=on_complete)
+        except (ValueError, ConnectionError) as e:
+            error_msg = f"發送錯誤: {e}"
+            self.root.after(0, lambda: self.log_manager.add_log(error_msg, name))
+            return
+        if not accepted:
+            full_msg = f"⚠️ 發送佇列已滿 ({worker.queue_size} 筆)，指令未送出"
+            self.root.after(0, lambda: self.log_manager.add_log(full_msg, name))
         
     def _log_transaction(self, name, timestamp, command, response, response_time):
         """記錄交易到日誌"""
@@ -580,9 +799,7 @@ class EnhancedRS485GuiApp:
         if self.connection_manager.is_auto_send_active(name):
             # 停止定時發送
             self.connection_manager.set_auto_send_status(name, False)
-            # 清理線程追蹤
-            if name in self.auto_send_threads:
-                del self.auto_send_threads[name]
+            self._cancel_auto_send(name)
             self.timer_button.config(text="⏰ 開始定時")
             self.log_manager.add_log("⏰ 停止定時發送", name)
         else:
@@ -597,6 +814,11 @@ class EnhancedRS485GuiApp:
                 if not command:
                     messagebox.showwarning("警告", "請輸入指令")
                     return
+                try:
+                    command = to_bytes(command)  # 只轉換一次，每個週期直接送出 bytes
+                except ValueError as e:
+                    messagebox.showerror("錯誤", str(e))
+                    return
                     
                 self.connection_manager.set_auto_send_status(name, True)
                 self.timer_button.config(text="⏹️ 停止定時")
@@ -608,29 +830,31 @@ class EnhancedRS485GuiApp:
                 messagebox.showwarning("警告", "請輸入有效的間隔時間")
                 
     def _start_auto_send(self, name, command, interval):
-        """開始自動發送"""
-        def auto_send_loop():
-            while self.connection_manager.is_auto_send_active(name) and name in self.auto_send_threads:
-                try:
-                    if name in self.connection_manager.get_all_connections():
-                        self._send_command_to_connection(name, command)
-                    time.sleep(interval / 1000.0)
-                except Exception as e:
-                    self.log_manager.add_log(f"⚠️ 定時發送錯誤: {e}", name)
-                    # 發生錯誤時停止自動發送
-                    self.connection_manager.set_auto_send_status(name, False)
-                    # 更新UI按鈕狀態
-                    self.root.after(0, lambda: self._update_timer_button_state(name))
-                    break
-            
-            # 線程結束時清理
-            if name in self.auto_send_threads:
-                del self.auto_send_threads[name]
-                
-        # 啟動線程並追蹤
-        thread = threading.Thread(target=auto_send_loop, daemon=True)
-        self.auto_send_threads[name] = thread
-        thread.start()
+        """開始自動發送 (由共用排程器依固定時間點觸發，不受交易時間影響而漂移)"""
+        def send_once():
+            if not self.connection_manager.is_auto_send_active(name):
+                self._cancel_auto_send(name)
+                return
+            try:
+                # 裝置回應較慢時不堆積相同指令，超過一個週期仍未輪到的輪詢直接捨棄
+                self._send_command_to_connection(name, command, QUEUE_POLICY_COALESCE,
+                                                 PRIORITY_BACKGROUND, interval / 1000.0)
+            except Exception as e:
+                # 發生錯誤時停止自動發送
+                self._cancel_auto_send(name)
+                self.connection_manager.set_auto_send_status(name, False)
+                error_msg = f"⚠️ 定時發送錯誤: {e}"
+                self.root.after(0, lambda: self.log_manager.add_log(error_msg, name))
+                # 更新UI按鈕狀態
+                self.root.after(0, lambda: self._update_timer_button_state(name))
+        
+        self._cancel_auto_send(name)
+        self.auto_send_jobs[name] = self.scheduler.add(f"定時發送 {name}", interval / 1000.0, send_once,
+                                                       start_delay=0)
+    
+    def _cancel_auto_send(self, name):
+        """取消連線的定時發送排程"""
+        self.scheduler.cancel(self.auto_send_jobs.pop(name, None))
     
     def _update_timer_button_state(self, name):
         """更新定時按鈕狀態"""
@@ -672,8 +896,7 @@ class EnhancedRS485GuiApp:
         for name in list(self.connection_manager.get_all_connections().keys()):
             if self.connection_manager.is_auto_send_active(name):
                 self.connection_manager.set_auto_send_status(name, False)
-                if name in self.auto_send_threads:
-                    del self.auto_send_threads[name]
+                self._cancel_auto_send(name)
                 stopped_count += 1
                 self.log_manager.add_log("🛑 定時發送已停止", name)
         
@@ -690,6 +913,8 @@ class EnhancedRS485GuiApp:
         """切換監控模式"""
         if self.monitoring_active:
             self.monitoring_active = False
+            self.scheduler.cancel(self.monitor_job)
+            self.monitor_job = None
             self.monitor_button.config(text="▶️ 開始監控")
             self.log_manager.add_log("📊 監控已停止", "overview")
         else:
@@ -699,48 +924,171 @@ class EnhancedRS485GuiApp:
             self._start_monitoring()
             
     def _start_monitoring(self):
-        """開始監控"""
-        def monitor_loop():
-            while self.monitoring_active:
+        """開始監控 (由共用排程器依固定時間點觸發)"""
+        # 依各連線的預設裝置ID將監控點位編譯為最少的讀取請求；
+        # 合併上限取自該從站自動調校的結果，上限改變時重新編譯。
+        # Modbus TCP 連線將同一輪的請求管線化送出，不必逐筆等待回應
+        compiler = PollPlanCompiler()
+        plans = {}
+        pipelines = {}
+        try:
+            interval = self._validate_interval(self.monitor_interval.get())
+            compiler.compile(compiler.parse_points(POLL_POINTS, 1))  # 先檢查點位定義
+        except ValueError as e:
+            self.monitoring_active = False
+            self.monitor_button.config(text="▶️ 開始監控")
+            messagebox.showwarning("警告", str(e))
+            return
+        
+        def poll_all():
+            for name in self._get_sendable_connections():
                 try:
-                    interval = int(self.monitor_interval.get())
-                    # 向所有連線發送查詢指令
-                    query_cmd = "01 03 00 00 00 01 84 0A"  # 查詢狀態指令
-                    
-                    for name in list(self.connection_manager.get_all_connections().keys()):
-                        if name in self.connection_manager.get_all_connections():
-                            self._send_command_to_connection(name, query_cmd)
-                    
-                    time.sleep(interval / 1000.0)
-                except (KeyError, ValueError, TypeError) as e:
-                    self.log_manager.add_log(f"監控錯誤: {e}", "overview")
-                    break
-                except Exception as e:
-                    self.log_manager.add_log(f"監控發生未預期錯誤: {e}", "overview")
-                    break
-                    
-        if self.monitoring_active:
-            threading.Thread(target=monitor_loop, daemon=True).start()
-            
+                    conn_info = self.connection_manager.get_connection(name)
+                    connection = conn_info['connection']
+                    slave_id = int(conn_info.get('default_device_id', "01"), 16)
+                    limits = connection.tuner.read_limits(slave_id)
+                    key = (slave_id, tuple(sorted(limits.items())))
+                    if key not in plans:
+                        plan = PollPlanCompiler(limits=limits).compile(compiler.parse_points(POLL_POINTS, slave_id))
+                        plans[key] = [(request.frame(), request) for request in plan]
+                    if getattr(connection, 'mbap', False) and len(plans[key]) > 1:
+                        # 同一個工作物件才能在佇列中合併重複
+                        if (connection, key) not in pipelines:
+                            pipelines[(connection, key)] = functools.partial(
+                                connection.exchange_many, [frame for frame, _ in plans[key]])
+                        job = pipelines[(connection, key)]
+                        self._send_pipelined(name, job, plans[key], QUEUE_POLICY_COALESCE,
+                                             PRIORITY_ALARM, interval / 1000.0)
+                        continue
+                    for frame, request in plans[key]:
+                        self._send_command_to_connection(name, frame, QUEUE_POLICY_COALESCE,
+                                                         PRIORITY_ALARM, interval / 1000.0, request)
+                except ValueError:
+                    continue  # 連線已在這一輪中被移除
+        
+        self.scheduler.cancel(self.monitor_job)
+        self.monitor_job = self.scheduler.add("監控", interval / 1000.0, poll_all, start_delay=0)
+    
+    def _toggle_gateway_polling(self):
+        """切換大量 TCP 閘道輪詢：所有端點在同一個事件迴圈線程中以監控點位輪詢"""
+        if self.gateway_poller.running:
+            self.gateway_poller.stop()
+            self.gateway_button.config(text="🌐 閘道輪詢")
+            self.log_manager.add_log("🌐 閘道輪詢已停止", "overview")
+            return
+        
+        text = simpledialog.askstring("閘道輪詢", "端點 (例如 192.168.1.100-199:502 或 10.0.0.1,10.0.0.2:1502):",
+                                      initialvalue=f"{DEFAULT_TCP_HOST}:{DEFAULT_TCP_PORT}", parent=self.root)
+        if text is None:
+            return
+        try:
+            endpoints = parse_endpoints(text)
+            interval = self._validate_interval(self.monitor_interval.get()) / 1000.0
+            compiler = PollPlanCompiler()
+            requests = [request.frame() for request in compiler.compile(compiler.parse_points(POLL_POINTS, 1))]
+        except ValueError as e:
+            messagebox.showwarning("警告", str(e))
+            return
+        
+        self.gateway_poller = AsyncPoller()
+        self.gateway_stats = ConnectionStats("閘道輪詢")
+        self.gateway_failures = {}
+        self.gateway_poller.start()
+        for index, (host, port) in enumerate(endpoints):
+            name = f"{host}:{port}"
+            self.gateway_poller.add_endpoint(AsyncEndpoint(name, host, port))
+            # 第一輪在整個週期內錯開，避免同時建立所有連線
+            self.gateway_poller.poll(name, requests, interval, start_delay=interval * index / len(endpoints))
+        self.gateway_button.config(text="⏹️ 停止閘道輪詢")
+        self.log_manager.add_log(f"🌐 閘道輪詢已開始: {len(endpoints)} 個端點，每 {interval:g} 秒", "overview")
+    
+    def _drain_gateway_results(self):
+        """取回閘道輪詢的結果併入統計 (介面線程)"""
+        for result in self.gateway_poller.results.drain():
+            if result.error is not None:
+                self.gateway_stats.add_transaction(False)
+            else:
+                self.gateway_stats.add_exchange(result.transaction)
+            if not result.success:
+                self.gateway_failures[result.name] = self.gateway_failures.get(result.name, 0) + 1
+    
     def _update_statistics(self):
         """更新統計顯示"""
         # 清空統計樹狀檢視
         for item in self.stats_tree.get_children():
             self.stats_tree.delete(item)
             
-        # 重新載入統計資料
+        # 重新載入統計資料 (延遲以百分位數顯示，各從站列於連線之下以找出拖慢輪詢的裝置)
+        window = self.latency_window.get()
+        workers = self.connection_manager.get_all_workers()
         for name, stats in self.connection_manager.get_all_statistics().items():
-            self.stats_tree.insert("", "end", text=name, values=(
+            latency = stats.get_latency_summary(window)
+            parent = self.stats_tree.insert("", "end", text=name, open=True, values=(
                 stats.total_sent,
                 stats.total_received,
                 stats.errors,
+                stats.crc_errors,
+                stats.truncated_frames,
+                stats.exception_responses,
                 f"{stats.get_success_rate():.1f}",
-                f"{stats.get_avg_response_time():.1f}"
+                *self._format_latency(latency),
+                f"{stats.get_avg_turnaround_time():.1f}",
+                *self._format_queue(workers.get(name), window)
             ))
+            for slave_id in stats.get_device_ids():
+                latency = stats.get_latency_summary(window, slave_id)
+                self.stats_tree.insert(parent, "end", text=f"裝置 {slave_id:02X}", values=(
+                    "", latency["count"], "", "", "", "", "", *self._format_latency(latency), "", "", "", ""
+                ))
+        
+        if self.gateway_stats is not None:
+            self._insert_gateway_statistics(window)
             
+        jitter = self.scheduler.jitter.summary(window)
+        skipped = sum(job.skipped for job in self.scheduler.jobs())
+        self.jitter_label.config(text=f"排程抖動 P95 {jitter['p95']:.1f}ms / 最大 {jitter['max']:.1f}ms，"
+                                      f"跳過 {skipped} 個週期")
+        
         # 定期更新
         self.root.after(STATS_UPDATE_INTERVAL, self._update_statistics)
     
+    def _insert_gateway_statistics(self, window):
+        """閘道輪詢彙總列，失敗最多的端點列於其下"""
+        self._drain_gateway_results()
+        stats = self.gateway_stats
+        latency = stats.get_latency_summary(window)
+        parent = self.stats_tree.insert("", "end", text=f"🌐 閘道輪詢 ({len(self.gateway_poller.endpoints)} 端點)",
+                                        open=True, values=(
+            stats.total_sent,
+            stats.total_received,
+            stats.errors,
+            stats.crc_errors,
+            stats.truncated_frames,
+            stats.exception_responses,
+            f"{stats.get_success_rate():.1f}",
+            *self._format_latency(latency),
+            f"{stats.get_avg_turnaround_time():.1f}",
+            "", "", f"{self.gateway_poller.results.dropped}/0"
+        ))
+        worst = sorted(self.gateway_failures.items(), key=lambda item: item[1], reverse=True)[:10]
+        for name, failures in worst:
+            self.stats_tree.insert(parent, "end", text=name, values=(
+                "", "", failures, "", "", "", "", "", "", "", "", "", "", "", ""
+            ))
+        
+    def _format_latency(self, latency):
+        """延遲摘要轉為 P50/P95/P99/最大值 欄位文字"""
+        return tuple(f"{latency[key]:.1f}" for key in ("p50", "p95", "p99", "max"))
+    
+    def _format_queue(self, worker, window):
+        """工作線程佇列深度、排隊時間 P95 與丟棄 (含過期、被搶先)/合併筆數欄位文字"""
+        if worker is None:
+            return ("", "", "")
+        metrics = worker.metrics(window)
+        return (f"{metrics['depth']}/{metrics['max_depth']}", f"{metrics['wait_p95']:.1f}",
+                f"{metrics['dropped'] + metrics['rejected'] + metrics['expired'] + metrics['preempted']}"
+                f"/{metrics['coalesced']}")
+    
     def _validate_interval(self, interval_str):
         """驗證間隔時間輸入"""
         try:
@@ -792,15 +1140,16 @@ class EnhancedRS485GuiApp:
         if not packet:
             return
             
-        # Modbus 分析
-        analysis = ModbusPacketAnalyzer.analyze_packet(packet)
-        
-        if isinstance(analysis, dict):
-            result_text = "📋 Modbus 封包分析\n" + "=" * 30 + "\n\n"
-            for key, value in analysis.items():
-                result_text += f"{key:12}: {value}\n"
+        # Modbus 分析 (貼上的資料可能包含多個相連的訊框，先以 CRC 切割)
+        segments = self._split_frames(packet)
+        if len(segments) > 1:
+            result_text = f"📋 共切割出 {len(segments)} 個片段\n\n"
+            for index, (segment, valid) in enumerate(segments, 1):
+                status = "" if valid else " (CRC 錯誤或無法成框)"
+                result_text += f"--- 片段 {index}{status}: {segment} ---\n"
+                result_text += self._format_analysis(ModbusPacketAnalyzer.analyze_packet(segment)) + "\n"
         else:
-            result_text = f"分析結果: {analysis}\n"
+            result_text = self._format_analysis(ModbusPacketAnalyzer.analyze_packet(packet))
             
         # 格式轉換
         ascii_result = DataFormatter.hex_to_ascii(packet)
@@ -810,6 +1159,26 @@ class EnhancedRS485GuiApp:
         # 更新分析面板
         self.analysis_panel.update_results(result_text, ascii_result, decimal_result, binary_result)
     
+    def _split_frames(self, packet):
+        """以 CRC 切割可能相連的多個訊框，回傳 (十六進位字串, 是否有效) 串列"""
+        try:
+            data = bytes.fromhex(packet.replace(" ", ""))
+        except ValueError:
+            return [(packet, False)]
+        
+        framer = ModbusStreamFramer()
+        segments = framer.feed(data) + framer.flush()
+        return [(segment.hex(' ').upper(), valid) for segment, valid in segments]
+    
+    def _format_analysis(self, analysis):
+        """格式化 Modbus 分析結果"""
+        if isinstance(analysis, dict):
+            result_text = "📋 Modbus 封包分析\n" + "=" * 30 + "\n\n"
+            for key, value in analysis.items():
+                result_text += f"{key:12}: {value}\n"
+            return result_text
+        return f"分析結果: {analysis}\n"
+    
     def _on_closing(self):
         """處理程式關閉事件"""
         try:
@@ -821,8 +1190,10 @@ class EnhancedRS485GuiApp:
                 if self.connection_manager.is_auto_send_active(name):
                     self.connection_manager.set_auto_send_status(name, False)
             
-            # 清理線程追蹤
-            self.auto_send_threads.clear()
+            # 停止排程線程 (同時取消所有定時發送與監控) 與閘道輪詢
+            self.scheduler.stop()
+            self.gateway_poller.stop()
+            self.auto_send_jobs.clear()
             
             # 關閉所有連線
             for name in list(self.connection_manager.get_all_connections().keys()):
@@ -830,6 +1201,7 @@ class EnhancedRS485GuiApp:
                     self.connection_manager.remove_connection(name)
                 except Exception as e:
                     print(f"關閉連線 {name} 時發生錯誤: {e}")
+            self.connection_manager.tcp_pool.close()
                     
         except Exception as e:
             print(f"程式關閉時發生錯誤: {e}")
@@ -989,7 +1361,7 @@ class ConnectionDialog:
         if not host:
             raise ValueError("請輸入 IP 位址")
             
-        conn = TCPConnection(host, port)
+        conn = TCPConnection(host, port, pool=self.connection_manager.tcp_pool)
         conn.connect()
         address = f"{host}:{port}"
         
@@ -1000,6 +1372,7 @@ class ConnectionDialog:
     """連線對話框"""
     
     def __init__(self, parent, connection_manager, log_manager, update_callback):
+        self.parent = parent
         self.connection_manager = connection_manager
         self.log_manager = log_manager
         self.update_callback = update_callback
@@ -1047,6 +1420,8 @@ class ConnectionDialog:
                        value="Serial", command=self._on_type_change).pack(side=tk.LEFT)
         ttk.Radiobutton(type_frame, text="TCP", variable=self.conn_type, 
                        value="TCP", command=self._on_type_change).pack(side=tk.LEFT, padx=(20, 0))
+        ttk.Radiobutton(type_frame, text="監聽 (Sniffer)", variable=self.conn_type, 
+                       value="Sniffer", command=self._on_type_change).pack(side=tk.LEFT, padx=(20, 0))
         
         # 設定區域
         self.settings_frame = ttk.LabelFrame(main_frame, text="連線設定", padding=10)
@@ -1070,6 +1445,9 @@ class ConnectionDialog:
             
         if self.conn_type.get() == "Serial":
             self._create_serial_settings()
+        elif self.conn_type.get() == "Sniffer":
+            self._create_serial_settings()
+            self.baud_combo.set(str(DEFAULT_SNIFFER_BAUDRATE))
         else:
             self._create_tcp_settings()
     
@@ -1114,8 +1492,22 @@ class ConnectionDialog:
         self.port_entry.insert(0, str(DEFAULT_TCP_PORT))
         self.port_entry.pack(fill=tk.X)
         
+        self.rtu_over_tcp_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.tcp_frame, text="RTU over TCP (檢查 CRC)",
+                        variable=self.rtu_over_tcp_var).pack(anchor=tk.W, pady=(10, 0))
+        
+        self.mbap_var = tk.BooleanVar(value=False)
+        mbap_frame = ttk.Frame(self.tcp_frame)
+        mbap_frame.pack(fill=tk.X)
+        ttk.Checkbutton(mbap_frame, text="Modbus TCP (MBAP)", variable=self.mbap_var).pack(side=tk.LEFT)
+        ttk.Label(mbap_frame, text="管線深度:").pack(side=tk.LEFT, padx=(10, 0))
+        self.window_entry = ttk.Entry(mbap_frame, width=5)
+        self.window_entry.insert(0, str(DEFAULT_PIPELINE_WINDOW))
+        self.window_entry.pack(side=tk.LEFT)
+        
     def _create_connection(self):
         """建立連線"""
+        log_writer = None
         try:
             name = self.name_entry.get().strip()
             if not name:
@@ -1130,6 +1522,10 @@ class ConnectionDialog:
             if self.conn_type.get() == "Serial":
                 connection, address = self._create_serial_connection(name)
                 conn_type = "Serial"
+            elif self.conn_type.get() == "Sniffer":
+                log_writer = BufferedLogWriter(self.parent, self.log_manager, name)
+                connection, address = self._create_sniffer_connection(name, log_writer)
+                conn_type = "Sniffer"
             else:
                 connection, address = self._create_tcp_connection()
                 conn_type = "TCP"
@@ -1144,6 +1540,10 @@ class ConnectionDialog:
             # 建立日誌分頁
             self.log_manager.setup_log_tab(name, name)
             
+            if log_writer:
+                conn_info['log_writer'] = log_writer
+                connection.start()
+            
             # 更新 UI
             self.update_callback()
             
@@ -1154,6 +1554,8 @@ class ConnectionDialog:
             messagebox.showinfo("成功", f"連線 '{name}' 建立成功")
             
         except Exception as e:
+            if log_writer:
+                log_writer.stop()
             messagebox.showerror("錯誤", f"連線建立失敗: {e}")
             
     def _create_serial_connection(self, name):
@@ -1169,10 +1571,28 @@ class ConnectionDialog:
         log_path = os.path.join(LOG_DIR, f"log_{name}_{timestamp}.log")
         
         conn = RS485Tester(port=port, baudrate=baudrate, log_file=log_path)
+        conn.start_reader()  # 背景接收，避免延遲到達的位元組混入下一筆回應
         address = f"{port} ({baudrate})"
         
         return conn, address
         
+    def _create_sniffer_connection(self, name, log_writer):
+        """建立監聽連線 (只接收不發送)"""
+        port = self.port_combo.get().split(' ')[0] if self.port_combo.get() else ""
+        if not port:
+            raise ValueError("請選擇 COM Port")
+            
+        baudrate = int(self.baud_combo.get())
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log_path = os.path.join(LOG_DIR, f"sniff_{name}_{timestamp}.log")
+        
+        on_frame = lambda frame: log_writer.write(f"📡 {BusSniffer.format_frame(frame)}")
+        conn = BusSniffer(port=port, baudrate=baudrate, log_file=log_path, on_frame=on_frame)
+        address = f"{port} ({baudrate}, 監聽)"
+        
+        return conn, address
+        
     def _create_tcp_connection(self):
         """建立 TCP 連線"""
         from connection_manager import TCPConnection
@@ -1181,9 +1601,16 @@ class ConnectionDialog:
         if not host:
             raise ValueError("請輸入 IP 位址")
             
-        conn = TCPConnection(host, port)
+        rtu_over_tcp = self.rtu_over_tcp_var.get()
+        mbap = self.mbap_var.get()
+        try:
+            window = int(self.window_entry.get())
+        except ValueError:
+            raise ValueError("管線深度必須是整數")
+        conn = TCPConnection(host, port, rtu_over_tcp=rtu_over_tcp, mbap=mbap, window=window,
+                             pool=self.connection_manager.tcp_pool)
         conn.connect()
-        address = f"{host}:{port}"
+        address = f"{host}:{port}" + (" (RTU)" if rtu_over_tcp else "") + (" (MBAP)" if mbap else "")
         
         return conn, address
 
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+非同步多閘道輪詢模組
+
+以單一事件迴圈 (一個背景線程) 驅動大量 TCP 端點，取代每個連線各自的阻塞 Socket 與工作線程：
+連線建立、讀取與寫入皆為非阻塞，數百個閘道也只佔用一個線程。每個端點有自己的同時請求上限
+與回應逾時；Modbus TCP 端點由一個讀取協程依交易 ID 把回應交給等待中的請求，RTU over TCP
+端點背後是半雙工匯流排，一次只進行一筆交易。
+結果放入 ResultBridge，由介面線程定期批次取出，事件迴圈不會直接呼叫介面。
+"""
+import asyncio
+import threading
+import time
+from collections import deque, namedtuple
+try:
+    from .constants import (TCP_RESPONSE_TIMEOUT, DEFAULT_PIPELINE_WINDOW, MAX_PIPELINE_WINDOW, MBAP_HEADER_SIZE,
+                            MBAP_MAX_ADU_SIZE, MODBUS_MAX_FRAME_SIZE, DEFAULT_TCP_PORT, FRAME_UNMATCHED,
+                            ASYNC_CONNECT_TIMEOUT, ASYNC_RESULT_QUEUE_SIZE, ASYNC_STOP_TIMEOUT)
+    from .transaction import TransactionCorrelator, is_broadcast_request, broadcast_transaction
+    from .transport import TransportError, to_bytes, format_bytes
+except ImportError:
+    from constants import (TCP_RESPONSE_TIMEOUT, DEFAULT_PIPELINE_WINDOW, MAX_PIPELINE_WINDOW, MBAP_HEADER_SIZE,
+                           MBAP_MAX_ADU_SIZE, MODBUS_MAX_FRAME_SIZE, DEFAULT_TCP_PORT, FRAME_UNMATCHED,
+                           ASYNC_CONNECT_TIMEOUT, ASYNC_RESULT_QUEUE_SIZE, ASYNC_STOP_TIMEOUT)
+    from transaction import TransactionCorrelator, is_broadcast_request, broadcast_transaction
+    from transport import TransportError, to_bytes, format_bytes
+
+
+class PollResult(namedtuple('PollResult', ['name', 'transaction', 'error'])):
+    """單筆請求的結果：error 為 None 時 transaction 為完成 (含逾時) 的 Transaction"""
+    __slots__ = ()
+    
+    @property
+    def success(self):
+        return self.error is None and self.transaction.success
+
+
+def parse_endpoints(text, default_port=DEFAULT_TCP_PORT):
+    """解析端點清單，回傳 [(主機, 埠號)]
+    
+    以逗號分隔，每項為「主機[:埠號]」；IPv4 最後一段可寫成範圍，例如 192.168.1.100-199:502。
+    """
+    endpoints = []
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+        host, _, port = part.partition(":")
+        try:
+            port = int(port) if port else default_port
+        except ValueError:
+            raise ValueError(f"無效的埠號: {part}")
+        if not 0 < port < 65536:
+            raise ValueError(f"埠號必須在 1~65535 之間: {part}")
+        prefix, _, last = host.rpartition(".")
+        if "-" in last:
+            try:
+                start, end = (int(value) for value in last.split("-", 1))
+            except ValueError:
+                raise ValueError(f"無效的位址範圍: {part}")
+            if not 0 <= start <= end <= 255:
+                raise ValueError(f"位址範圍必須在 0~255 之間: {part}")
+            endpoints.extend((f"{prefix}.{octet}", port) for octet in range(start, end + 1))
+        elif host:
+            endpoints.append((host, port))
+        else:
+            raise ValueError(f"缺少主機位址: {part}")
+    if not endpoints:
+        raise ValueError("端點清單不能為空")
+    return list(dict.fromkeys(endpoints))
+
+
+class ResultBridge:
+    """事件迴圈到介面線程的結果佇列：任意線程加入，介面線程批次取出；超過上限時丟棄最舊的結果"""
+    
+    def __init__(self, max_items=ASYNC_RESULT_QUEUE_SIZE):
+        self._items = deque(maxlen=max_items)
+        self._lock = threading.Lock()
+        self.dropped = 0
+    
+    def put(self, result):
+        """加入一筆結果 (可於任意線程呼叫)"""
+        with self._lock:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(result)
+    
+    def drain(self, max_items=None):
+        """取出累積的結果 (最多 max_items 筆)"""
+        with self._lock:
+            count = len(self._items) if max_items is None else min(max_items, len(self._items))
+            return [self._items.popleft() for _ in range(count)]
+    
+    def __len__(self):
+        return len(self._items)
+
+
+class AsyncEndpoint:
+    """單一 TCP 端點的非阻塞連線，只能在事件迴圈中使用
+    
+    Modbus TCP (預設) 最多 concurrency 筆請求同時等待回應；RTU over TCP 的同時請求數固定為 1。
+    連線在第一次請求時建立，傳輸錯誤後於下一次請求時重新連線。
+    """
+    
+    def __init__(self, name, host, port, rtu_over_tcp=False, timeout=TCP_RESPONSE_TIMEOUT,
+                 concurrency=DEFAULT_PIPELINE_WINDOW, connect_timeout=ASYNC_CONNECT_TIMEOUT):
+        if timeout <= 0 or connect_timeout <= 0:
+            raise ValueError("逾時時間必須大於0")
+        if not 1 <= concurrency <= MAX_PIPELINE_WINDOW:
+            raise ValueError(f"同時請求數必須在 1~{MAX_PIPELINE_WINDOW} 之間")
+        self.name = name
+        self.host = host
+        self.port = port
+        self.rtu_over_tcp = rtu_over_tcp
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.concurrency = 1 if rtu_over_tcp else concurrency
+        self.correlator = TransactionCorrelator(mbap=not rtu_over_tcp)
+        self.connected = False
+        self.skipped = 0  # 一輪耗時超過輪詢週期而跳過的週期數
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._connect_lock = asyncio.Lock()
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._waiters = {}  # 交易 ID -> 等待回應的 Future
+    
+    async def connect(self):
+        """建立連線 (已連線時直接返回)"""
+        async with self._connect_lock:
+            if self.connected:
+                return
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.connect_timeout)
+            except asyncio.TimeoutError:
+                raise TransportError(f"TCP 連線逾時: {self.host}:{self.port}")
+            except OSError as e:
+                raise TransportError(f"TCP 連線失敗: {e}")
+            self.connected = True
+            if not self.rtu_over_tcp:
+                self._read_task = asyncio.create_task(self._read_loop(self._reader))
+    
+    async def exchange(self, request, timeout=None):
+        """送出請求並等待配對的回應，回傳 Transaction (逾時狀態為無回應)"""
+        request = to_bytes(request)
+        timeout = self.timeout if timeout is None else timeout
+        async with self._semaphore:
+            await self.connect()
+            if self.rtu_over_tcp:
+                return await self._exchange_rtu(request, timeout)
+            return await self._exchange_mbap(request, timeout)
+    
+    async def _exchange_mbap(self, request, timeout):
+        """Modbus TCP 交易：回應由讀取協程依交易 ID 交回"""
+        frame = self.correlator.frame_mbap(request)
+        future = asyncio.get_running_loop().create_future()
+        write_start_ns = time.perf_counter_ns()
+        # 先登記再寫入：回應可能在 drain() 讓出控制權時就已到達
+        transaction = self.correlator.begin(frame, write_start_ns, write_start_ns)
+        self._waiters[transaction.key] = future
+        try:
+            await self._write(frame)
+            transaction.write_done_ns = time.perf_counter_ns()
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.correlator.cancel(transaction)
+            return transaction
+        finally:
+            if self._waiters.get(transaction.key) is future:
+                del self._waiters[transaction.key]
+    
+    async def _exchange_rtu(self, request, timeout):
+        """RTU over TCP 交易：一次一筆，依從站位址與功能碼配對"""
+        write_start_ns = time.perf_counter_ns()
+        await self._write(request)
+        write_done_ns = time.perf_counter_ns()
+        if is_broadcast_request(request):
+            return broadcast_transaction(request, write_start_ns, write_done_ns)
+        
+        transaction = self.correlator.begin(request, write_start_ns, write_done_ns)
+        try:
+            response = await asyncio.wait_for(self._reader.read(MODBUS_MAX_FRAME_SIZE), timeout)
+        except asyncio.TimeoutError:
+            self.correlator.cancel(transaction)
+            return transaction
+        except OSError as e:
+            raise self._disconnect(TransportError(f"接收資料失敗: {e}"))
+        if not response:
+            raise self._disconnect(TransportError("TCP 連線已被對方關閉"))
+        
+        received_ns = time.perf_counter_ns()
+        if not self.correlator.match(response, received_ns, received_ns):
+            self.correlator.cancel(transaction)
+            transaction.response = response
+            transaction.status = FRAME_UNMATCHED
+        return transaction
+    
+    async def _write(self, data):
+        try:
+            self._writer.write(data)
+            await self._writer.drain()
+        except OSError as e:
+            raise self._disconnect(TransportError(f"發送資料失敗: {e}"))
+    
+    async def _read_loop(self, reader):
+        """依 MBAP 長度欄位讀取回應並交給等待中的請求，連線中斷時通知所有等待者"""
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_HEADER_SIZE)
+                length = (header[4] << 8) | header[5]
+                if header[2] or header[3] or not 2 <= length <= MBAP_MAX_ADU_SIZE - MBAP_HEADER_SIZE:
+                    raise TransportError(f"無效的 MBAP 標頭: {format_bytes(header)}")
+                frame = header + await reader.readexactly(length)
+                received_ns = time.perf_counter_ns()
+                transaction = self.correlator.match(frame, received_ns, received_ns)
+                future = self._waiters.pop(transaction.key, None) if transaction else None
+                if future is not None and not future.done():
+                    future.set_result(transaction)
+        except asyncio.IncompleteReadError:
+            self._disconnect(TransportError("TCP 連線已被對方關閉"))
+        except OSError as e:
+            self._disconnect(TransportError(f"接收資料失敗: {e}"))
+        except TransportError as e:
+            self._disconnect(e)
+    
+    def _disconnect(self, error):
+        """關閉連線並讓所有等待中的請求以 error 結束，回傳 error 方便直接 raise"""
+        self.connected = False
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._read_task is not None and self._read_task is not asyncio.current_task():
+            self._read_task.cancel()
+        self._read_task = None
+        waiters, self._waiters = self._waiters, {}
+        for future in waiters.values():
+            if not future.done():
+                future.set_exception(error)
+        self.correlator.pending.clear()
+        return error
+    
+    async def close(self):
+        """關閉連線"""
+        if self.connected:
+            self._disconnect(TransportError("連線已關閉"))
+
+
+class AsyncPoller:
+    """在單一背景線程的事件迴圈上驅動所有端點，公開方法可由任意線程呼叫
+    
+    端點可為 AsyncEndpoint (TCP) 或 AsyncRS485Tester (串口)，只需具有 name、skipped、
+    async exchange() 與 async close()。每筆請求的結果 (PollResult) 都放入 results，由介面線程以 results.drain() 批次取出。
+    """
+    
+    def __init__(self, results=None):
+        self.results = results if results is not None else ResultBridge()
+        # 寫入時複製：其他線程可直接讀取目前的端點
+        self.endpoints = {}
+        self._polls = {}  # 名稱 -> 輪詢 Task，只在事件迴圈線程存取
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+    
+    @property
+    def running(self):
+        return self._loop is not None
+    
+    def start(self):
+        """啟動事件迴圈線程"""
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="AsyncPoller", daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout=ASYNC_STOP_TIMEOUT):
+        """停止所有輪詢、關閉所有連線並結束事件迴圈"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+        except Exception as e:
+            print(f"關閉非同步連線時發生錯誤: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+    
+    def add_endpoint(self, endpoint):
+        """新增端點，回傳 endpoint"""
+        with self._lock:
+            if endpoint.name in self.endpoints:
+                raise ValueError(f"端點名稱 '{endpoint.name}' 已存在")
+            self.endpoints = {**self.endpoints, endpoint.name: endpoint}
+        return endpoint
+    
+    def remove_endpoint(self, name):
+        """移除端點：停止輪詢並關閉連線"""
+        with self._lock:
+            endpoint = self._endpoint(name)
+            self.endpoints = {key: value for key, value in self.endpoints.items() if key != name}
+        if self.running:
+            self._call(self._remove(endpoint))
+    
+    def submit(self, name, request, timeout=None):
+        """送出單筆請求，回傳 concurrent.futures.Future (結果為 PollResult，亦會放入 results)"""
+        endpoint = self._endpoint(name)
+        return self._call(self._exchange(endpoint, to_bytes(request), timeout))
+    
+    def poll(self, name, requests, interval, start_delay=0.0):
+        """每 interval 秒對端點送出一輪請求，同一輪的請求在端點的同時請求上限內並行
+        
+        一輪耗時超過週期時跳過延誤的週期。重複呼叫會取代原本的輪詢；start_delay 用於錯開
+        大量端點的第一輪，避免同時建立連線。
+        """
+        if interval <= 0:
+            raise ValueError("輪詢間隔必須大於0")
+        requests = [to_bytes(request) for request in requests]
+        if not requests:
+            raise ValueError("輪詢請求不能為空")
+        endpoint = self._endpoint(name)
+        return self._call(self._start_poll(endpoint, requests, interval, start_delay))
+    
+    def stop_poll(self, name):
+        """停止端點的輪詢 (保留連線)"""
+        return self._call(self._stop_poll(name))
+    
+    def _endpoint(self, name):
+        endpoint = self.endpoints.get(name)
+        if endpoint is None:
+            raise ValueError(f"端點 '{name}' 不存在")
+        return endpoint
+    
+    def _call(self, coroutine):
+        """將協程交給事件迴圈執行"""
+        loop = self._loop
+        if loop is None:
+            coroutine.close()
+            raise ConnectionError("非同步輪詢引擎未啟動")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop)
+    
+    async def _exchange(self, endpoint, request, timeout=None):
+        try:
+            result = PollResult(endpoint.name, await endpoint.exchange(request, timeout), None)
+        except (ValueError, ConnectionError) as e:
+            result = PollResult(endpoint.name, None, e)
+        self.results.put(result)
+        return result
+    
+    async def _start_poll(self, endpoint, requests, interval, start_delay):
+        await self._stop_poll(endpoint.name)
+        self._polls[endpoint.name] = asyncio.create_task(self._poll_loop(endpoint, requests, interval, start_delay))
+    
+    async def _stop_poll(self, name):
+        task = self._polls.pop(name, None)
+        if task is not None:
+            task.cancel()
+    
+    async def _poll_loop(self, endpoint, requests, interval, start_delay):
+        loop = asyncio.get_running_loop()
+        next_time = loop.time() + start_delay
+        await asyncio.sleep(start_delay)
+        while True:
+            await asyncio.gather(*(self._exchange(endpoint, request) for request in requests))
+            next_time += interval
+            now = loop.time()
+            if next_time <= now:
+                missed = int((now - next_time) // interval) + 1
+                endpoint.skipped += missed
+                next_time += missed * interval
+            await asyncio.sleep(next_time - now)
+    
+    async def _remove(self, endpoint):
+        await self._stop_poll(endpoint.name)
+        await endpoint.close()
+    
+    async def _shutdown(self):
+        for task in self._polls.values():
+            task.cancel()
+        self._polls = {}
+        for endpoint in self.endpoints.values():
+            await endpoint.close()
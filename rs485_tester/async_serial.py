@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+非同步串口傳輸模組
+
+AsyncRS485Tester 沿用 RS485Tester 的參數檢查、匯流排時序、請求/回應配對與日誌，但不做阻塞讀取：
+串口改為非阻塞模式，檔案描述子以 loop.add_reader() 登記到事件迴圈，資料到達時才讀出。
+多個 USB-RS485 轉接器因此能與 TCP 端點 (async_poller) 共用同一個事件迴圈，不必每個串口一個線程。
+Windows 的串口不是可 select 的檔案描述子，此時改為每個靜默間隔檢查一次 in_waiting，仍在事件迴圈中進行。
+"""
+import asyncio
+import time
+import serial
+try:
+    from .constants import DEFAULT_TURNAROUND_DELAY, MODBUS_MAX_FRAME_SIZE, MODBUS_EXCEPTION_FRAME_SIZE
+    from .data_utils import ModbusPacketAnalyzer
+    from .serial_utils import RS485Tester
+    from .transaction import is_broadcast_request
+    from .transport import TransportError, to_bytes, format_bytes
+except ImportError:
+    from constants import DEFAULT_TURNAROUND_DELAY, MODBUS_MAX_FRAME_SIZE, MODBUS_EXCEPTION_FRAME_SIZE
+    from data_utils import ModbusPacketAnalyzer
+    from serial_utils import RS485Tester
+    from transaction import is_broadcast_request
+    from transport import TransportError, to_bytes, format_bytes
+
+
+class AsyncRS485Tester(RS485Tester):
+    """以事件迴圈驅動的 RS485 串口
+    
+    send/receive/exchange/transact/close 為 RS485Tester 對應方法的協程版本，必須在同一個事件迴圈中使用；
+    半雙工匯流排上同一時間只進行一筆交易。具有 name 與 exchange()，可直接加入 AsyncPoller 輪詢。
+    """
+    
+    def __init__(self, port, baudrate=9600, bytesize=8, parity='N', stopbits=1, timeout=1, log_file=None,
+                 turnaround_delay=DEFAULT_TURNAROUND_DELAY, name=None):
+        super().__init__(port, baudrate, bytesize, parity, stopbits, timeout, log_file, turnaround_delay)
+        # 讀取一律立即返回，等待交給事件迴圈
+        self.ser.timeout = 0
+        self.name = name or port
+        self.skipped = 0
+        self._lock = asyncio.Lock()
+        self._loop = None
+        self._fd = None
+        self._rx = bytearray()
+        self._rx_first_ns = None
+        self._rx_last_ns = None
+        self._rx_event = None
+        self._rx_error = None
+    
+    def start_reader(self):
+        raise ConnectionError("非同步串口由事件迴圈接收，不使用背景接收線程")
+    
+    async def send(self, data):
+        """等待匯流排空閒後發送位元組，回傳實際送出的 bytes"""
+        data = to_bytes(data)
+        self._attach()
+        self._discard_stale_bytes()
+        delay = self.bus_timer.bus_free_at - time.perf_counter()
+        if delay > 0:
+            # 事件迴圈的計時只會晚不會早，訊框間隔仍然足夠
+            await asyncio.sleep(delay)
+        try:
+            return self._write_frame(data)
+        except serial.SerialException as e:
+            raise TransportError(f"發送資料失敗: {e}")
+        except Exception as e:
+            raise TransportError(f"串口寫入錯誤: {e}")
+    
+    async def receive(self, timeout=None):
+        """接收一個訊框 (bytes)，逾時回傳 b''"""
+        timeout = self._check_timeout(timeout)
+        async with self._lock:
+            self._attach()
+            return await self._receive_frame(timeout)
+    
+    async def exchange(self, request, timeout=None):
+        """發送請求並與回應配對，回傳含各階段時間戳的 Transaction"""
+        request = to_bytes(request)
+        timeout = self._check_timeout(timeout)
+        async with self._lock:
+            request = await self.send(request)
+            if is_broadcast_request(request):
+                return self._broadcast_transaction(request)
+            transaction = self._begin_transaction(request)
+            expected_length = ModbusPacketAnalyzer.expected_response_length(request)
+            response = await self._receive_frame(timeout, expected_length)
+            return self._finish_exchange(transaction, response, expected_length)
+    
+    async def transact(self, request, timeout=None):
+        """發送 Modbus 請求並回傳回應位元組，回應長度可由請求推算時收滿即返回"""
+        return (await self.exchange(request, timeout)).response
+    
+    async def close(self):
+        """取消事件迴圈登記並關閉串口與日誌"""
+        self._detach()
+        super().close()
+    
+    def _check_timeout(self, timeout):
+        if timeout is None:
+            return self.timeout
+        if timeout <= 0:
+            raise ValueError("逾時時間必須大於0")
+        return timeout
+    
+    def _attach(self):
+        """在目前的事件迴圈登記串口檔案描述子 (第一次使用、換了事件迴圈或讀取錯誤後)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._rx_error is not None:
+            # 沒有交易等待時發生的讀取錯誤，在下一次使用時回報
+            error, self._rx_error = self._rx_error, None
+            raise error
+        self._detach()
+        self._loop = loop
+        self._rx_event = asyncio.Event()
+        try:
+            fd = self.ser.fileno()
+            loop.add_reader(fd, self._on_readable)
+            self._fd = fd
+        except (AttributeError, NotImplementedError, OSError, ValueError, serial.SerialException):
+            self._fd = None  # 無法登記時改為輪詢 in_waiting
+    
+    def _detach(self):
+        if self._fd is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self._fd)
+        self._loop = None
+        self._fd = None
+    
+    def _on_readable(self):
+        """事件迴圈通知串口有資料：讀出目前所有位元組"""
+        try:
+            self._append(self.ser.read(self.ser.in_waiting or 1))
+        except (serial.SerialException, OSError) as e:
+            # 失效的檔案描述子會一直處於可讀狀態，必須取消登記，否則回呼會佔滿共用的事件迴圈
+            self._detach()
+            self._rx_error = TransportError(f"接收資料失敗: {e}")
+            self._rx_event.set()
+    
+    def _poll(self):
+        """輪詢模式：讀出已到達的位元組，回傳是否有新資料"""
+        try:
+            waiting = self.ser.in_waiting
+            return self._append(self.ser.read(waiting)) if waiting else False
+        except (serial.SerialException, OSError) as e:
+            raise TransportError(f"接收資料失敗: {e}")
+    
+    def _append(self, data):
+        if not data:
+            return False
+        now = time.perf_counter_ns()
+        if not self._rx:
+            # 一次讀出多個位元組時無法得知第一個位元組的到達時間，以傳送時間回推
+            self._rx_first_ns = now - int(self.bus_timer.frame_time(len(data) - 1) * 1e9)
+        self._rx += data
+        self._rx_last_ns = now
+        self._rx_event.set()
+        return True
+    
+    async def _wait_for_data(self, timeout):
+        """等待新資料到達，逾時回傳 False"""
+        if self._fd is None:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while not self._poll():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                await asyncio.sleep(min(self.silence_interval, remaining))
+            return True
+        self._rx_event.clear()
+        try:
+            await asyncio.wait_for(self._rx_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        if self._rx_error is not None:
+            error, self._rx_error = self._rx_error, None
+            raise error
+        return True
+    
+    def _frame_complete(self, expected_length):
+        """已收滿預期長度 (或例外回應長度) 時不必再等待靜默間隔"""
+        if len(self._rx) >= MODBUS_MAX_FRAME_SIZE:
+            return True
+        if expected_length is None or len(self._rx) < 2:
+            return False
+        if ModbusPacketAnalyzer.is_exception_response(self._rx[1]):
+            return len(self._rx) >= MODBUS_EXCEPTION_FRAME_SIZE
+        return len(self._rx) >= expected_length
+    
+    async def _receive_frame(self, timeout, expected_length=None):
+        """第一個位元組最多等待 timeout，之後線路靜默 3.5 字元時間或收滿預期長度即視為訊框結束"""
+        if not self._rx and not await self._wait_for_data(timeout):
+            log_message = "[接收] 無回應（可能逾時）"
+            print(log_message)
+            self._log_message(log_message)
+            return b''
+        while not self._frame_complete(expected_length) and await self._wait_for_data(self.silence_interval):
+            pass
+        
+        response = bytes(self._rx)
+        self._rx.clear()
+        self.last_rx_first_ns = self._rx_first_ns
+        self.last_rx_last_ns = self._rx_last_ns
+        self.bus_timer.mark_receive(self._last_slave_id, self._rx_last_ns / 1e9)
+        log_message = f"[接收] {format_bytes(response)}"
+        print(log_message)
+        self._log_message(log_message)
+        return response
+    
+    def _discard_stale_bytes(self):
+        """發送前丟棄尚未被取走的資料，避免混入下一筆回應"""
+        if self._fd is None:
+            self._poll()
+        if self._rx:
+            self._log_message(f"[接收] {format_bytes(self._rx)} (未預期資料，已丟棄)")
+            self._rx.clear()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+多連線廣播模組
+
+同一指令交給每個連線的工作線程：同一串口內依序執行，不同連線同時進行，
+整體耗時約等於最慢的連線。所有連線完成或超過整體期限時，彙整為一張結果表。
+"""
+import threading
+import time
+from collections import namedtuple
+try:
+    from .constants import BROADCAST_DEADLINE, BROADCAST_FAILED, BROADCAST_EXPIRED, PRIORITY_INTERACTIVE
+    from .constants import QUEUE_POLICY_BLOCK
+    from .pdu_decoder import ModbusPduDecoder
+    from .transaction import is_mbap_frame
+except ImportError:
+    from constants import BROADCAST_DEADLINE, BROADCAST_FAILED, BROADCAST_EXPIRED, PRIORITY_INTERACTIVE
+    from constants import QUEUE_POLICY_BLOCK
+    from pdu_decoder import ModbusPduDecoder
+    from transaction import is_mbap_frame
+
+
+def decode_reply(frame):
+    """解碼回應 (Modbus TCP 去除 MBAP 標頭)，無法解碼時回傳 None"""
+    if not frame:
+        return None
+    try:
+        if is_mbap_frame(frame):
+            return ModbusPduDecoder.decode_response(memoryview(frame)[6:], has_crc=False)
+        return ModbusPduDecoder.decode_response(frame)
+    except ValueError:
+        return None
+
+
+class BroadcastRow(namedtuple('BroadcastRow', ['name', 'status', 'latency_ms', 'response', 'decoded', 'error'])):
+    """單一連線的廣播結果；decoded 為 pdu_decoder 的解碼紀錄"""
+    __slots__ = ()
+    
+    @property
+    def success(self):
+        return self.error is None and self.status not in (BROADCAST_FAILED, BROADCAST_EXPIRED)
+
+
+class Broadcast:
+    """進行中的一次廣播，所有連線完成或超過期限時呼叫 on_complete(broadcast)"""
+    
+    def __init__(self, command, names, deadline, on_complete=None):
+        self.command = command
+        self.names = tuple(names)
+        self.deadline = deadline
+        self.on_complete = on_complete
+        self.started_ns = time.perf_counter_ns()
+        self.finished_ns = None
+        self._results = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._timer = None
+    
+    def _start_timer(self):
+        self._timer = threading.Timer(self.deadline, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def record(self, row):
+        """記錄一個連線的結果 (超過期限後才到的結果忽略)"""
+        with self._lock:
+            if self._done.is_set() or row.name in self._results:
+                return
+            self._results[row.name] = row
+            finished = len(self._results) == len(self.names)
+        if finished:
+            self._finish()
+    
+    def _expire(self):
+        with self._lock:
+            if self._done.is_set():
+                return
+            for name in self.names:
+                if name not in self._results:
+                    self._results[name] = BroadcastRow(name, BROADCAST_EXPIRED, None, b'', None, None)
+        self._finish()
+    
+    def _finish(self):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.finished_ns = time.perf_counter_ns()
+            self._done.set()
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.on_complete:
+            try:
+                self.on_complete(self)
+            except Exception as e:
+                print(f"警告: 廣播完成回呼發生錯誤: {e}")
+    
+    @property
+    def done(self):
+        return self._done.is_set()
+    
+    @property
+    def elapsed_ms(self):
+        end_ns = self.finished_ns if self.finished_ns is not None else time.perf_counter_ns()
+        return (end_ns - self.started_ns) / 1e6
+    
+    def rows(self):
+        """依連線順序排列的結果表"""
+        with self._lock:
+            return [self._results[name] for name in self.names if name in self._results]
+    
+    def wait(self, timeout=None):
+        """等待完成並回傳結果表"""
+        self._done.wait(timeout)
+        return self.rows()
+    
+    def summary(self):
+        rows = self.rows()
+        return {
+            "total": len(self.names),
+            "success": sum(1 for row in rows if row.success),
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+
+class BroadcastExecutor:
+    """在多個連線上同時執行同一指令並彙整結果
+    
+    execute_for(name) 回傳在該連線工作線程中執行指令的函式 (回傳 Transaction)。
+    """
+    
+    def __init__(self, connection_manager, execute_for):
+        self.connection_manager = connection_manager
+        self.execute_for = execute_for
+    
+    def sendable_connections(self):
+        return [name for name, conn_info in self.connection_manager.get_all_connections().items()
+                if conn_info['type'] != 'Sniffer']
+    
+    def broadcast(self, command, names=None, deadline=BROADCAST_DEADLINE, on_complete=None):
+        """開始廣播並立即回傳 Broadcast；期限內未輪到的請求不會送出"""
+        if deadline <= 0:
+            raise ValueError("廣播期限必須大於0")
+        names = self.sendable_connections() if names is None else list(names)
+        broadcast = Broadcast(command, names, deadline, on_complete)
+        if not names:
+            broadcast._finish()
+            return broadcast
+        
+        broadcast._start_timer()
+        for name in names:
+            try:
+                worker = self.connection_manager.get_worker(name, self.execute_for(name))
+                accepted = worker.submit(command, self._callback(broadcast, name), QUEUE_POLICY_BLOCK,
+                                         timeout=0, priority=PRIORITY_INTERACTIVE, deadline=deadline)
+                if not accepted:
+                    raise ConnectionError("發送佇列已滿")
+            except (ValueError, ConnectionError) as e:
+                broadcast.record(BroadcastRow(name, BROADCAST_FAILED, None, b'', None, str(e)))
+        return broadcast
+    
+    def _callback(self, broadcast, name):
+        def on_done(transaction, error):
+            stats = self.connection_manager.get_statistics(name)
+            if error is not None:
+                if stats:
+                    stats.add_transaction(False)
+                broadcast.record(BroadcastRow(name, BROADCAST_FAILED, None, b'', None, str(error)))
+                return
+            if stats:
+                stats.add_exchange(transaction)
+            broadcast.record(BroadcastRow(name, transaction.status, transaction.latency_ms,
+                                          transaction.response, decode_reply(transaction.response), None))
+        return on_done
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+RS485 匯流排被動監聽模組
+"""
+import datetime
+import queue
+import threading
+import time
+from collections import namedtuple
+import serial
+try:
+    from .constants import DEFAULT_SNIFFER_BAUDRATE, SNIFFER_QUEUE_SIZE, SNIFFER_IDLE_FLUSH, READER_JOIN_TIMEOUT
+    from .bus_timing import calc_silence_interval
+    from .serial_reader import SerialReader
+    from .data_utils import ModbusPacketAnalyzer, ModbusStreamFramer
+except ImportError:
+    from constants import DEFAULT_SNIFFER_BAUDRATE, SNIFFER_QUEUE_SIZE, SNIFFER_IDLE_FLUSH, READER_JOIN_TIMEOUT
+    from bus_timing import calc_silence_interval
+    from serial_reader import SerialReader
+    from data_utils import ModbusPacketAnalyzer, ModbusStreamFramer
+
+
+DIRECTION_REQUEST = "主站請求"
+DIRECTION_RESPONSE = "從站回應"
+DIRECTION_UNKNOWN = "未知"
+
+# data 為已複製的 bytes，時間戳為 perf_counter_ns
+SniffedFrame = namedtuple('SniffedFrame', ['data', 'first_byte_ns', 'last_byte_ns', 'crc_ok', 'direction'])
+
+
+class BusSniffer:
+    """被動監聽 RS485 匯流排，只接收不發送
+    
+    管線: 接收線程 (SerialReader) → 解碼線程 → 記錄線程，各階段以有界佇列連接。
+    佇列滿時接收端會等待而非丟棄，佇列長度小於環形緩衝區可容納的訊框數，
+    因此佇列中的 memoryview 不會被覆寫。
+    """
+    
+    def __init__(self, port, baudrate=DEFAULT_SNIFFER_BAUDRATE, bytesize=8, parity='N', stopbits=1,
+                 log_file=None, on_frame=None, queue_size=SNIFFER_QUEUE_SIZE):
+        if not port or not port.strip():
+            raise ValueError("串口名稱不能為空")
+        
+        if baudrate not in [9600, 19200, 38400, 57600, 115200]:
+            raise ValueError(f"不支援的波特率: {baudrate}")
+        
+        silence_interval = calc_silence_interval(baudrate, bytesize, parity, stopbits)
+        try:
+            self.ser = serial.Serial(
+                port=port,
+                baudrate=baudrate,
+                bytesize=bytesize,
+                parity=parity,
+                stopbits=stopbits,
+                timeout=silence_interval
+            )
+        except serial.SerialException as e:
+            raise ConnectionError(f"無法開啟串口 {port}: {e}")
+        except Exception as e:
+            raise ConnectionError(f"串口初始化失敗: {e}")
+        
+        self.port = port
+        self.on_frame = on_frame
+        self.reader = SerialReader(self.ser, silence_interval)
+        self.framer = ModbusStreamFramer()
+        self.decode_queue = queue.Queue(queue_size)
+        self.log_queue = queue.Queue(queue_size)
+        self.threads = []
+        self.running = False
+        
+        # 統計
+        self.frame_count = 0
+        self.byte_count = 0
+        self.crc_errors = 0
+        
+        self._pending_request = None
+        # perf_counter_ns 與系統時間的差值，用於將訊框時間戳轉為日誌時間
+        self._clock_offset_ns = time.time_ns() - time.perf_counter_ns()
+        
+        self.log_file = log_file
+        self.log_handle = None
+        if log_file:
+            try:
+                self.log_handle = open(log_file, 'a', encoding='utf-8')
+                self._write_log_line(time.perf_counter_ns(), f"--- RS485 Sniffer Session Started on Port {port} ---")
+            except (OSError, IOError) as e:
+                print(f"警告: 無法開啟日誌文件 {log_file}: {e}")
+                self.log_handle = None
+    
+    def start(self):
+        """啟動監聽"""
+        if self.running:
+            return
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._decode_loop, daemon=True),
+            threading.Thread(target=self._log_loop, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        self.reader.subscribe(self.decode_queue.put)
+        self.reader.start()
+    
+    def stop(self):
+        """停止監聽，已接收的訊框會處理完畢"""
+        if not self.running:
+            return
+        self.reader.stop()
+        self.reader.unsubscribe(self.decode_queue.put)
+        self.running = False
+        self.decode_queue.put(None)
+        for thread in self.threads:
+            thread.join(READER_JOIN_TIMEOUT)
+        self.threads = []
+        if self.reader.error:
+            print(f"警告: 監聽接收中斷: {self.reader.error}")
+    
+    def close(self):
+        """停止監聽並關閉串口與日誌"""
+        self.stop()
+        try:
+            if self.ser:
+                self.ser.close()
+        except serial.SerialException as e:
+            print(f"警告: 關閉串口時發生錯誤: {e}")
+        except Exception as e:
+            print(f"關閉串口時發生未預期錯誤: {e}")
+        
+        if self.log_handle:
+            try:
+                self._write_log_line(time.perf_counter_ns(), "--- RS485 Sniffer Session Ended ---")
+                self.log_handle.close()
+            except (OSError, IOError) as e:
+                print(f"警告: 關閉日誌文件時發生錯誤: {e}")
+            finally:
+                self.log_handle = None
+    
+    def _decode_loop(self):
+        """解碼階段: 複製出環形緩衝區，以 CRC 切割器重新切割並判斷方向
+        
+        靜默時間切出的片段可能黏在一起或被拆開，交由 ModbusStreamFramer 找出實際邊界；
+        匯流排閒置時將無法成框的剩餘位元組視為錯誤訊框輸出。
+        """
+        first_byte_ns = last_byte_ns = 0
+        while True:
+            try:
+                frame = self.decode_queue.get(timeout=SNIFFER_IDLE_FLUSH)
+            except queue.Empty:
+                self._emit_segments(self.framer.flush(), first_byte_ns, last_byte_ns)
+                continue
+            if frame is None:
+                self._emit_segments(self.framer.flush(), first_byte_ns, last_byte_ns)
+                self.log_queue.put(None)
+                return
+            if not self.framer.buffer:
+                first_byte_ns = frame.first_byte_ns
+            last_byte_ns = frame.last_byte_ns
+            self._emit_segments(self.framer.feed(frame.data), first_byte_ns, last_byte_ns)
+    
+    def _emit_segments(self, segments, first_byte_ns, last_byte_ns):
+        """將切割結果送往記錄階段"""
+        for data, valid in segments:
+            direction = self._classify(data, valid)
+            self.log_queue.put(SniffedFrame(data, first_byte_ns, last_byte_ns, valid, direction))
+    
+    def _classify(self, data, crc_ok):
+        """依前一筆請求判斷訊框為主站請求或從站回應"""
+        if not crc_ok:
+            return DIRECTION_UNKNOWN
+        
+        pending = self._pending_request
+        if pending:
+            slave_id, func_code, expected_length = pending
+            if data[0] == slave_id:
+                if data[1] == (func_code | 0x80):
+                    self._pending_request = None
+                    return DIRECTION_RESPONSE
+                if data[1] == func_code and (expected_length is None or len(data) == expected_length):
+                    self._pending_request = None
+                    return DIRECTION_RESPONSE
+        
+        self._pending_request = (data[0], data[1], ModbusPacketAnalyzer.expected_response_length(data))
+        return DIRECTION_REQUEST
+    
+    def _log_loop(self):
+        """記錄階段: 統計、格式化並寫入日誌，最後通知介面"""
+        while True:
+            frame = self.log_queue.get()
+            if frame is None:
+                return
+            self.frame_count += 1
+            self.byte_count += len(frame.data)
+            if not frame.crc_ok:
+                self.crc_errors += 1
+            
+            if self.log_handle:
+                # 佇列清空時才 flush，滿載時避免每個訊框都觸發磁碟寫入
+                self._write_log_line(frame.first_byte_ns, f"[接收] {self.format_frame(frame)}",
+                                     flush=self.log_queue.empty())
+            
+            if self.on_frame:
+                try:
+                    self.on_frame(frame)
+                except Exception as e:
+                    print(f"警告: 監聽訊框回呼失敗: {e}")
+    
+    @staticmethod
+    def format_frame(frame):
+        """將監聽訊框格式化為日誌文字"""
+        note = frame.direction if frame.crc_ok else "CRC 錯誤"
+        return f"{frame.data.hex(' ').upper()} ({note})"
+    
+    def _write_log_line(self, timestamp_ns, message, flush=True):
+        """以訊框時間戳寫入日誌"""
+        timestamp = datetime.datetime.fromtimestamp((timestamp_ns + self._clock_offset_ns) / 1e9)
+        self.log_handle.write(f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}] {message}\n")
+        if flush:
+            self.log_handle.flush()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+匯流排時序計算與精確等待
+"""
+import time
+try:
+    from .constants import MODBUS_FIXED_T35, MIN_SILENCE_INTERVAL, SPIN_WAIT_THRESHOLD, DEFAULT_TURNAROUND_DELAY
+    from .constants import BROADCAST_TURNAROUND_DELAY
+except ImportError:
+    from constants import MODBUS_FIXED_T35, MIN_SILENCE_INTERVAL, SPIN_WAIT_THRESHOLD, DEFAULT_TURNAROUND_DELAY
+    from constants import BROADCAST_TURNAROUND_DELAY
+
+
+def calc_char_time(baudrate, bytesize=8, parity='N', stopbits=1):
+    """計算單一字元在線路上的傳輸時間（秒）"""
+    bits = 1 + bytesize + (0 if parity == 'N' else 1) + stopbits  # 起始位 + 資料位 + 同位位 + 停止位
+    return bits / baudrate
+
+
+def calc_silence_interval(baudrate, bytesize=8, parity='N', stopbits=1):
+    """計算 Modbus RTU 訊框結束的靜默時間 (3.5 字元時間，秒)"""
+    if baudrate > 19200:
+        # Modbus 規範: 高波特率下使用固定 1.75ms，避免計時器解析度造成誤判
+        return MODBUS_FIXED_T35
+    return max(3.5 * calc_char_time(baudrate, bytesize, parity, stopbits), MIN_SILENCE_INTERVAL)
+
+
+def sleep_until(deadline, spin_threshold=SPIN_WAIT_THRESHOLD):
+    """等待至 perf_counter 時間點: 先 sleep 大部分時間，最後以忙碌迴圈補足以達次毫秒精度"""
+    remaining = deadline - time.perf_counter()
+    if remaining > spin_threshold:
+        time.sleep(remaining - spin_threshold)
+    while time.perf_counter() < deadline:
+        pass
+
+
+def precise_sleep(duration, spin_threshold=SPIN_WAIT_THRESHOLD):
+    """精確等待指定秒數"""
+    if duration > 0:
+        sleep_until(time.perf_counter() + duration, spin_threshold)
+
+
+class BusTimer:
+    """匯流排轉換排程器，依實際傳輸時間計算下一筆請求最早可發送的時間點"""
+    
+    def __init__(self, baudrate, bytesize=8, parity='N', stopbits=1, turnaround_delay=DEFAULT_TURNAROUND_DELAY,
+                 broadcast_delay=BROADCAST_TURNAROUND_DELAY):
+        if turnaround_delay < 0 or broadcast_delay < 0:
+            raise ValueError("轉換延遲不能小於0")
+        
+        self.char_time = calc_char_time(baudrate, bytesize, parity, stopbits)
+        self.silence_interval = calc_silence_interval(baudrate, bytesize, parity, stopbits)
+        self.default_turnaround = turnaround_delay
+        self.turnaround_delays = {}
+        self.broadcast_delay = broadcast_delay
+        self.bus_free_at = 0.0
+    
+    def frame_time(self, nbytes):
+        """計算訊框在線路上的傳輸時間（秒）"""
+        return nbytes * self.char_time
+    
+    def set_turnaround_delay(self, slave_id, delay):
+        """設定指定裝置的轉換延遲（秒）"""
+        if delay < 0:
+            raise ValueError("轉換延遲不能小於0")
+        self.turnaround_delays[slave_id] = delay
+    
+    def get_turnaround_delay(self, slave_id):
+        """取得指定裝置的轉換延遲（秒）"""
+        return self.turnaround_delays.get(slave_id, self.default_turnaround)
+    
+    def wait_bus_free(self):
+        """等待至匯流排可發送下一筆訊框"""
+        sleep_until(self.bus_free_at)
+    
+    def mark_transmit(self, nbytes, start_time=None):
+        """記錄一次發送: 訊框傳輸完畢並經過 3.5 字元間隔後匯流排才再次空閒"""
+        if start_time is None:
+            start_time = time.perf_counter()
+        self.bus_free_at = start_time + self.frame_time(nbytes) + self.silence_interval
+        return self.bus_free_at
+    
+    def mark_broadcast(self, nbytes, start_time=None):
+        """記錄一次廣播: 不會有回應，訊框傳輸完畢後需等待從站處理廣播的轉換延遲"""
+        if start_time is None:
+            start_time = time.perf_counter()
+        self.bus_free_at = start_time + self.frame_time(nbytes) + max(self.silence_interval, self.broadcast_delay)
+        return self.bus_free_at
+    
+    def mark_receive(self, slave_id=None, end_time=None):
+        """記錄收到最後一個位元組: 需經過訊框間隔與裝置轉換延遲才可再次發送"""
+        if end_time is None:
+            end_time = time.perf_counter()
+        gap = max(self.silence_interval, self.get_turnaround_delay(slave_id))
+        self.bus_free_at = max(self.bus_free_at, end_time + gap)
+        return self.bus_free_at
@@ -7,6 +7,10 @@ from log_exporter import LogToExcelExporter
 
 # 從 serial_utils.py 匯入我們定義的類別和函式
 from serial_utils import RS485Tester, list_available_ports
+from bus_sniffer import BusSniffer
+from constants import DEFAULT_SNIFFER_BAUDRATE, MODBUS_MAX_SLAVE_ID
+from slave_scanner import SlaveScanner, ScanTarget, parse_id_range, probe_timeout
+from transport import to_bytes
 
 def find_real_port(user_input, ports):
     """
@@ -37,6 +41,81 @@ def find_real_port(user_input, ports):
 
     return None, None # 如果沒有找到匹配的埠
 
+def run_sniffer(port, log_path):
+    """
+    監聽模式：只接收匯流排上主站與從站的所有訊框，不發送任何資料。
+    """
+    baud_input = input(f"請輸入波特率（直接按 Enter 使用 {DEFAULT_SNIFFER_BAUDRATE}）: ").strip()
+    baudrate = int(baud_input) if baud_input.isdigit() else DEFAULT_SNIFFER_BAUDRATE
+
+    sniffer = BusSniffer(port=port, baudrate=baudrate, log_file=log_path,
+                         on_frame=lambda frame: print(f"📡 {BusSniffer.format_frame(frame)}"))
+    sniffer.start()
+    print(f"👂 開始監聽 {port} ({baudrate})，不會發送任何資料。")
+    print(f"📝 監聽日誌將儲存到：{os.path.abspath(log_path)}")
+
+    try:
+        input("按下 Enter 鍵停止監聽...\n")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sniffer.close()
+        print(f"✅ 監聽結束，共 {sniffer.frame_count} 個訊框（{sniffer.byte_count} 位元組），CRC 錯誤 {sniffer.crc_errors} 個。")
+
+    # 嘗試將監聽日誌轉成 Excel
+    try:
+        exporter = LogToExcelExporter(log_file_path=log_path)
+        exporter.export_to_excel()
+    except Exception as e:
+        print(f"❌ 匯出 Excel 發生錯誤：{e}")
+
+def run_scan(ports):
+    """
+    掃描模式：在一或多個 COM Port 上同時掃描有回應的從站位址，輸出裝置清單。
+    """
+    port_input = input("請輸入要掃描的 COM Port（可用逗號分隔多個，例如 1,2 或 COM3,COM4）: ").strip()
+    baud_input = input("請輸入波特率（直接按 Enter 使用 9600）: ").strip()
+    baudrate = int(baud_input) if baud_input.isdigit() else 9600
+    id_input = input(f"請輸入位址範圍（十六進位，直接按 Enter 使用 01-{MODBUS_MAX_SLAVE_ID:02X}）: ").strip()
+
+    try:
+        slave_ids = parse_id_range(id_input or f"01-{MODBUS_MAX_SLAVE_ID:02X}")
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        return
+
+    testers = []
+    try:
+        for item in filter(None, (part.strip() for part in port_input.split(","))):
+            if item.isdigit() and 0 < int(item) <= len(ports):
+                real_port = ports[int(item) - 1][0]
+            else:
+                real_port, _ = find_real_port(item, ports)
+            if real_port is None:
+                print(f"⚠️ 找不到對應 '{item}' 的 COM Port，略過。")
+                continue
+            try:
+                testers.append((real_port, RS485Tester(port=real_port, baudrate=baudrate)))
+            except (ValueError, ConnectionError) as e:
+                print(f"❌ 無法開啟 Port {real_port}：{e}")
+
+        if not testers:
+            print("❌ 沒有可掃描的 COM Port。")
+            return
+
+        # 每個 Port 在獨立線程中掃描，探測逾時依波特率計算
+        targets = [ScanTarget(port, tester.exchange, tester.timeout, probe_timeout(tester.bus_timer), False)
+                   for port, tester in testers]
+        print(f"🔍 開始掃描 {len(targets)} 個 Port 的 {len(slave_ids)} 個位址...")
+        inventory, errors, elapsed_ms = SlaveScanner().scan(targets, slave_ids)
+        print(SlaveScanner.format_inventory(inventory))
+        for port, error in errors.items():
+            print(f"❌ {port}：{error}")
+        print(f"✅ 掃描完成，找到 {len(inventory)} 個從站，耗時 {elapsed_ms / 1000:.1f} 秒。")
+    finally:
+        for _, tester in testers:
+            tester.close()
+
 def main():
     print("🔌 正在掃描可用的 COM Port...")
     ports = list_available_ports()
@@ -50,6 +129,13 @@ def main():
     for i, (dev, desc) in enumerate(ports):
         print(f"{i+1}. {dev} （裝置描述: {desc}）") # 顯示實際的 COM port 名稱和描述
 
+    # --- 選擇模式 ---
+    mode = input("請選擇模式：1. 主站測試（預設） 2. 監聽模式（只接收不發送） 3. 掃描從站位址: ").strip()
+    sniff_mode = mode == "2"
+    if mode == "3":
+        run_scan(ports)
+        return
+
     tester = None # 初始化 tester 變數為 None，確保在 finally 塊中可被存取
 
     # --- 選擇並連接 COM Port ---
@@ -98,8 +184,13 @@ def main():
             # 組合完整的日誌檔案路徑
             full_log_path = os.path.join(log_directory, log_filename)
 
+            if sniff_mode:
+                run_sniffer(real_port, full_log_path)
+                return
+
             # 實例化 RS485Tester，並傳遞日誌檔案路徑
             tester = RS485Tester(port=real_port, baudrate=9600, log_file=full_log_path)
+            tester.start_reader() # 啟動背景接收，延遲到達的位元組不會混入下一筆回應
             print(f"✅ 成功連接到 {real_port}。")
             print(f"📝 通訊日誌將儲存到：{os.path.abspath(full_log_path)}") # 顯示絕對路徑
             break # 成功連接並初始化後跳出迴圈
@@ -143,8 +234,9 @@ def main():
                     continue
 
                 try:
-                    tester.send_hex(clean_hex_cmd)
-                    tester.receive_response()
+                    transaction = tester.exchange(to_bytes(clean_hex_cmd))
+                    if transaction.answered:
+                        print(f"⏱️ 延遲 {transaction.latency_ms:.1f} ms，轉換 {transaction.turnaround_ms:.1f} ms")
                 except Exception as e:
                     print(f"❌ 傳送/接收時發生錯誤：{e}")
                     tester._log_message(f"❌ 傳送/接收時發生錯誤：{e}") # 也記錄到日誌
@@ -4,65 +4,266 @@
 """
 import socket
 import datetime
+import threading
 import time
 from collections import deque
+from types import MappingProxyType
 try:
-    from .constants import DEFAULT_TIMEOUT, MAX_RESPONSE_TIMES
+    from .constants import DEFAULT_TIMEOUT, MAX_RESPONSE_TIMES, TCP_RESPONSE_TIMEOUT
+    from .constants import MBAP_HEADER_SIZE, MBAP_MAX_ADU_SIZE, DEFAULT_PIPELINE_WINDOW, MAX_PIPELINE_WINDOW
+    from .constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+    from .constants import FRAME_UNMATCHED, FRAME_BROADCAST
+    from .data_utils import ModbusPacketAnalyzer
+    from .transaction import Transaction, TransactionCorrelator, is_mbap_frame, is_broadcast_request
+    from .transaction import broadcast_transaction
+    from .latency_histogram import LatencyHistogram, LatencyTracker
+    from .connection_worker import ConnectionWorker
+    from .device_tuning import DeviceTuner
+    from .transport import Transport, TransportError, to_bytes
+    from .connection_pool import TCPConnectionPool, configure_socket
 except ImportError:
-    from constants import DEFAULT_TIMEOUT, MAX_RESPONSE_TIMES
+    from constants import DEFAULT_TIMEOUT, MAX_RESPONSE_TIMES, TCP_RESPONSE_TIMEOUT
+    from constants import MBAP_HEADER_SIZE, MBAP_MAX_ADU_SIZE, DEFAULT_PIPELINE_WINDOW, MAX_PIPELINE_WINDOW
+    from constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+    from constants import FRAME_UNMATCHED, FRAME_BROADCAST
+    from data_utils import ModbusPacketAnalyzer
+    from transaction import Transaction, TransactionCorrelator, is_mbap_frame, is_broadcast_request
+    from transaction import broadcast_transaction
+    from latency_histogram import LatencyHistogram, LatencyTracker
+    from connection_worker import ConnectionWorker
+    from device_tuning import DeviceTuner
+    from transport import Transport, TransportError, to_bytes
+    from connection_pool import TCPConnectionPool, configure_socket
 
 
-class ConnectionStats:
-    """連線統計資料"""
+class _StatsShard:
+    """單一線程專屬的統計計數，只由擁有者線程寫入，因此不需要鎖"""
     
-    def __init__(self, name):
-        self.name = name
+    COUNTERS = ('total_sent', 'total_received', 'errors', 'crc_errors', 'truncated_frames', 'exception_responses',
+                'broadcasts')
+    __slots__ = COUNTERS + ('owner', 'latency', 'device_latency')
+    
+    def __init__(self, owner=None):
+        self.owner = owner
         self.total_sent = 0
         self.total_received = 0
         self.errors = 0
+        self.crc_errors = 0
+        self.truncated_frames = 0
+        self.exception_responses = 0
+        self.broadcasts = 0
+        self.latency = LatencyTracker()
+        self.device_latency = {}
+    
+    def fold(self, other):
+        """併入另一個分片 (已結束線程的分片)"""
+        for name in _StatsShard.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.latency.merge(other.latency)
+        for slave_id, tracker in other.device_latency.items():
+            if slave_id not in self.device_latency:
+                self.device_latency[slave_id] = LatencyTracker()
+            self.device_latency[slave_id].merge(tracker)
+
+
+def _merged_counter(name):
+    """讀取時加總所有分片的計數"""
+    return property(lambda self: sum(getattr(shard, name) for shard in self._shards),
+                    doc=f"{name} (所有線程分片的合計)")
+
+
+class ConnectionStats:
+    """連線統計資料
+
+    每個寫入線程各自累加自己的分片，讀取時才合併，寫入路徑不需要鎖；
+    分片清單採寫入時複製 (copy-on-write)，讀取者只讀取當下的 tuple。
+    """
+    
+    total_sent = _merged_counter('total_sent')
+    total_received = _merged_counter('total_received')
+    errors = _merged_counter('errors')
+    crc_errors = _merged_counter('crc_errors')
+    truncated_frames = _merged_counter('truncated_frames')
+    exception_responses = _merged_counter('exception_responses')
+    broadcasts = _merged_counter('broadcasts')
+    
+    def __init__(self, name):
+        self.name = name
         self.response_times = deque(maxlen=MAX_RESPONSE_TIMES)
+        self.turnaround_times = deque(maxlen=MAX_RESPONSE_TIMES)
         self.last_activity = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # 第一個分片保存已結束線程併入的計數
+        self._shards = (_StatsShard(),)
+    
+    def _shard(self):
+        """取得目前線程的分片，第一次使用時建立並順便回收已結束線程的分片"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is not None:
+            return shard
         
-    def add_transaction(self, success, response_time=None):
-        """記錄一次交易"""
-        self.total_sent += 1
+        shard = _StatsShard(threading.current_thread())
+        with self._lock:
+            retired = self._shards[0]
+            live, dead = [], []
+            for existing in self._shards[1:]:
+                (live if existing.owner.is_alive() else dead).append(existing)
+            if dead:
+                # 建立新的合計分片再替換 tuple，讀取者不會看到重複計算的中間狀態
+                merged = _StatsShard()
+                merged.fold(retired)
+                for old in dead:
+                    merged.fold(old)
+                retired = merged
+            self._shards = (retired, *live, shard)
+        self._local.shard = shard
+        return shard
+    
+    def add_transaction(self, success, response_time=None, frame_status=None):
+        """記錄一次交易；frame_status 為訊框檢查結果 (FRAME_*)"""
+        shard = self._shard()
+        shard.total_sent += 1
         if success:
-            self.total_received += 1
+            shard.total_received += 1
             if response_time is not None:
                 self.response_times.append(response_time)
+                shard.latency.record(response_time)
         else:
-            self.errors += 1
+            shard.errors += 1
+        if frame_status == FRAME_CRC_ERROR:
+            shard.crc_errors += 1
+        elif frame_status == FRAME_TRUNCATED:
+            shard.truncated_frames += 1
+        elif frame_status == FRAME_EXCEPTION:
+            shard.exception_responses += 1
         self.last_activity = datetime.datetime.now()
     
+    def add_exchange(self, transaction):
+        """記錄一筆已配對的交易，延遲與轉換時間取自實際量測的時間戳"""
+        if transaction.status == FRAME_BROADCAST:
+            # 廣播本來就沒有回應，只計入發送數，不算錯誤也不影響成功率
+            shard = self._shard()
+            shard.total_sent += 1
+            shard.broadcasts += 1
+            self.last_activity = datetime.datetime.now()
+            return
+        self.add_transaction(transaction.success, transaction.latency_ms, transaction.status)
+        if not transaction.success:
+            return
+        turnaround = transaction.turnaround_ms
+        if turnaround is not None:
+            self.turnaround_times.append(turnaround)
+        slave_id = transaction.slave_id
+        if slave_id is not None and transaction.latency_ms is not None:
+            shard = self._shard()
+            tracker = shard.device_latency.get(slave_id)
+            if tracker is None:
+                tracker = shard.device_latency[slave_id] = LatencyTracker()
+            tracker.record(transaction.latency_ms)
+    
+    def get_device_ids(self):
+        """取得有延遲紀錄的從站位址"""
+        device_ids = set()
+        for shard in self._shards:
+            device_ids.update(list(shard.device_latency))
+        return sorted(device_ids)
+    
+    def get_latency_summary(self, window=LatencyTracker.SESSION, slave_id=None):
+        """取得延遲百分位數 (p50/p95/p99/最大值)，可指定時間窗與從站"""
+        merged = LatencyHistogram()
+        for shard in self._shards:
+            tracker = shard.latency if slave_id is None else shard.device_latency.get(slave_id)
+            if tracker is not None:
+                merged.merge(tracker.histogram(window))
+        return merged.summary()
+    
     def get_success_rate(self):
         """取得成功率"""
-        if self.total_sent == 0:
+        expected = self.total_sent - self.broadcasts
+        if expected <= 0:
             return 0.0
-        return (self.total_received / self.total_sent) * 100
+        return (self.total_received / expected) * 100
     
     def get_avg_response_time(self):
         """取得平均回應時間"""
-        if not self.response_times:
+        response_times = list(self.response_times)
+        if not response_times:
             return 0.0
-        return sum(self.response_times) / len(self.response_times)
+        return sum(response_times) / len(response_times)
+    
+    def get_avg_turnaround_time(self):
+        """取得平均匯流排轉換時間 (請求送完到回應開始)"""
+        turnaround_times = list(self.turnaround_times)
+        if not turnaround_times:
+            return 0.0
+        return sum(turnaround_times) / len(turnaround_times)
 
 
-class TCPConnection:
-    """TCP 連線管理"""
+class TCPConnection(Transport):
+    """TCP 連線管理
+    
+    三種模式：原始資料、RTU over TCP (閘道原樣轉送含 CRC 的 RTU 訊框)，以及
+    Modbus TCP (mbap=True)：請求自動加上 MBAP 標頭並配發交易 ID，回應依長度欄位
+    讀入重複使用的緩衝區，同一連線上最多可有 window 筆請求同時等待回應。
     
-    def __init__(self, host, port):
+    指定 pool (TCPConnectionPool) 時由連線池取得 Socket：連線中斷後下一筆請求自動改用連線池
+    背景重新建立的連線 (最多等待一個回應逾時)，不需要移除再重新加入連線。
+    """
+    
+    def __init__(self, host, port, rtu_over_tcp=False, timeout=TCP_RESPONSE_TIMEOUT, mbap=False,
+                 window=DEFAULT_PIPELINE_WINDOW, pool=None):
+        if timeout <= 0:
+            raise ValueError("逾時時間必須大於0")
+        if rtu_over_tcp and mbap:
+            raise ValueError("RTU over TCP 與 Modbus TCP 不能同時使用")
+        if not 1 <= window <= MAX_PIPELINE_WINDOW:
+            raise ValueError(f"管線深度必須在 1~{MAX_PIPELINE_WINDOW} 之間")
         self.host = host
         self.port = port
+        self.timeout = timeout
         self.socket = None
         self.connected = False
+        # RTU over TCP: 閘道器原樣轉送含 CRC 的 RTU 訊框，接收時需檢查 CRC
+        self.rtu_over_tcp = rtu_over_tcp
+        self.last_frame_status = None
+        self._expected_length = None
+        self.correlator = TransactionCorrelator(mbap=not rtu_over_tcp)
+        # 各從站 (單元 ID) 的讀取數量上限與延遲學習
+        self.tuner = DeviceTuner()
+        self.mbap = mbap
+        self.window = window
+        # 接收緩衝區只配置一次；逾時時已讀取的部分訊框保留到下次繼續讀取
+        self._rx_buffer = bytearray(MBAP_MAX_ADU_SIZE)
+        self._rx_view = memoryview(self._rx_buffer)
+        self._rx_filled = 0
+        self.pool = pool
+        self.reconnects = 0
+        self._reconnect = False
         
+    @property
+    def reconnecting(self):
+        """連線中斷且正等待連線池重新連線"""
+        return self._reconnect and not self.connected
+    
     def connect(self):
         """建立 TCP 連線"""
+        if self.pool is not None:
+            self.pool.register(self.host, self.port)
+            try:
+                self._attach(self.pool.acquire(self.host, self.port, DEFAULT_TIMEOUT, fail_fast=True))
+            except TransportError as e:
+                self.pool.unregister(self.host, self.port)
+                raise ConnectionError(str(e))
+            self._reconnect = True
+            return True
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.settimeout(DEFAULT_TIMEOUT)
             self.socket.connect((self.host, self.port))
+            configure_socket(self.socket)
             self.connected = True
+            self._rx_filled = 0
             return True
         except socket.timeout:
             raise ConnectionError(f"TCP 連線逾時: {self.host}:{self.port}")
@@ -71,35 +272,222 @@ class TCPConnection:
         except Exception as e:
             raise ConnectionError(f"未知錯誤: {e}")
     
-    def send_data(self, data):
-        """發送資料"""
+    def _attach(self, sock):
+        """改用連線池提供的 Socket"""
+        sock.settimeout(DEFAULT_TIMEOUT)
+        self.socket = sock
+        self.connected = True
+        self._rx_filled = 0
+    
+    def _drop(self, error):
+        """連線已無法使用：關閉 Socket、放棄等待中的交易，回傳 error 供呼叫者拋出"""
+        if self.socket:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+        self.socket = None
+        self.connected = False
+        self._rx_filled = 0
+        self.correlator.pending.clear()
+        return error
+    
+    def send(self, data):
+        """發送位元組，回傳實際送出的 bytes"""
+        data = to_bytes(data)
         self._ensure_connected()
         try:
             self.socket.send(data)
+            if self.rtu_over_tcp:
+                self._expected_length = ModbusPacketAnalyzer.expected_response_length(data)
         except socket.error as e:
-            self.connected = False
-            raise ConnectionError(f"發送資料失敗: {e}")
+            raise self._drop(TransportError(f"發送資料失敗: {e}"))
+        return data
+    
+    def send_data(self, data):
+        """發送資料 (舊介面，同 send)"""
+        self.send(data)
+    
+    def _recv(self, timeout):
+        """以指定逾時接收一次，逾時回傳 (b'', None)，否則回傳 (資料, 接收時間戳)"""
+        original_timeout = self.socket.gettimeout()
+        self.socket.settimeout(self.timeout if timeout is None else timeout)
+        try:
+            data = self.socket.recv(1024)
+        except socket.timeout:
+            return b'', None
+        except socket.error as e:
+            raise self._drop(TransportError(f"接收資料失敗: {e}"))
+        finally:
+            if self.socket:
+                self.socket.settimeout(original_timeout)
+        if data == b'':
+            raise self._drop(TransportError("TCP 連線已被對方關閉"))
+        return data, time.perf_counter_ns()
+    
+    def receive(self, timeout=None):
+        """接收資料 (bytes)，逾時回傳 b''；Modbus TCP 模式一次回傳一個完整的 MBAP 訊框"""
+        self._ensure_connected()
+        if self.mbap:
+            timeout_ns = int((self.timeout if timeout is None else timeout) * 1e9)
+            received = self._read_mbap_frame(time.perf_counter_ns() + timeout_ns)
+            return received[0] if received else b''
+        data, _ = self._recv(timeout)
+        if self.rtu_over_tcp:
+            self.last_frame_status = (ModbusPacketAnalyzer.validate_frame(data, self._expected_length) if data
+                                      else FRAME_NO_RESPONSE)
+        return data
     
     def receive_data(self, timeout=2.0):
-        """接收資料"""
+        """接收資料 (舊介面)：回傳大寫十六進位字串，逾時回傳「回應逾時」"""
+        data = self.receive(timeout)
+        return data.hex().upper() if data else "回應逾時"
+    
+    def exchange(self, data, timeout=None):
+        """發送請求並與回應配對，回傳含各階段時間戳的 Transaction
+
+        RTU over TCP 依從站位址與功能碼配對，MBAP 訊框依交易 ID 配對；
+        其他原始資料無法配對，只記錄時間。
+        """
+        data = to_bytes(data)
+        if self.mbap:
+            return self.exchange_many((data,), timeout)[0]
         self._ensure_connected()
+        correlate = self.rtu_over_tcp or is_mbap_frame(data)
         
+        write_start_ns = time.perf_counter_ns()
+        self.send(data)
+        write_done_ns = time.perf_counter_ns()
+        if self.rtu_over_tcp and is_broadcast_request(data):
+            # 閘道轉送廣播到 RS485 匯流排，從站不會回應，不必等待逾時
+            self.last_frame_status = FRAME_BROADCAST
+            return broadcast_transaction(data, write_start_ns, write_done_ns)
+        if correlate:
+            transaction = self.correlator.begin(data, write_start_ns, write_done_ns)
+        else:
+            transaction = Transaction(data, None, write_start_ns, write_done_ns)
+        
+        response, received_ns = self._recv(timeout)
+        if not response:
+            if correlate:
+                self.correlator.cancel(transaction)
+        elif not correlate:
+            transaction.response = response
+            transaction.first_byte_ns = transaction.last_byte_ns = received_ns
+            transaction.status = FRAME_OK
+        elif not self.correlator.match(response, received_ns, received_ns, self._expected_length):
+            self.correlator.cancel(transaction)
+            transaction.response = response
+            transaction.status = FRAME_UNMATCHED
+        
+        if self.rtu_over_tcp:
+            self.last_frame_status = transaction.status
+        if correlate:
+            self.tuner.observe(transaction)
+        return transaction
+    
+    def frame_request(self, request):
+        """將 RTU 請求 (可含 CRC) 包裝為 MBAP 訊框並配發交易 ID；已是 MBAP 訊框時原樣送出"""
+        return self.correlator.frame_mbap(request)
+    
+    def _read_mbap_frame(self, deadline_ns):
+        """依 MBAP 長度欄位讀取一個完整訊框，回傳 (訊框, 接收時間戳)；期限內未讀完回傳 None
+        
+        每次 recv_into 最多只讀到目前訊框結尾，分段到達或與下一個訊框黏在一起的回應都能正確切割。
+        """
+        buffer = self._rx_buffer
         original_timeout = self.socket.gettimeout()
-        self.socket.settimeout(timeout)
+        try:
+            while True:
+                filled = self._rx_filled
+                needed = MBAP_HEADER_SIZE
+                if filled >= MBAP_HEADER_SIZE:
+                    length = (buffer[4] << 8) | buffer[5]
+                    if buffer[2] or buffer[3] or not 2 <= length <= MBAP_MAX_ADU_SIZE - MBAP_HEADER_SIZE:
+                        # 資料流已無法重新同步，必須重新連線
+                        raise self._drop(TransportError(f"無效的 MBAP 標頭: {bytes(buffer[:MBAP_HEADER_SIZE]).hex(' ').upper()}"))
+                    needed += length
+                    if filled >= needed:
+                        break
+                
+                remaining = deadline_ns - time.perf_counter_ns()
+                if remaining <= 0:
+                    return None
+                self.socket.settimeout(remaining / 1e9)
+                try:
+                    count = self.socket.recv_into(self._rx_view[filled:needed])
+                except socket.timeout:
+                    return None
+                except socket.error as e:
+                    raise self._drop(TransportError(f"接收資料失敗: {e}"))
+                if count == 0:
+                    raise self._drop(TransportError("TCP 連線已被對方關閉"))
+                self._rx_filled = filled + count
+        finally:
+            if self.socket:
+                self.socket.settimeout(original_timeout)
+        
+        received_ns = time.perf_counter_ns()
+        self._rx_filled = 0
+        # 僅在交易層將訊框複製出接收緩衝區
+        return bytes(self._rx_view[:needed]), received_ns
+    
+    def exchange_many(self, requests, timeout=None, window=None):
+        """送出多筆請求並依原順序回傳 Transaction
         
+        Modbus TCP 模式下管線化：最多 window 筆請求同時等待回應，回應依交易 ID 配對，
+        可不依順序到達；每筆請求各自在 timeout 內未收到回應即視為逾時，之後才到的回應記為未配對。
+        其他模式逐筆呼叫 exchange()。
+        """
+        requests = [to_bytes(request) for request in requests]
+        if not self.mbap:
+            return [self.exchange(request, timeout) for request in requests]
+        window = self.window if window is None else window
+        if not 1 <= window <= MAX_PIPELINE_WINDOW:
+            raise ValueError(f"管線深度必須在 1~{MAX_PIPELINE_WINDOW} 之間")
+        timeout_ns = int((self.timeout if timeout is None else timeout) * 1e9)
+        self._ensure_connected()
+        
+        results = [None] * len(requests)
+        in_flight = {}  # 交易 ID -> 請求序號
+        next_index = 0
         try:
-            data = self.socket.recv(1024)
-            return data.hex().upper()
-        except socket.timeout:
-            return "回應逾時"
-        except socket.error as e:
-            self.connected = False
-            raise ConnectionError(f"接收資料失敗: {e}")
+            while next_index < len(requests) or in_flight:
+                while next_index < len(requests) and len(in_flight) < window:
+                    frame = self.frame_request(requests[next_index])
+                    write_start_ns = time.perf_counter_ns()
+                    self.send(frame)
+                    transaction = self.correlator.begin(frame, write_start_ns, time.perf_counter_ns())
+                    in_flight[transaction.key] = next_index
+                    next_index += 1
+                
+                oldest_ns = min(self.correlator.pending[key].write_start_ns for key in in_flight)
+                received = self._read_mbap_frame(oldest_ns + timeout_ns)
+                if received is None:
+                    for transaction in self.correlator.expire(timeout_ns):
+                        index = in_flight.pop(transaction.key, None)
+                        if index is not None:
+                            results[index] = transaction
+                    continue
+                
+                transaction = self.correlator.match(received[0], received[1], received[1])
+                if transaction is not None and transaction.key in in_flight:
+                    results[in_flight.pop(transaction.key)] = transaction
         finally:
-            self.socket.settimeout(original_timeout)
+            # 傳輸錯誤時放棄所有仍在等待的請求
+            for key in in_flight:
+                self.correlator.pending.pop(key, None)
+        
+        for transaction in results:
+            self.tuner.observe(transaction)
+        self.last_frame_status = results[-1].status if results else None
+        return results
     
     def close(self):
         """關閉連線"""
+        if self._reconnect:
+            self._reconnect = False
+            self.pool.unregister(self.host, self.port)
         if self.socket:
             try:
                 self.socket.close()
@@ -114,17 +502,30 @@ class TCPConnection:
     
     def _ensure_connected(self):
         """確保連線有效"""
-        if not self.connected or not self.socket:
+        if self.connected and self.socket:
+            return
+        if not self._reconnect:
             raise ConnectionError("TCP 連線未建立或已中斷")
+        # 連線池通常已有備用連線可立即取用，否則等待背景重新連線
+        self._attach(self.pool.acquire(self.host, self.port, self.timeout))
+        self.reconnects += 1
 
 
 class ConnectionManager:
-    """連線管理器"""
+    """連線管理器
+
+    各登錄表採寫入時複製：修改時在鎖內建立新的 dict 再整個替換，
+    讀取者直接使用當下的 dict，不需要鎖也不會遇到迭代中被修改的問題。
+    """
     
     def __init__(self):
+        self._lock = threading.Lock()
         self.connections = {}
         self.connection_stats = {}
         self.auto_send_active = {}
+        self.workers = {}
+        # TCP 連線共用的連線池：斷線後於背景重新連線
+        self.tcp_pool = TCPConnectionPool()
     
     def add_connection(self, name, connection, conn_type, address):
         """新增連線"""
@@ -137,31 +538,46 @@ class ConnectionManager:
         if connection is None:
             raise ValueError("連線物件不能為None")
         
-        if not conn_type or conn_type not in ['TCP', 'Serial']:
-            raise ValueError("連線類型必須為 'TCP' 或 'Serial'")
+        if not conn_type or conn_type not in ['TCP', 'Serial', 'Sniffer']:
+            raise ValueError("連線類型必須為 'TCP'、'Serial' 或 'Sniffer'")
         
         if not address or not address.strip():
             raise ValueError("連線地址不能為空")
         
-        self.connections[name] = {
+        conn_info = {
             'connection': connection,
             'type': conn_type,
             'address': address,
             'connected': True
         }
-        self.connection_stats[name] = ConnectionStats(name)
+        with self._lock:
+            if name in self.connections:
+                raise ValueError(f"連線名稱 '{name}' 已存在")
+            self.connections = {**self.connections, name: conn_info}
+            self.connection_stats = {**self.connection_stats, name: ConnectionStats(name)}
     
     def remove_connection(self, name):
         """移除連線"""
-        if name not in self.connections:
-            raise ValueError(f"連線 '{name}' 不存在")
+        with self._lock:
+            if name not in self.connections:
+                raise ValueError(f"連線 '{name}' 不存在")
+            
+            # 停止自動發送
+            if name in self.auto_send_active:
+                self.auto_send_active = {**self.auto_send_active, name: False}
+            
+            # 先從登錄表移除，關閉連線可能較慢，不在鎖內進行
+            conn_info = self.connections[name]
+            self.connections = {key: value for key, value in self.connections.items() if key != name}
+            self.connection_stats = {key: value for key, value in self.connection_stats.items() if key != name}
+            worker = self.workers.get(name)
+            self.workers = {key: value for key, value in self.workers.items() if key != name}
         
-        # 停止自動發送
-        if name in self.auto_send_active:
-            self.auto_send_active[name] = False
+        # 先停止工作線程，避免關閉後仍有指令寫入
+        if worker is not None:
+            worker.stop()
         
         # 關閉連線
-        conn_info = self.connections[name]
         try:
             if hasattr(conn_info['connection'], 'close'):
                 conn_info['connection'].close()
@@ -169,33 +585,49 @@ class ConnectionManager:
             print(f"警告: 關閉連線 '{name}' 時發生錯誤: {e}")
         except Exception as e:
             print(f"關閉連線 '{name}' 時發生未預期錯誤: {e}")
-        
-        # 清理資料
-        del self.connections[name]
-        if name in self.connection_stats:
-            del self.connection_stats[name]
     
     def get_connection(self, name):
         """取得連線"""
-        if name not in self.connections:
+        conn_info = self.connections.get(name)
+        if conn_info is None:
             raise ValueError(f"連線 '{name}' 不存在")
-        return self.connections[name]
+        return conn_info
     
     def get_all_connections(self):
-        """取得所有連線"""
-        return self.connections.copy()
+        """取得所有連線 (當下的唯讀快照，不需複製)"""
+        return MappingProxyType(self.connections)
     
     def get_statistics(self, name):
         """取得連線統計"""
         return self.connection_stats.get(name)
     
     def get_all_statistics(self):
-        """取得所有統計資料"""
-        return self.connection_stats.copy()
+        """取得所有統計資料 (當下的唯讀快照，不需複製)"""
+        return MappingProxyType(self.connection_stats)
+    
+    def get_worker(self, name, execute):
+        """取得連線的工作線程，第一次使用時以 execute(command) 建立"""
+        worker = self.workers.get(name)
+        if worker is not None:
+            return worker
+        
+        with self._lock:
+            if name not in self.connections:
+                raise ValueError(f"連線 '{name}' 不存在")
+            worker = self.workers.get(name)
+            if worker is None:
+                worker = ConnectionWorker(name, execute)
+                self.workers = {**self.workers, name: worker}
+        return worker
+    
+    def get_all_workers(self):
+        """取得所有工作線程 (當下的唯讀快照)"""
+        return MappingProxyType(self.workers)
     
     def set_auto_send_status(self, name, active):
         """設定自動發送狀態"""
-        self.auto_send_active[name] = active
+        with self._lock:
+            self.auto_send_active = {**self.auto_send_active, name: active}
     
     def is_auto_send_active(self, name):
         """檢查自動發送是否啟用"""
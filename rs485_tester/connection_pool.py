@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+TCP 連線池
+
+依 host:port 管理閘道連線：一個背景線程為每個位址預先建立備用 Socket，連線失敗時以指數退避加上
+隨機抖動持續重試。TCPConnection 斷線後，下一筆請求直接取用備用 Socket，或等待背景重新連線完成
+(最多一個回應逾時)，閘道恢復後輪詢立即繼續，不需要操作人員移除再重新加入連線。
+所有 Socket 皆啟用 TCP_NODELAY 與 keepalive。
+"""
+import random
+import socket
+import threading
+import time
+from collections import deque
+try:
+    from .constants import (DEFAULT_TIMEOUT, TCP_POOL_SPARES, TCP_RECONNECT_INITIAL, TCP_RECONNECT_MAX,
+                            TCP_RECONNECT_JITTER, TCP_KEEPALIVE_IDLE, TCP_KEEPALIVE_INTERVAL, TCP_KEEPALIVE_COUNT,
+                            READER_JOIN_TIMEOUT)
+    from .transport import TransportError
+except ImportError:
+    from constants import (DEFAULT_TIMEOUT, TCP_POOL_SPARES, TCP_RECONNECT_INITIAL, TCP_RECONNECT_MAX,
+                           TCP_RECONNECT_JITTER, TCP_KEEPALIVE_IDLE, TCP_KEEPALIVE_INTERVAL, TCP_KEEPALIVE_COUNT,
+                           READER_JOIN_TIMEOUT)
+    from transport import TransportError
+
+
+class Backoff:
+    """指數退避：每次失敗等待時間加倍直到上限，再隨機縮減以錯開多個連線的重試時間"""
+    
+    def __init__(self, initial=TCP_RECONNECT_INITIAL, maximum=TCP_RECONNECT_MAX, factor=2.0,
+                 jitter=TCP_RECONNECT_JITTER, rng=random.random):
+        if initial <= 0 or maximum < initial or factor < 1:
+            raise ValueError("退避時間設定無效")
+        if not 0 <= jitter < 1:
+            raise ValueError("抖動比例必須在 0~1 之間")
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self._rng = rng
+        self.failures = 0
+    
+    def next_delay(self):
+        """記錄一次失敗並回傳下次重試前的等待時間 (秒)"""
+        delay = min(self.maximum, self.initial * self.factor ** self.failures)
+        self.failures += 1
+        return delay * (1 - self.jitter * self._rng())
+    
+    def reset(self):
+        self.failures = 0
+
+
+def configure_socket(sock):
+    """啟用 TCP_NODELAY (小封包請求立即送出) 與 keepalive (偵測閒置時中斷的連線)"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    try:
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, TCP_KEEPALIVE_IDLE)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, TCP_KEEPALIVE_INTERVAL)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, TCP_KEEPALIVE_COUNT)
+        elif hasattr(socket, 'SIO_KEEPALIVE_VALS'):
+            # Windows 只能設定閒置時間與探測間隔 (毫秒)
+            sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, TCP_KEEPALIVE_IDLE * 1000, TCP_KEEPALIVE_INTERVAL * 1000))
+    except OSError as e:
+        print(f"警告: 無法設定 TCP keepalive 參數: {e}")
+
+
+def socket_alive(sock):
+    """檢查閒置的 Socket 是否仍連線：對方已關閉時可立即讀到 0 位元組"""
+    try:
+        sock.setblocking(False)
+        try:
+            return sock.recv(1, socket.MSG_PEEK) != b''
+        finally:
+            sock.setblocking(True)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+
+
+def _close_quietly(sock):
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+class _PoolEntry:
+    """單一 host:port 的連線池狀態"""
+    
+    def __init__(self, backoff):
+        self.users = 0
+        self.waiters = 0
+        self.spares = deque()
+        self.connecting = False
+        self.next_attempt = 0.0
+        self.backoff = backoff
+        self.failures = 0
+        self.last_error = None
+
+
+class TCPConnectionPool:
+    """依 host:port 維護預先建立的 TCP 連線，斷線時於背景以指數退避重新連線
+    
+    register() 後背景線程即保持 spares 個備用連線；acquire() 取走一個 (交由呼叫者擁有並負責關閉)
+    後立即補上。沒有備用連線時 acquire() 等待背景連線完成。spares 為 0 時只在有人等待時才連線，
+    適用於限制連線數的閘道。
+    """
+    
+    def __init__(self, spares=TCP_POOL_SPARES, connect_timeout=DEFAULT_TIMEOUT, backoff=Backoff):
+        if spares < 0:
+            raise ValueError("備用連線數不能小於0")
+        if connect_timeout <= 0:
+            raise ValueError("逾時時間必須大於0")
+        self.spares = spares
+        self.connect_timeout = connect_timeout
+        self._backoff = backoff
+        self._entries = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+    
+    def register(self, host, port):
+        """開始維護 host:port 的連線 (每個使用者呼叫一次)"""
+        with self._condition:
+            entry = self._entries.get((host, port))
+            if entry is None:
+                entry = self._entries[(host, port)] = _PoolEntry(self._backoff())
+            entry.users += 1
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name="TCPConnectionPool", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+    
+    def unregister(self, host, port):
+        """使用者不再需要連線；沒有使用者時關閉備用連線並停止重試"""
+        spares = ()
+        with self._condition:
+            entry = self._entries.get((host, port))
+            if entry is None:
+                return
+            entry.users -= 1
+            if entry.users <= 0:
+                del self._entries[(host, port)]
+                spares = list(entry.spares)
+                entry.spares.clear()
+                self._condition.notify_all()
+        for sock in spares:
+            _close_quietly(sock)
+    
+    def acquire(self, host, port, timeout, fail_fast=False):
+        """取得已連線的 Socket，最多等待 timeout 秒
+        
+        fail_fast 時只要一次連線嘗試失敗就立即拋出 (操作人員建立連線時使用)，
+        否則等待背景重試直到逾時 (斷線後的自動重新連線)。
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            entry = self._entries.get((host, port))
+            if entry is None:
+                raise ValueError(f"連線池未登記 {host}:{port}")
+            failures = entry.failures
+            entry.waiters += 1
+            self._condition.notify_all()
+            try:
+                while self._entries.get((host, port)) is entry:
+                    while entry.spares:
+                        sock = entry.spares.popleft()
+                        self._condition.notify_all()  # 補上備用連線
+                        if socket_alive(sock):
+                            return sock
+                        _close_quietly(sock)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (fail_fast and entry.failures > failures):
+                        break
+                    self._condition.wait(remaining)
+            finally:
+                entry.waiters -= 1
+            error = entry.last_error
+        if fail_fast:
+            raise TransportError(f"TCP 連線失敗: {error}" if error else f"TCP 連線逾時: {host}:{port}")
+        raise TransportError(f"TCP 連線中斷，背景重新連線中: {host}:{port}" + (f" ({error})" if error else ""))
+    
+    def spare_count(self, host, port):
+        """目前可立即取用的備用連線數"""
+        entry = self._entries.get((host, port))
+        return len(entry.spares) if entry else 0
+    
+    def close(self):
+        """停止背景線程並關閉所有備用連線"""
+        with self._condition:
+            self._running = False
+            entries, self._entries = self._entries, {}
+            thread, self._thread = self._thread, None
+            self._condition.notify_all()
+        for entry in entries.values():
+            for sock in entry.spares:
+                _close_quietly(sock)
+        if thread is not None:
+            thread.join(READER_JOIN_TIMEOUT)
+    
+    def _run(self):
+        """背景線程：依退避時間為缺少備用連線的位址啟動連線"""
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                wake_at = None
+                for key, entry in self._entries.items():
+                    if entry.connecting or len(entry.spares) >= max(self.spares, entry.waiters):
+                        continue
+                    if entry.next_attempt > now:
+                        wake_at = entry.next_attempt if wake_at is None else min(wake_at, entry.next_attempt)
+                        continue
+                    # 連線可能等待到逾時，各自在短暫的線程中進行，不拖慢其他位址
+                    entry.connecting = True
+                    threading.Thread(target=self._connect, args=(key, entry), daemon=True).start()
+                self._condition.wait(None if wake_at is None else wake_at - now)
+    
+    def _connect(self, key, entry):
+        try:
+            sock = socket.create_connection(key, timeout=self.connect_timeout)
+            configure_socket(sock)
+            error = None
+        except OSError as e:
+            sock, error = None, e
+        with self._condition:
+            entry.connecting = False
+            if sock is not None and self._running and self._entries.get(key) is entry:
+                entry.spares.append(sock)
+                entry.backoff.reset()
+                entry.next_attempt = 0.0
+                sock = None
+            elif error is not None:
+                entry.failures += 1
+                entry.last_error = str(error) or type(error).__name__
+                entry.next_attempt = time.monotonic() + entry.backoff.next_delay()
+            self._condition.notify_all()
+        if sock is not None:
+            _close_quietly(sock)
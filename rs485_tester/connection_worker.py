@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+連線工作線程模組
+
+每個連線 (串口) 只有一個長駐工作線程，一次只執行一筆交易，作為半雙工匯流排的仲裁者：
+手動指令優先於警報監控，警報監控優先於背景輪詢；設有期限的請求若在輪到之前已過期，
+直接捨棄而不佔用匯流排。請求佇列有上限，佇列滿時先讓出較低優先權的請求，
+其餘依策略處理：阻塞等待、丟棄最舊的請求或合併重複的請求。
+"""
+import threading
+import time
+from collections import deque
+try:
+    from .constants import (WORKER_QUEUE_SIZE, WORKER_SUBMIT_TIMEOUT, READER_JOIN_TIMEOUT,
+                            QUEUE_POLICY_BLOCK, QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_COALESCE,
+                            PRIORITY_INTERACTIVE, PRIORITY_NAMES)
+    from .latency_histogram import LatencyTracker
+except ImportError:
+    from constants import (WORKER_QUEUE_SIZE, WORKER_SUBMIT_TIMEOUT, READER_JOIN_TIMEOUT,
+                           QUEUE_POLICY_BLOCK, QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_COALESCE,
+                           PRIORITY_INTERACTIVE, PRIORITY_NAMES)
+    from latency_histogram import LatencyTracker
+
+
+QUEUE_POLICIES = (QUEUE_POLICY_BLOCK, QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_COALESCE)
+PRIORITIES = tuple(sorted(PRIORITY_NAMES))
+
+
+class WorkerJob:
+    """佇列中的一筆指令，合併後的重複請求共用同一次執行結果"""
+    
+    __slots__ = ('command', 'callbacks', 'on_complete', 'priority', 'enqueued_ns', 'deadline_ns')
+    
+    def __init__(self, command, callback, priority, deadline=None, on_complete=None):
+        self.command = command
+        self.callbacks = [callback] if callback else []
+        self.on_complete = on_complete
+        self.priority = priority
+        self.enqueued_ns = time.perf_counter_ns()
+        self.deadline_ns = None if deadline is None else self.enqueued_ns + int(deadline * 1e9)
+    
+    def expired(self, now_ns):
+        return self.deadline_ns is not None and now_ns > self.deadline_ns
+
+
+class ConnectionWorker:
+    """單一連線的長駐工作線程與依優先權排序的有上限請求佇列
+    
+    execute(command) 在工作線程中執行並回傳結果；每筆請求完成後以
+    callback(result, error) 通知，error 為執行時發生的例外 (成功時為 None)。
+    on_complete(result, error) 則是每次實際執行只呼叫一次 (合併的請求不會重複呼叫)，
+    用於交易統計等只能記錄一次的處理。被丟棄或過期的請求不會執行，也不會呼叫回呼，只計入統計。
+    """
+    
+    def __init__(self, name, execute, queue_size=WORKER_QUEUE_SIZE, policy=QUEUE_POLICY_BLOCK):
+        if queue_size <= 0:
+            raise ValueError("佇列長度必須大於0")
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"不支援的佇列策略: {policy}")
+        
+        self.name = name
+        self.execute = execute
+        self.queue_size = queue_size
+        self.policy = policy
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._condition = threading.Condition()
+        self._running = True
+        # 統計
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.expired = 0
+        self.preempted = 0
+        self.max_depth = 0
+        self.wait_time = LatencyTracker()
+        self._thread = threading.Thread(target=self._run, name=f"worker-{name}", daemon=True)
+        self._thread.start()
+    
+    @property
+    def depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+    
+    def depth_by_priority(self):
+        return {priority: len(queue) for priority, queue in self._queues.items()}
+    
+    def submit(self, command, callback=None, policy=None, timeout=WORKER_SUBMIT_TIMEOUT,
+               priority=PRIORITY_INTERACTIVE, deadline=None, on_complete=None):
+        """加入一筆指令，回傳是否被接受
+        
+        policy 可覆寫此連線的預設策略；阻塞策略最多等待 timeout 秒 (None 為無限等待)，
+        避免由介面線程呼叫時卡住畫面。deadline 為必須開始執行的期限 (秒)，
+        過期仍未輪到時捨棄，適用於下一輪就會重新查詢的背景輪詢。
+        """
+        policy = policy or self.policy
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"不支援的佇列策略: {policy}")
+        if priority not in self._queues:
+            raise ValueError(f"不支援的優先權: {priority}")
+        
+        with self._condition:
+            if not self._running:
+                raise ConnectionError(f"連線 '{self.name}' 的工作線程已停止")
+            
+            queue = self._queues[priority]
+            if policy == QUEUE_POLICY_COALESCE:
+                for job in queue:
+                    if job.command == command:
+                        # 尚未執行的相同指令只執行一次，結果通知所有呼叫者；
+                        # on_complete 沿用原請求的，同一次執行不重複記錄
+                        if callback:
+                            job.callbacks.append(callback)
+                        self.coalesced += 1
+                        return True
+            
+            if self.depth >= self.queue_size:
+                self._purge_expired(time.perf_counter_ns())
+            if self.depth >= self.queue_size and not self._preempt(priority):
+                if policy == QUEUE_POLICY_DROP_OLDEST and queue:
+                    queue.popleft()
+                    self.dropped += 1
+                elif not self._condition.wait_for(
+                        lambda: self.depth < self.queue_size or not self._running, timeout):
+                    self.rejected += 1
+                    return False
+                elif not self._running:
+                    raise ConnectionError(f"連線 '{self.name}' 的工作線程已停止")
+            
+            queue.append(WorkerJob(command, callback, priority, deadline, on_complete))
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            self._condition.notify_all()
+            return True
+    
+    def _purge_expired(self, now_ns):
+        for queue in self._queues.values():
+            alive = [job for job in queue if not job.expired(now_ns)]
+            if len(alive) != len(queue):
+                self.expired += len(queue) - len(alive)
+                queue.clear()
+                queue.extend(alive)
+    
+    def _preempt(self, priority):
+        """佇列已滿時讓出最低優先權中最舊的一筆，給較高優先權的請求使用"""
+        for lower in reversed(PRIORITIES):
+            if lower <= priority:
+                return False
+            if self._queues[lower]:
+                self._queues[lower].popleft()
+                self.preempted += 1
+                return True
+        return False
+    
+    def _next_job(self):
+        """取出最高優先權中最舊且未過期的請求，沒有時回傳 None"""
+        now_ns = time.perf_counter_ns()
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                job = queue.popleft()
+                if not job.expired(now_ns):
+                    return job
+                self.expired += 1
+        return None
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                job = None
+                while job is None:
+                    self._condition.wait_for(lambda: self.depth or not self._running)
+                    if not self._running:
+                        return
+                    job = self._next_job()
+                    # 取出 (或捨棄過期請求) 後佇列有空位，喚醒等待中的提交者
+                    self._condition.notify_all()
+            
+            self.wait_time.record((time.perf_counter_ns() - job.enqueued_ns) / 1e6)
+            result, error = None, None
+            try:
+                result = self.execute(job.command)
+            except Exception as e:
+                error = e
+            self.completed += 1
+            
+            callbacks = [job.on_complete] + job.callbacks if job.on_complete else job.callbacks
+            for callback in callbacks:
+                try:
+                    callback(result, error)
+                except Exception as e:
+                    print(f"警告: 連線 '{self.name}' 的回呼發生錯誤: {e}")
+    
+    def metrics(self, window=LatencyTracker.SESSION):
+        """佇列深度與等待時間統計 (毫秒)"""
+        wait = self.wait_time.summary(window)
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "preempted": self.preempted,
+            "wait_p50": wait["p50"],
+            "wait_p95": wait["p95"],
+            "wait_max": wait["max"],
+        }
+    
+    def stop(self, timeout=READER_JOIN_TIMEOUT):
+        """停止工作線程，尚未執行的請求直接捨棄"""
+        with self._condition:
+            self._running = False
+            self.dropped += self.depth
+            for queue in self._queues.values():
+                queue.clear()
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
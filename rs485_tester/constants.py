@@ -9,6 +9,7 @@ CONNECTION_DIALOG_SIZE = "400x300"
 
 # 時間設定
 DEFAULT_TIMEOUT = 5.0
+TCP_RESPONSE_TIMEOUT = 2.0       # TCP 請求等待回應的預設逾時 (秒)
 DEFAULT_INTERVAL = 1000
 MIN_INTERVAL = 100
 STATS_UPDATE_INTERVAL = 2000
@@ -18,6 +19,13 @@ AUTO_ANALYSIS_DELAY = 500
 LOG_DIR = "logs"
 MAX_RESPONSE_TIMES = 100
 
+# 延遲統計設定
+HISTOGRAM_SUB_BUCKET_BITS = 6    # 每個 2 的次方區間細分 32 個子桶 (相對誤差約 3%)
+LATENCY_WINDOWS = {              # 滑動時間窗名稱: (長度秒數, 時段數)
+    "1 分鐘": (60, 12),
+    "10 分鐘": (600, 20)
+}
+
 # 預設值
 DEFAULT_BAUDRATE = 9600
 DEFAULT_TCP_PORT = 502
@@ -34,6 +42,11 @@ COMMON_COMMANDS = {
     "螢幕關閉": "{ID} 06 00 01 00 00"
 }
 
+# 監控輪詢點位 (格式同常用指令：{ID} 功能碼 起始位址 [數量]，數量省略時為 1)
+POLL_POINTS = {
+    "狀態": "{ID} 03 00 00"
+}
+
 # Modbus 功能碼
 MODBUS_FUNCTIONS = {
     0x01: "讀取線圈",
@@ -46,9 +59,116 @@ MODBUS_FUNCTIONS = {
     0x10: "寫入多重暫存器"
 }
 
+# Modbus 例外碼
+MODBUS_EXCEPTIONS = {
+    0x01: "非法功能",
+    0x02: "非法資料位址",
+    0x03: "非法資料值",
+    0x04: "從站設備故障",
+    0x05: "確認 (處理中)",
+    0x06: "從站設備忙碌",
+    0x08: "記憶體同位錯誤",
+    0x0A: "閘道路徑無法使用",
+    0x0B: "閘道目標設備無回應"
+}
+
 # 波特率選項
 BAUDRATES = ['9600', '19200', '38400', '57600', '115200']
 
+# Modbus RTU 訊框設定
+MODBUS_MAX_FRAME_SIZE = 256      # RTU ADU 最大長度 (位元組)
+MODBUS_EXCEPTION_FRAME_SIZE = 5  # 例外回應長度: 位址 + 功能碼 + 例外碼 + CRC
+MODBUS_MAX_SLAVE_ID = 247        # 有效的從站位址上限 (0 為廣播)
+MODBUS_BROADCAST_ADDRESS = 0     # 廣播位址：所有從站執行但不回應
+MODBUS_MAX_READ_REGISTERS = 125  # 0x03/0x04 單次讀取暫存器上限
+MODBUS_MAX_READ_BITS = 2000      # 0x01/0x02 單次讀取線圈/離散輸入上限
+DEFAULT_POLL_GAP = 8             # 合併讀取時可一併讀取 (再丟棄) 的最大間隔點數
+
+# 裝置自動調校設定
+TUNING_MIN_QUANTITY = 8          # 自動縮小單次讀取數量的下限
+TUNING_PROBE_AFTER = 50          # 連續成功多少筆後嘗試加大單次讀取數量
+TUNING_PROBE_STEP = 8            # 每次嘗試加大的點數
+TUNING_DELAY_STEP = 0.001        # 轉換延遲調整的最小步進 (秒)
+TUNING_MAX_TURNAROUND = 0.1      # 自動調高轉換延遲的上限 (秒)
+MODBUS_FIXED_T35 = 0.00175       # 波特率 > 19200 時規範固定的 3.5 字元靜默時間 (秒)
+MIN_SILENCE_INTERVAL = 0.001     # 串口逾時最小解析度 (Windows 以毫秒為單位)
+SPIN_WAIT_THRESHOLD = 0.002      # 精確等待時最後改以忙碌迴圈補足的時間 (秒)
+DEFAULT_TURNAROUND_DELAY = 0.0   # 裝置回應後到下一筆請求的預設轉換延遲 (秒)
+BROADCAST_TURNAROUND_DELAY = 0.1 # 廣播後讓從站處理完畢的轉換延遲 (秒，規範建議 100~200ms)
+
+# 接收訊框檢查結果
+FRAME_OK = "正常"
+FRAME_CRC_ERROR = "CRC 錯誤"
+FRAME_TRUNCATED = "訊框不完整"
+FRAME_EXCEPTION = "例外回應"
+FRAME_NO_RESPONSE = "無回應"
+FRAME_UNMATCHED = "未配對回應"
+FRAME_BROADCAST = "廣播"         # 廣播請求，不等待回應
+
+# Modbus TCP (MBAP) 設定
+MBAP_HEADER_SIZE = 6             # 交易 ID + 協定 ID + 長度欄位 (之後為單元 ID 與 PDU)
+MBAP_MAX_ADU_SIZE = 260          # MBAP 標頭 + 單元 ID + 最大 PDU (253 位元組)
+DEFAULT_PIPELINE_WINDOW = 4      # 同一連線上同時等待回應的請求數
+MAX_PIPELINE_WINDOW = 64
+
+# TCP 連線池設定
+TCP_POOL_SPARES = 1              # 每個 host:port 預先建立的備用連線數 (部分閘道限制連線數時設為 0)
+TCP_RECONNECT_INITIAL = 0.05     # 斷線後第一次重新連線前的等待時間 (秒)
+TCP_RECONNECT_MAX = 2.0          # 重新連線等待時間的上限 (秒)
+TCP_RECONNECT_JITTER = 0.5       # 等待時間的隨機縮減比例，避免多個連線同時重試
+TCP_KEEPALIVE_IDLE = 10          # 閒置多久後開始送 TCP keepalive (秒)
+TCP_KEEPALIVE_INTERVAL = 3       # keepalive 探測間隔 (秒)
+TCP_KEEPALIVE_COUNT = 3          # 連續幾次探測無回應即視為斷線
+
+# 非同步閘道輪詢設定
+ASYNC_CONNECT_TIMEOUT = 3.0      # 非阻塞建立 TCP 連線的逾時 (秒)
+ASYNC_RESULT_QUEUE_SIZE = 10000  # 事件迴圈交給介面的結果佇列上限，超過時丟棄最舊的結果
+ASYNC_STOP_TIMEOUT = 2.0         # 停止事件迴圈時等待關閉所有連線的時間 (秒)
+
+# 背景接收設定
+RING_BUFFER_SIZE = 65536         # 背景接收環形緩衝區大小 (位元組)
+RX_FRAME_QUEUE_SIZE = 64         # 等待交易取走的接收訊框上限，滿時丟棄最舊的訊框
+READER_JOIN_TIMEOUT = 1.0        # 停止背景接收線程時的等待時間 (秒)
+
+# 連線工作線程設定
+WORKER_QUEUE_SIZE = 32           # 每個連線等待執行的指令上限
+WORKER_SUBMIT_TIMEOUT = 0.5      # 佇列滿且策略為阻塞時，加入指令的最長等待時間 (秒)
+QUEUE_POLICY_BLOCK = "阻塞等待"
+QUEUE_POLICY_DROP_OLDEST = "丟棄最舊"
+QUEUE_POLICY_COALESCE = "合併重複"
+
+# 多連線廣播設定
+BROADCAST_DEADLINE = 5.0         # 廣播到所有連線的整體期限 (秒)
+BROADCAST_FAILED = "發送失敗"
+BROADCAST_EXPIRED = "超過期限"
+
+# 從站掃描設定
+SCAN_PROBE_PDU = "03 00 00 00 01"   # 探測請求 PDU (讀取 1 個保持暫存器，例外回應也代表從站存在)
+SCAN_PROBE_MARGIN = 0.02         # 探測逾時在線路傳輸時間之外預留的裝置處理時間 (秒)
+SCAN_TCP_PROBE_TIMEOUT = 0.2     # 經由 TCP 閘道探測的逾時 (秒)
+SCAN_LATENCY_FACTOR = 3          # 找到從站後，探測逾時調整為最大實測延遲的倍數
+SCAN_MAX_PROBE_TIMEOUT = 0.5     # 探測逾時的上限 (秒)
+SCAN_CONFIRMED = "已確認"
+SCAN_UNCONFIRMED = "未確認"
+
+# 匯流排存取優先權 (數字越小越優先)
+PRIORITY_INTERACTIVE = 0         # 操作人員手動發送與廣播
+PRIORITY_ALARM = 1               # 狀態/警報監控查詢
+PRIORITY_BACKGROUND = 2          # 定時輪詢
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "手動", PRIORITY_ALARM: "警報", PRIORITY_BACKGROUND: "背景"}
+
+# 週期排程設定
+SCHEDULE_SKIP = "跳過"           # 延誤的週期直接跳過，對齊下一個未來的時間點
+SCHEDULE_CATCH_UP = "補發"       # 延誤的週期依序補發
+SCHEDULER_MAX_CATCH_UP = 3       # 補發策略最多補發的週期數，落後更多時其餘跳過
+
+# 監聽模式設定
+DEFAULT_SNIFFER_BAUDRATE = 115200
+SNIFFER_QUEUE_SIZE = 128         # 各管線階段間的佇列長度 (需小於環形緩衝區可容納的訊框數)
+SNIFFER_IDLE_FLUSH = 0.1         # 匯流排閒置多久後將未成框的位元組視為錯誤訊框輸出 (秒)
+LOG_FLUSH_INTERVAL = 200         # 背景線程日誌批次寫入介面的間隔 (毫秒)
+MAX_PENDING_LOG_LINES = 2000     # 介面來不及顯示時保留的最新日誌行數
+
 # UI 主題
 THEMES = {
     "light": {
@@ -3,9 +3,13 @@
 資料處理工具類
 """
 try:
-    from .constants import MODBUS_FUNCTIONS
+    from .constants import MODBUS_FUNCTIONS, MODBUS_EXCEPTION_FRAME_SIZE, MODBUS_MAX_FRAME_SIZE, MODBUS_MAX_SLAVE_ID
+    from .constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+    from .pdu_decoder import ModbusPduDecoder
 except ImportError:
-    from constants import MODBUS_FUNCTIONS
+    from constants import MODBUS_FUNCTIONS, MODBUS_EXCEPTION_FRAME_SIZE, MODBUS_MAX_FRAME_SIZE, MODBUS_MAX_SLAVE_ID
+    from constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+    from pdu_decoder import ModbusPduDecoder
 
 
 class DataFormatter:
@@ -48,6 +52,192 @@ class DataFormatter:
             return f"轉換錯誤: {e}"
 
 
+def _build_crc_table():
+    """預先計算 256 個位元組值的 CRC-16/Modbus (多項式 0xA001) 查表"""
+    table = []
+    for value in range(256):
+        crc = value
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _build_crc_table()
+
+
+class ModbusCRC:
+    """Modbus CRC-16 計算 (查表法)，輸入 bytes/bytearray/memoryview，輸出整數"""
+    
+    INITIAL = 0xFFFF
+    
+    @staticmethod
+    def calculate(data, crc=INITIAL):
+        """計算 CRC-16/Modbus，回傳整數 (傳送時低位元組在前)"""
+        table = CRC16_TABLE
+        for byte in data:
+            crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+        return crc
+    
+    @staticmethod
+    def update(crc, data):
+        """串流計算: 以前一段的 CRC 繼續計算新的資料片段"""
+        return ModbusCRC.calculate(data, crc)
+    
+    @staticmethod
+    def update_byte(crc, byte):
+        """串流計算: 加入單一位元組"""
+        return (crc >> 8) ^ CRC16_TABLE[(crc ^ byte) & 0xFF]
+    
+    @staticmethod
+    def to_bytes(crc):
+        """轉為傳送順序的兩個位元組 (低位元組在前)"""
+        return bytes((crc & 0xFF, crc >> 8))
+    
+    @staticmethod
+    def check(frame):
+        """檢查訊框結尾的 CRC；含 CRC 的完整訊框重新計算結果為 0"""
+        return len(frame) >= 4 and ModbusCRC.calculate(frame) == 0
+    
+    @staticmethod
+    def verify_many(frames):
+        """批次檢查多個訊框的 CRC，回傳布林串列"""
+        table = CRC16_TABLE
+        results = []
+        for frame in frames:
+            if len(frame) < 4:
+                results.append(False)
+                continue
+            crc = 0xFFFF
+            for byte in frame:
+                crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+            results.append(crc == 0)
+        return results
+
+
+class ModbusStreamFramer:
+    """增量式 RTU 訊框切割器
+    
+    輸入任意切割的位元組片段，依功能碼的長度規則產生候選長度並以 CRC 驗證邊界；
+    其他公開功能碼改以滾動 CRC 搜尋。無法構成訊框的位元組逐一丟棄以重新同步，
+    每個位置最多檢查 MODBUS_MAX_FRAME_SIZE 個位元組，整體為 O(n)。
+    """
+    
+    MIN_FRAME_SIZE = 4  # 位址 + 功能碼 + CRC
+    # 無固定長度規則、需以滾動 CRC 判斷結尾的公開功能碼
+    SCAN_FUNCTION_CODES = frozenset((0x07, 0x08, 0x0B, 0x0C, 0x11, 0x14, 0x15, 0x16, 0x17, 0x18, 0x2B))
+    
+    def __init__(self, max_frame_size=MODBUS_MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self.junk = bytearray()
+        self.discarded = 0
+        self._scan_crc = 0xFFFF
+        self._scan_len = 0
+    
+    def feed(self, chunk):
+        """輸入位元組片段，回傳依串流順序排列的 (資料, 是否為有效訊框) 串列"""
+        self.buffer += chunk
+        return self._split(final=False)
+    
+    def flush(self):
+        """串流已結束 (例如線路閒置)：切出剩餘的訊框，其餘位元組視為無效資料，並重設狀態
+        
+        看似表頭的雜訊可能推算出很長的候選長度，不會再有資料補齊，
+        此時與 CRC 不符相同，丟棄一個位元組後繼續比對其後的訊框。
+        """
+        results = self._split(final=True)
+        remaining = bytes(self.junk + self.buffer)
+        self.buffer = bytearray()
+        self.junk = bytearray()
+        self._scan_crc, self._scan_len = 0xFFFF, 0
+        if remaining:
+            results.append((remaining, False))
+        return results
+    
+    def _split(self, final):
+        """從緩衝區切出訊框；final 為 False 時候選長度尚未收齊就停下等待更多資料"""
+        results = []
+        pos = 0
+        buffer = self.buffer
+        while len(buffer) - pos >= self.MIN_FRAME_SIZE:
+            length = self._match_frame(buffer, pos)
+            if length is None:
+                if not final:
+                    break  # 候選長度尚未收齊，等待更多資料
+                length = 0
+            if length:
+                if self.junk:
+                    results.append((bytes(self.junk), False))
+                    self.junk = bytearray()
+                results.append((bytes(buffer[pos:pos + length]), True))
+                pos += length
+            else:
+                # 此位置無法構成訊框，丟棄一個位元組重新同步
+                self.junk.append(buffer[pos])
+                self.discarded += 1
+                pos += 1
+            self._scan_crc, self._scan_len = 0xFFFF, 0
+        del buffer[:pos]
+        return results
+    
+    def _match_frame(self, buffer, pos):
+        """回傳此位置的訊框長度；0 代表無法構成訊框，None 代表需要更多資料"""
+        available = len(buffer) - pos
+        if buffer[pos] > MODBUS_MAX_SLAVE_ID or (buffer[pos + 1] & 0x7F) == 0:
+            return 0
+        
+        candidates = self.candidate_lengths(buffer, pos)
+        if candidates is None:
+            if (buffer[pos + 1] & 0x7F) in self.SCAN_FUNCTION_CODES:
+                return self._scan_frame(buffer, pos)
+            return 0
+        
+        waiting = False
+        for length in candidates:
+            if length > self.max_frame_size:
+                continue
+            if length > available:
+                waiting = True
+            elif ModbusCRC.check(buffer[pos:pos + length]):
+                return length
+        return None if waiting else 0
+    
+    def _scan_frame(self, buffer, pos):
+        """滾動 CRC: 逐位元組延伸，CRC 歸零即為訊框結尾；跨 feed 呼叫保留計算進度"""
+        end = min(len(buffer) - pos, self.max_frame_size)
+        crc = self._scan_crc
+        for index in range(self._scan_len, end):
+            crc = ModbusCRC.update_byte(crc, buffer[pos + index])
+            if crc == 0 and index + 1 >= self.MIN_FRAME_SIZE:
+                return index + 1
+        if end >= self.max_frame_size:
+            return 0
+        self._scan_crc, self._scan_len = crc, end
+        return None
+    
+    @staticmethod
+    def candidate_lengths(buffer, pos=0):
+        """依功能碼推算可能的訊框長度 (請求與回應)，無規則時回傳 None"""
+        func_code = buffer[pos + 1]
+        if func_code & 0x80:
+            return (MODBUS_EXCEPTION_FRAME_SIZE,)
+        if func_code in (0x01, 0x02, 0x03, 0x04):
+            # 回應: 位址 + 功能碼 + 位元組數 + 資料 + CRC；請求固定 8 位元組
+            return (5 + buffer[pos + 2], 8)
+        if func_code in (0x05, 0x06):
+            return (8,)
+        if func_code in (0x0F, 0x10):
+            # 回應固定 8 位元組；請求: 7 位元組表頭 + 位元組數 + 資料 + CRC
+            if len(buffer) - pos > 6:
+                return (8, 9 + buffer[pos + 6])
+            return (8,)
+        return None
+
+
 class ModbusPacketAnalyzer:
     """Modbus 封包分析器"""
     
@@ -73,6 +263,7 @@ class ModbusPacketAnalyzer:
             if len(bytes_data) >= 2:
                 crc_received = (bytes_data[-1] << 8) | bytes_data[-2]
                 analysis["CRC"] = f"{crc_received:04X}"
+                analysis["CRC 檢查"] = "正確" if ModbusCRC.check(bytes_data) else "錯誤"
             
             return analysis
             
@@ -83,6 +274,47 @@ class ModbusPacketAnalyzer:
         except Exception as e:
             return f"分析錯誤: {e}"
     
+    @staticmethod
+    def expected_response_length(request):
+        """依請求封包推算正常回應的 RTU 長度 (含 CRC)，無法推算時回傳 None"""
+        if len(request) < 6:
+            return None
+        
+        func_code = request[1]
+        quantity = (request[4] << 8) | request[5]
+        
+        if func_code in (0x01, 0x02):  # 讀取線圈/離散輸入: 每 8 點一個位元組
+            return 5 + (quantity + 7) // 8
+        if func_code in (0x03, 0x04):  # 讀取暫存器: 每個暫存器兩個位元組
+            return 5 + 2 * quantity
+        if func_code in (0x05, 0x06, 0x0F, 0x10):  # 寫入指令回應固定 8 位元組
+            return 8
+        return None
+    
+    @staticmethod
+    def validate_frame(frame, expected_length=None):
+        """檢查接收到的 RTU 訊框，回傳 FRAME_* 狀態；expected_length 為正常回應的預期長度"""
+        length = len(frame)
+        if length == 0:
+            return FRAME_NO_RESPONSE
+        if length < 4:
+            return FRAME_TRUNCATED
+        if ModbusCRC.calculate(frame) != 0:
+            # 長度不足預期時，CRC 失敗的原因是訊框被截斷而非線路雜訊
+            if frame[1] & 0x80:
+                short = length < MODBUS_EXCEPTION_FRAME_SIZE
+            else:
+                short = expected_length is not None and length < expected_length
+            return FRAME_TRUNCATED if short else FRAME_CRC_ERROR
+        if frame[1] & 0x80:
+            return FRAME_EXCEPTION
+        return FRAME_OK
+    
+    @staticmethod
+    def is_exception_response(func_code):
+        """檢查功能碼是否為例外回應 (最高位元為 1)"""
+        return bool(func_code & 0x80)
+    
     @staticmethod
     def _get_function_name(func_code):
         """取得功能碼名稱"""
@@ -90,20 +322,8 @@ class ModbusPacketAnalyzer:
     
     @staticmethod
     def _analyze_by_function(bytes_data):
-        """根據功能碼分析封包內容"""
-        analysis = {}
-        func_code = bytes_data[1]
-        
-        if func_code in [0x03, 0x04] and len(bytes_data) >= 6:  # 讀取暫存器
-            start_addr = (bytes_data[2] << 8) | bytes_data[3]
-            quantity = (bytes_data[4] << 8) | bytes_data[5]
-            analysis["起始位址"] = f"{start_addr:04X} ({start_addr})"
-            analysis["讀取數量"] = f"{quantity}"
-            
-        elif func_code == 0x06 and len(bytes_data) >= 6:  # 寫入單一暫存器
-            addr = (bytes_data[2] << 8) | bytes_data[3]
-            value = (bytes_data[4] << 8) | bytes_data[5]
-            analysis["暫存器位址"] = f"{addr:04X} ({addr})"
-            analysis["寫入值"] = f"{value:04X} ({value})"
-            
-        return analysis
\ No newline at end of file
+        """根據功能碼分析封包內容 (請求、回應與例外回應皆可)"""
+        try:
+            return ModbusPduDecoder.decode(bytes_data).describe()
+        except ValueError:
+            return {}
\ No newline at end of file
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+裝置自動調校模組
+
+依每筆交易的結果為各從站學習：可靠回應的最大單次讀取數量 (AIMD：失敗時減半、
+連續成功後小幅加大，不超過曾失敗的數量)、所需的最小轉換延遲，以及典型延遲分布。
+學到的數值回饋給輪詢計畫 (合併上限) 與匯流排時序 (轉換延遲)。
+"""
+try:
+    from .constants import (MODBUS_MAX_READ_REGISTERS, MODBUS_MAX_READ_BITS, FRAME_OK, FRAME_NO_RESPONSE,
+                            FRAME_EXCEPTION, TUNING_MIN_QUANTITY, TUNING_PROBE_AFTER, TUNING_PROBE_STEP,
+                            TUNING_DELAY_STEP, TUNING_MAX_TURNAROUND)
+    from .latency_histogram import LatencyHistogram
+    from .pdu_decoder import ModbusPduDecoder, ReadRequest, ExceptionResponse
+    from .transaction import is_mbap_frame
+except ImportError:
+    from constants import (MODBUS_MAX_READ_REGISTERS, MODBUS_MAX_READ_BITS, FRAME_OK, FRAME_NO_RESPONSE,
+                           FRAME_EXCEPTION, TUNING_MIN_QUANTITY, TUNING_PROBE_AFTER, TUNING_PROBE_STEP,
+                           TUNING_DELAY_STEP, TUNING_MAX_TURNAROUND)
+    from latency_histogram import LatencyHistogram
+    from pdu_decoder import ModbusPduDecoder, ReadRequest, ExceptionResponse
+    from transaction import is_mbap_frame
+
+
+PROTOCOL_LIMITS = {
+    0x01: MODBUS_MAX_READ_BITS,
+    0x02: MODBUS_MAX_READ_BITS,
+    0x03: MODBUS_MAX_READ_REGISTERS,
+    0x04: MODBUS_MAX_READ_REGISTERS,
+}
+# 數量過大時從站可能回應的例外碼：非法資料位址、非法資料值
+SIZE_EXCEPTIONS = (0x02, 0x03)
+
+
+class ReadLimit:
+    """單一功能碼的讀取數量上限學習狀態"""
+    
+    __slots__ = ('limit', 'reliable', 'ceiling', 'streak')
+    
+    def __init__(self, protocol_limit):
+        self.limit = protocol_limit
+        self.reliable = 0                 # 曾成功回應的最大數量
+        self.ceiling = protocol_limit + 1  # 曾失敗的最小數量
+        self.streak = 0
+    
+    def success(self, quantity):
+        self.reliable = max(self.reliable, quantity)
+        if quantity < self.limit:
+            return False
+        self.streak += 1
+        if self.streak < TUNING_PROBE_AFTER or self.limit >= self.ceiling - 1:
+            return False
+        self.streak = 0
+        self.limit = min(self.limit + TUNING_PROBE_STEP, self.ceiling - 1)
+        return True
+    
+    def failure(self, quantity):
+        """數量超過曾成功的大小時才歸因於請求過大，回傳是否調整了上限"""
+        self.streak = 0
+        if quantity <= max(self.reliable, TUNING_MIN_QUANTITY):
+            return False
+        self.ceiling = min(self.ceiling, quantity)
+        self.limit = max(TUNING_MIN_QUANTITY, self.reliable, quantity // 2)
+        return True
+
+
+class DeviceProfile:
+    """單一從站學到的參數"""
+    
+    def __init__(self, slave_id, turnaround_delay=0.0):
+        self.slave_id = slave_id
+        self.read_limits = {code: ReadLimit(limit) for code, limit in PROTOCOL_LIMITS.items()}
+        self.turnaround_delay = turnaround_delay
+        self.failed_delay = None          # 曾發生逾時的轉換延遲
+        self.delay_streak = 0
+        self.latency = LatencyHistogram()
+        self.successes = 0
+        self.failures = 0
+    
+    def limits(self):
+        """給 PollPlanCompiler 使用的 {功能碼: 單次讀取上限}"""
+        return {code: state.limit for code, state in self.read_limits.items()}
+    
+    @property
+    def typical_latency(self):
+        return self.latency.percentile(50)
+    
+    def slow_down_turnaround(self):
+        """逾時後加倍轉換延遲 (至少一個步進)"""
+        self.failed_delay = self.turnaround_delay
+        self.delay_streak = 0
+        self.turnaround_delay = min(TUNING_MAX_TURNAROUND, max(TUNING_DELAY_STEP, self.turnaround_delay * 2))
+    
+    def relax_turnaround(self):
+        """連續成功後逐步縮短延遲，但維持在曾逾時的延遲之上"""
+        self.delay_streak += 1
+        if self.delay_streak < TUNING_PROBE_AFTER or self.turnaround_delay <= 0:
+            return
+        self.delay_streak = 0
+        floor = 0.0 if self.failed_delay is None else self.failed_delay + TUNING_DELAY_STEP
+        self.turnaround_delay = max(floor, self.turnaround_delay - TUNING_DELAY_STEP)
+    
+    def summary(self):
+        latency = self.latency.summary()
+        return {
+            "slave_id": self.slave_id,
+            "limits": self.limits(),
+            "turnaround_delay": self.turnaround_delay,
+            "p50": latency["p50"],
+            "p99": latency["p99"],
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+class DeviceTuner:
+    """依交易結果調校各從站的讀取數量與轉換延遲"""
+    
+    def __init__(self, turnaround_delay=0.0):
+        self.default_turnaround = turnaround_delay
+        self.profiles = {}
+    
+    def profile(self, slave_id):
+        profile = self.profiles.get(slave_id)
+        if profile is None:
+            profile = self.profiles[slave_id] = DeviceProfile(slave_id, self.default_turnaround)
+        return profile
+    
+    def read_limits(self, slave_id):
+        profile = self.profiles.get(slave_id)
+        return profile.limits() if profile else dict(PROTOCOL_LIMITS)
+    
+    @staticmethod
+    def _decode(frame, response):
+        """去除 MBAP 標頭後解碼，無法解碼時回傳 None"""
+        try:
+            if is_mbap_frame(frame):
+                return (ModbusPduDecoder.decode_response(memoryview(frame)[6:], has_crc=False) if response
+                        else ModbusPduDecoder.decode_request(memoryview(frame)[6:], has_crc=False))
+            return (ModbusPduDecoder.decode_response(frame) if response
+                    else ModbusPduDecoder.decode_request(frame))
+        except ValueError:
+            return None
+    
+    def observe(self, transaction):
+        """記錄一筆交易並調整該從站的參數，回傳 DeviceProfile (無法判斷從站時為 None)"""
+        slave_id = transaction.slave_id
+        if slave_id is None or slave_id == 0:
+            return None  # 廣播沒有回應，不能用來學習
+        profile = self.profile(slave_id)
+        request = self._decode(transaction.request, response=False)
+        read = request if isinstance(request, ReadRequest) else None
+        
+        if transaction.status == FRAME_OK:
+            profile.successes += 1
+            profile.latency.record(transaction.latency_ms)
+            profile.relax_turnaround()
+            if read and read.function_code in profile.read_limits:
+                profile.read_limits[read.function_code].success(read.quantity)
+            return profile
+        
+        if transaction.status == FRAME_EXCEPTION:
+            # 例外回應仍是正常的往返，只有「數量過大」類的例外用來縮小讀取數量
+            profile.latency.record(transaction.latency_ms)
+            response = self._decode(transaction.response, response=True)
+            if (read and read.function_code in profile.read_limits and isinstance(response, ExceptionResponse)
+                    and response.exception_code in SIZE_EXCEPTIONS):
+                profile.failures += 1
+                profile.read_limits[read.function_code].failure(read.quantity)
+            return profile
+        
+        profile.failures += 1
+        if transaction.status == FRAME_NO_RESPONSE:
+            limit = profile.read_limits.get(read.function_code) if read else None
+            if limit is None or not limit.failure(read.quantity):
+                # 請求大小已知可行，逾時歸因於從站需要更長的轉換時間
+                profile.slow_down_turnaround()
+        return profile
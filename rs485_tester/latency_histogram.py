@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+延遲直方圖模組
+
+以 HDR 方式分桶：數值 (微秒) 小於 2^SUB_BUCKET_BITS 時每微秒一桶，之後每個 2 的次方區間
+再細分為固定數量的子桶，相對誤差上限約 1/32。計數以稀疏 dict 保存，
+記錄為 O(1)，百分位數查詢只需走訪非空的桶。
+"""
+import time
+try:
+    from .constants import LATENCY_WINDOWS, HISTOGRAM_SUB_BUCKET_BITS
+except ImportError:
+    from constants import LATENCY_WINDOWS, HISTOGRAM_SUB_BUCKET_BITS
+
+
+SUB_BUCKET_COUNT = 1 << HISTOGRAM_SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+
+def bucket_index(value_us):
+    """數值 (微秒) 對應的桶編號"""
+    if value_us < SUB_BUCKET_COUNT:
+        return value_us
+    shift = value_us.bit_length() - HISTOGRAM_SUB_BUCKET_BITS
+    return shift * SUB_BUCKET_HALF + (value_us >> shift)
+
+
+def bucket_upper_bound(index):
+    """桶內可能的最大值 (微秒)"""
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_HALF - 1
+    mantissa = index - shift * SUB_BUCKET_HALF
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """對數分桶延遲直方圖，記錄與查詢單位皆為毫秒"""
+    
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max_us = 0
+    
+    def record(self, value_ms):
+        """記錄一筆延遲 (毫秒)"""
+        value_us = int(value_ms * 1000) if value_ms > 0 else 0
+        index = bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        if value_us > self.max_us:
+            self.max_us = value_us
+    
+    def merge(self, other):
+        """併入另一個直方圖的計數"""
+        counts = self.counts
+        # 先複製再走訪，來源可能正由其他線程寫入
+        for index, count in list(other.counts.items()):
+            counts[index] = counts.get(index, 0) + count
+        self.total += other.total
+        if other.max_us > self.max_us:
+            self.max_us = other.max_us
+    
+    def reset(self):
+        self.counts = {}
+        self.total = 0
+        self.max_us = 0
+    
+    def percentiles(self, *percents):
+        """一次計算多個百分位數 (毫秒)，結果不超過實際最大值；沒有資料時為 0"""
+        if not self.total:
+            return [0.0] * len(percents)
+        
+        targets = sorted((max(1, -(-self.total * percent // 100)), position)
+                         for position, percent in enumerate(percents))
+        results = [0.0] * len(percents)
+        cumulative = 0
+        pending = iter(targets)
+        target, position = next(pending)
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            while cumulative >= target:
+                results[position] = min(bucket_upper_bound(index), self.max_us) / 1000
+                try:
+                    target, position = next(pending)
+                except StopIteration:
+                    return results
+        return results
+    
+    def percentile(self, percent):
+        return self.percentiles(percent)[0]
+    
+    def summary(self):
+        """回傳筆數與 p50/p95/p99/最大值 (毫秒)"""
+        p50, p95, p99 = self.percentiles(50, 95, 99)
+        return {"count": self.total, "p50": p50, "p95": p95, "p99": p99, "max": self.max_us / 1000}
+
+
+class WindowedHistogram:
+    """滑動時間窗直方圖：時間窗切成數個時段，各自保存直方圖，過期時段整段清除"""
+    
+    def __init__(self, window_seconds, slots):
+        if window_seconds <= 0 or slots <= 0:
+            raise ValueError("時間窗長度與時段數必須大於0")
+        
+        self.window_seconds = window_seconds
+        self.slot_seconds = window_seconds / slots
+        self.slots = [LatencyHistogram() for _ in range(slots)]
+        self.slot_ids = [None] * slots
+    
+    def _slot(self, now):
+        slot_id = int(now // self.slot_seconds)
+        position = slot_id % len(self.slots)
+        if self.slot_ids[position] != slot_id:
+            self.slots[position].reset()
+            self.slot_ids[position] = slot_id
+        return self.slots[position]
+    
+    def record(self, value_ms, now=None):
+        self._slot(time.monotonic() if now is None else now).record(value_ms)
+    
+    def merge(self, other):
+        """依時段對齊併入另一個相同設定的時間窗，較舊的時段被較新的取代"""
+        for position, slot_id in enumerate(other.slot_ids):
+            if slot_id is None:
+                continue
+            own_id = self.slot_ids[position]
+            if own_id is None or own_id < slot_id:
+                self.slots[position].reset()
+                self.slot_ids[position] = slot_id
+                own_id = slot_id
+            if own_id == slot_id:
+                self.slots[position].merge(other.slots[position])
+    
+    def snapshot(self, now=None):
+        """合併仍在時間窗內的時段，回傳 LatencyHistogram"""
+        current = int((time.monotonic() if now is None else now) // self.slot_seconds)
+        oldest = current - len(self.slots) + 1
+        merged = LatencyHistogram()
+        for slot_id, histogram in zip(self.slot_ids, self.slots):
+            if slot_id is not None and oldest <= slot_id <= current:
+                merged.merge(histogram)
+        return merged
+
+
+class LatencyTracker:
+    """同時維護整個連線期間與各滑動時間窗的延遲分布"""
+    
+    SESSION = "整個連線期間"
+    
+    def __init__(self, windows=LATENCY_WINDOWS):
+        self.session = LatencyHistogram()
+        self.windows = {name: WindowedHistogram(seconds, slots) for name, (seconds, slots) in windows.items()}
+    
+    def record(self, value_ms, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.session.record(value_ms)
+        for window in self.windows.values():
+            window.record(value_ms, now)
+    
+    def merge(self, other):
+        """併入另一個相同時間窗設定的追蹤器"""
+        self.session.merge(other.session)
+        for name, window in self.windows.items():
+            window.merge(other.windows[name])
+    
+    def histogram(self, window=SESSION, now=None):
+        """取得指定時間窗的直方圖"""
+        if window == self.SESSION:
+            return self.session
+        if window not in self.windows:
+            raise ValueError(f"未知的時間窗: {window}")
+        return self.windows[window].snapshot(now)
+    
+    def summary(self, window=SESSION, now=None):
+        return self.histogram(window, now).summary()
+    
+    def window_names(self):
+        return list(self.windows) + [self.SESSION]
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Modbus PDU 解碼模組
+
+直接解碼 bytes/bytearray/memoryview，不經過十六進位字串轉換；
+結果為精簡的 namedtuple 紀錄 (整數欄位 + 暫存器陣列)，文字格式只在 describe() 時產生。
+"""
+import sys
+from array import array
+from collections import namedtuple
+try:
+    from .constants import MODBUS_FUNCTIONS, MODBUS_EXCEPTIONS
+except ImportError:
+    from constants import MODBUS_FUNCTIONS, MODBUS_EXCEPTIONS
+
+
+def _registers(view):
+    """將大端序的暫存器資料轉為 16 位元無號整數陣列"""
+    registers = array('H')
+    registers.frombytes(view)
+    if sys.byteorder == 'little':
+        registers.byteswap()
+    return registers
+
+
+def _bits(view, count=None):
+    """展開線圈位元圖 (每個位元組低位元在前)"""
+    bits = [(byte >> shift) & 1 for byte in view for shift in range(8)]
+    return bits if count is None else bits[:count]
+
+
+def _function_text(function_code):
+    return f"{function_code:02X} ({MODBUS_FUNCTIONS.get(function_code, '未知功能')})"
+
+
+class ReadRequest(namedtuple('ReadRequest', ['slave_id', 'function_code', 'address', 'quantity'])):
+    """0x01-0x04 讀取請求"""
+    __slots__ = ()
+    
+    def describe(self):
+        return {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": _function_text(self.function_code),
+            "起始位址": f"{self.address:04X} ({self.address})",
+            "讀取數量": f"{self.quantity}",
+        }
+
+
+class ReadBitsResponse(namedtuple('ReadBitsResponse', ['slave_id', 'function_code', 'payload'])):
+    """0x01/0x02 回應；payload 為線圈位元圖的 memoryview"""
+    __slots__ = ()
+    
+    def bits(self, count=None):
+        """展開為 0/1 串列，count 為請求的點數 (去除補齊位元)"""
+        return _bits(self.payload, count)
+    
+    def describe(self):
+        return {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": _function_text(self.function_code),
+            "位元組數": f"{len(self.payload)}",
+            "狀態位元": "".join(str(bit) for bit in self.bits()),
+        }
+
+
+class RegistersResponse(namedtuple('RegistersResponse', ['slave_id', 'function_code', 'registers'])):
+    """0x03/0x04 回應；registers 為 array('H')"""
+    __slots__ = ()
+    
+    def describe(self):
+        return {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": _function_text(self.function_code),
+            "位元組數": f"{2 * len(self.registers)}",
+            "暫存器值": " ".join(f"{value:04X}" for value in self.registers),
+        }
+
+
+class WriteSingle(namedtuple('WriteSingle', ['slave_id', 'function_code', 'address', 'value'])):
+    """0x05/0x06 請求 (回應為原樣回傳)"""
+    __slots__ = ()
+    
+    def describe(self):
+        analysis = {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": _function_text(self.function_code),
+        }
+        if self.function_code == 0x05:
+            state = {0xFF00: "ON", 0x0000: "OFF"}.get(self.value, "無效值")
+            analysis["線圈位址"] = f"{self.address:04X} ({self.address})"
+            analysis["寫入值"] = f"{self.value:04X} ({state})"
+        else:
+            analysis["暫存器位址"] = f"{self.address:04X} ({self.address})"
+            analysis["寫入值"] = f"{self.value:04X} ({self.value})"
+        return analysis
+
+
+class WriteCoilsRequest(namedtuple('WriteCoilsRequest', ['slave_id', 'function_code', 'address', 'quantity',
+                                                         'payload'])):
+    """0x0F 請求；payload 為線圈位元圖的 memoryview"""
+    __slots__ = ()
+    
+    def bits(self):
+        return _bits(self.payload, self.quantity)
+    
+    def describe(self):
+        return {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": _function_text(self.function_code),
+            "起始位址": f"{self.address:04X} ({self.address})",
+            "寫入數量": f"{self.quantity}",
+            "寫入狀態": "".join(str(bit) for bit in self.bits()),
+        }
+
+
+class WriteRegistersRequest(namedtuple('WriteRegistersRequest', ['slave_id', 'function_code', 'address',
+                                                                 'quantity', 'registers'])):
+    """0x10 請求；registers 為 array('H')"""
+    __slots__ = ()
+    
+    def describe(self):
+        return {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": _function_text(self.function_code),
+            "起始位址": f"{self.address:04X} ({self.address})",
+            "寫入數量": f"{self.quantity}",
+            "寫入值": " ".join(f"{value:04X}" for value in self.registers),
+        }
+
+
+class WriteMultipleResponse(namedtuple('WriteMultipleResponse', ['slave_id', 'function_code', 'address',
+                                                                 'quantity'])):
+    """0x0F/0x10 回應"""
+    __slots__ = ()
+    
+    def describe(self):
+        return {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": _function_text(self.function_code),
+            "起始位址": f"{self.address:04X} ({self.address})",
+            "寫入數量": f"{self.quantity}",
+        }
+
+
+class ExceptionResponse(namedtuple('ExceptionResponse', ['slave_id', 'function_code', 'exception_code'])):
+    """例外回應；function_code 為原請求的功能碼 (已去除 0x80)"""
+    __slots__ = ()
+    
+    def describe(self):
+        name = MODBUS_EXCEPTIONS.get(self.exception_code, "未知例外")
+        return {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": f"{self.function_code | 0x80:02X} (例外回應: {MODBUS_FUNCTIONS.get(self.function_code, '未知功能')})",
+            "例外碼": f"{self.exception_code:02X} ({name})",
+        }
+
+
+class RawPdu(namedtuple('RawPdu', ['slave_id', 'function_code', 'payload'])):
+    """未支援的功能碼，保留原始資料"""
+    __slots__ = ()
+    
+    def describe(self):
+        return {
+            "設備地址": f"{self.slave_id:02X} ({self.slave_id})",
+            "功能碼": _function_text(self.function_code),
+            "資料": bytes(self.payload).hex(' ').upper(),
+        }
+
+
+class ModbusPduDecoder:
+    """Modbus 請求/回應/例外回應解碼器 (RTU 訊框預設含 CRC)"""
+    
+    @staticmethod
+    def _body(frame, has_crc):
+        """回傳去除 CRC 的 memoryview (位址 + PDU)"""
+        view = memoryview(frame)
+        if has_crc:
+            if len(view) < 4:
+                raise ValueError("封包長度不足 (最少需要4個位元組)")
+            view = view[:-2]
+        if len(view) < 2:
+            raise ValueError("封包長度不足 (缺少位址或功能碼)")
+        return view
+    
+    @staticmethod
+    def _require(view, length):
+        if len(view) < length:
+            raise ValueError(f"封包長度不足: 需要 {length} 個位元組，實際 {len(view)} 個")
+    
+    @staticmethod
+    def decode_request(frame, has_crc=True):
+        """解碼主站請求"""
+        view = ModbusPduDecoder._body(frame, has_crc)
+        slave_id, func_code = view[0], view[1]
+        
+        if func_code in (0x01, 0x02, 0x03, 0x04):
+            ModbusPduDecoder._require(view, 6)
+            return ReadRequest(slave_id, func_code, (view[2] << 8) | view[3], (view[4] << 8) | view[5])
+        if func_code in (0x05, 0x06):
+            ModbusPduDecoder._require(view, 6)
+            return WriteSingle(slave_id, func_code, (view[2] << 8) | view[3], (view[4] << 8) | view[5])
+        if func_code in (0x0F, 0x10):
+            ModbusPduDecoder._require(view, 7)
+            address = (view[2] << 8) | view[3]
+            quantity = (view[4] << 8) | view[5]
+            byte_count = view[6]
+            ModbusPduDecoder._require(view, 7 + byte_count)
+            payload = view[7:7 + byte_count]
+            if func_code == 0x0F:
+                return WriteCoilsRequest(slave_id, func_code, address, quantity, payload)
+            return WriteRegistersRequest(slave_id, func_code, address, quantity, _registers(payload))
+        return RawPdu(slave_id, func_code, view[2:])
+    
+    @staticmethod
+    def decode_response(frame, has_crc=True):
+        """解碼從站回應 (含例外回應)"""
+        view = ModbusPduDecoder._body(frame, has_crc)
+        slave_id, func_code = view[0], view[1]
+        
+        if func_code & 0x80:
+            ModbusPduDecoder._require(view, 3)
+            return ExceptionResponse(slave_id, func_code & 0x7F, view[2])
+        if func_code in (0x01, 0x02, 0x03, 0x04):
+            ModbusPduDecoder._require(view, 3)
+            byte_count = view[2]
+            ModbusPduDecoder._require(view, 3 + byte_count)
+            payload = view[3:3 + byte_count]
+            if func_code in (0x01, 0x02):
+                return ReadBitsResponse(slave_id, func_code, payload)
+            if byte_count % 2:
+                raise ValueError(f"暫存器資料位元組數必須為偶數: {byte_count}")
+            return RegistersResponse(slave_id, func_code, _registers(payload))
+        if func_code in (0x05, 0x06):
+            ModbusPduDecoder._require(view, 6)
+            return WriteSingle(slave_id, func_code, (view[2] << 8) | view[3], (view[4] << 8) | view[5])
+        if func_code in (0x0F, 0x10):
+            ModbusPduDecoder._require(view, 6)
+            return WriteMultipleResponse(slave_id, func_code, (view[2] << 8) | view[3], (view[4] << 8) | view[5])
+        return RawPdu(slave_id, func_code, view[2:])
+    
+    @staticmethod
+    def is_response(frame, has_crc=True):
+        """無方向資訊時依長度推斷是否為回應 (例如貼上的單一封包)"""
+        body_length = len(frame) - (2 if has_crc else 0)
+        if body_length < 2:
+            return False
+        func_code = frame[1]
+        if func_code & 0x80:
+            return True
+        if func_code in (0x01, 0x02, 0x03, 0x04):
+            # 請求固定 6 位元組；回應為 3 + 位元組數 (長度相同時視為請求)
+            return body_length != 6
+        if func_code in (0x0F, 0x10):
+            return body_length == 6
+        return False
+    
+    @staticmethod
+    def decode(frame, has_crc=True):
+        """自動判斷方向並解碼"""
+        if ModbusPduDecoder.is_response(frame, has_crc):
+            return ModbusPduDecoder.decode_response(frame, has_crc)
+        return ModbusPduDecoder.decode_request(frame, has_crc)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+輪詢計畫編譯模組
+
+將各從站需要的點位 (暫存器/線圈) 依功能碼排序後合併為最少的讀取請求：
+相鄰或間隔不超過 gap 點的範圍合併成同一筆請求，並遵守單次讀取 125 個暫存器、
+2000 個線圈的上限；收到回應後再依點位拆回各自的數值。
+"""
+from collections import namedtuple
+try:
+    from .constants import MODBUS_MAX_READ_REGISTERS, MODBUS_MAX_READ_BITS, DEFAULT_POLL_GAP
+    from .data_utils import ModbusCRC
+    from .pdu_decoder import ModbusPduDecoder, ExceptionResponse
+    from .transaction import is_mbap_frame
+except ImportError:
+    from constants import MODBUS_MAX_READ_REGISTERS, MODBUS_MAX_READ_BITS, DEFAULT_POLL_GAP
+    from data_utils import ModbusCRC
+    from pdu_decoder import ModbusPduDecoder, ExceptionResponse
+    from transaction import is_mbap_frame
+
+
+READ_LIMITS = {
+    0x01: MODBUS_MAX_READ_BITS,
+    0x02: MODBUS_MAX_READ_BITS,
+    0x03: MODBUS_MAX_READ_REGISTERS,
+    0x04: MODBUS_MAX_READ_REGISTERS,
+}
+
+
+class PollPoint(namedtuple('PollPoint', ['name', 'slave_id', 'function_code', 'address', 'count'])):
+    """一個要讀取的點位；count 為連續的暫存器/線圈數 (例如 32 位元數值佔 2 個暫存器)"""
+    __slots__ = ()
+    
+    @property
+    def end(self):
+        return self.address + self.count
+
+
+class PollRequest(namedtuple('PollRequest', ['slave_id', 'function_code', 'address', 'quantity', 'points'])):
+    """合併後的一筆讀取請求與其涵蓋的點位"""
+    __slots__ = ()
+    
+    def frame(self):
+        """含 CRC 的 RTU 請求封包"""
+        pdu = bytes((self.slave_id, self.function_code, self.address >> 8, self.address & 0xFF,
+                     self.quantity >> 8, self.quantity & 0xFF))
+        return pdu + ModbusCRC.to_bytes(ModbusCRC.calculate(pdu))
+    
+    @property
+    def hex(self):
+        return self.frame().hex(' ').upper()
+    
+    def split(self, response, has_crc=True):
+        """將回應拆回各點位的數值：單一點位為整數，多個點位為 tuple
+        
+        Modbus TCP 回應 (MBAP 訊框) 自動去除標頭，不檢查 CRC。
+        回應為例外、不屬於此請求或資料不足時引發 ValueError。
+        """
+        if is_mbap_frame(response):
+            response, has_crc = response[6:], False
+        decoded = ModbusPduDecoder.decode_response(response, has_crc)
+        if isinstance(decoded, ExceptionResponse):
+            raise ValueError(f"從站回應例外碼 {decoded.exception_code:02X}")
+        if decoded.slave_id != self.slave_id or decoded.function_code != self.function_code:
+            raise ValueError("回應的從站位址或功能碼與請求不符")
+        
+        if self.function_code in (0x01, 0x02):
+            values = decoded.bits(self.quantity)
+        else:
+            values = decoded.registers
+        if len(values) < self.quantity:
+            raise ValueError(f"回應資料不足: 需要 {self.quantity} 點，收到 {len(values)} 點")
+        
+        result = {}
+        for point in self.points:
+            offset = point.address - self.address
+            result[point.name] = values[offset] if point.count == 1 else tuple(values[offset:offset + point.count])
+        return result
+
+
+class PollPlan:
+    """編譯後的輪詢計畫"""
+    
+    def __init__(self, requests, point_count):
+        self.requests = requests
+        self.point_count = point_count
+    
+    def __len__(self):
+        return len(self.requests)
+    
+    def __iter__(self):
+        return iter(self.requests)
+    
+    def split_responses(self, responses):
+        """依序拆解每筆請求的回應 (None 表示無回應而略過)，合併為 {點位名稱: 數值}"""
+        values = {}
+        for request, response in zip(self.requests, responses):
+            if response:
+                values.update(request.split(response))
+        return values
+
+
+class PollPlanCompiler:
+    """輪詢計畫編譯器"""
+    
+    def __init__(self, gap=DEFAULT_POLL_GAP, limits=None):
+        if gap < 0:
+            raise ValueError("合併間隔不能小於0")
+        self.gap = gap
+        self.limits = dict(READ_LIMITS if limits is None else limits)
+    
+    @staticmethod
+    def parse_points(definitions, slave_id):
+        """解析常用指令格式的點位定義 {名稱: "{ID} 功能碼 位址高 位址低 [數量高 數量低]"}"""
+        points = []
+        for name, template in definitions.items():
+            text = template.replace("{ID}", f"{slave_id:02X}").replace(" ", "")
+            try:
+                data = bytes.fromhex(text)
+            except ValueError:
+                raise ValueError(f"點位 '{name}' 的定義不是有效的十六進位: {template}")
+            if len(data) not in (4, 6):
+                raise ValueError(f"點位 '{name}' 的定義長度錯誤: {template}")
+            count = (data[4] << 8) | data[5] if len(data) == 6 else 1
+            points.append(PollPoint(name, data[0], data[1], (data[2] << 8) | data[3], count))
+        return points
+    
+    def compile(self, points):
+        """將點位合併為最少的讀取請求，依 (從站, 功能碼, 位址) 排序"""
+        groups = {}
+        for point in points:
+            limit = self.limits.get(point.function_code)
+            if limit is None:
+                raise ValueError(f"點位 '{point.name}' 的功能碼 {point.function_code:02X} 不是讀取功能")
+            if not 1 <= point.count <= limit:
+                raise ValueError(f"點位 '{point.name}' 的數量必須在 1 到 {limit} 之間")
+            if point.end > 0x10000:
+                raise ValueError(f"點位 '{point.name}' 超出位址範圍")
+            groups.setdefault((point.slave_id, point.function_code), []).append(point)
+        
+        requests = []
+        for (slave_id, function_code), group in sorted(groups.items()):
+            limit = self.limits[function_code]
+            group.sort(key=lambda point: (point.address, point.count))
+            start, end, members = group[0].address, group[0].end, [group[0]]
+            for point in group[1:]:
+                merged_end = max(end, point.end)
+                if point.address - end <= self.gap and merged_end - start <= limit:
+                    end = merged_end
+                    members.append(point)
+                    continue
+                requests.append(PollRequest(slave_id, function_code, start, end - start, tuple(members)))
+                start, end, members = point.address, point.end, [point]
+            requests.append(PollRequest(slave_id, function_code, start, end - start, tuple(members)))
+        return PollPlan(requests, len(points))
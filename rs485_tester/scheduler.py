@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+週期排程模組
+
+所有連線的定時發送與監控查詢共用一個排程線程：以單調時鐘的截止時間組成 heap，
+下一次的時間點由上一次「排定」的時間加上週期計算，不受執行時間影響而累積漂移。
+回呼只應把指令交給連線工作線程，不可在排程線程中等待匯流排回應。
+"""
+import heapq
+import itertools
+import threading
+import time
+try:
+    from .constants import SCHEDULE_SKIP, SCHEDULE_CATCH_UP, SCHEDULER_MAX_CATCH_UP, READER_JOIN_TIMEOUT
+    from .latency_histogram import LatencyHistogram, LatencyTracker
+except ImportError:
+    from constants import SCHEDULE_SKIP, SCHEDULE_CATCH_UP, SCHEDULER_MAX_CATCH_UP, READER_JOIN_TIMEOUT
+    from latency_histogram import LatencyHistogram, LatencyTracker
+
+
+class PeriodicJob:
+    """一個週期性工作與其執行統計"""
+    
+    __slots__ = ('name', 'interval_ns', 'callback', 'policy', 'next_ns', 'active',
+                 'runs', 'skipped', 'jitter', 'error')
+    
+    def __init__(self, name, interval_ns, callback, policy, next_ns):
+        self.name = name
+        self.interval_ns = interval_ns
+        self.callback = callback
+        self.policy = policy
+        self.next_ns = next_ns
+        self.active = True
+        self.runs = 0
+        self.skipped = 0
+        self.jitter = LatencyHistogram()  # 實際執行時間落後排定時間 (毫秒)
+        self.error = None
+    
+    @property
+    def interval(self):
+        return self.interval_ns / 1e9
+    
+    def advance(self, now_ns):
+        """由排定時間推進到下一個週期，落後時依策略跳過或保留補發的週期"""
+        self.next_ns += self.interval_ns
+        behind = (now_ns - self.next_ns) // self.interval_ns + 1 if now_ns >= self.next_ns else 0
+        if self.policy == SCHEDULE_CATCH_UP:
+            behind -= SCHEDULER_MAX_CATCH_UP
+        if behind > 0:
+            self.next_ns += behind * self.interval_ns
+            self.skipped += behind
+
+
+class PeriodicScheduler:
+    """單一線程驅動所有週期性工作"""
+    
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = None
+        self.jitter = LatencyTracker()
+    
+    def add(self, name, interval, callback, policy=SCHEDULE_SKIP, start_delay=None):
+        """新增週期 interval 秒的工作，預設在一個週期後第一次執行；回傳 PeriodicJob"""
+        if interval <= 0:
+            raise ValueError("排程週期必須大於0")
+        if policy not in (SCHEDULE_SKIP, SCHEDULE_CATCH_UP):
+            raise ValueError(f"不支援的排程策略: {policy}")
+        
+        interval_ns = int(interval * 1e9)
+        delay_ns = interval_ns if start_delay is None else int(start_delay * 1e9)
+        job = PeriodicJob(name, interval_ns, callback, policy, time.perf_counter_ns() + delay_ns)
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("排程器已停止")
+            heapq.heappush(self._heap, (job.next_ns, next(self._sequence), job))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return job
+    
+    def cancel(self, job):
+        """取消工作；heap 中的項目在到期時才移除"""
+        if job is not None:
+            job.active = False
+    
+    def jobs(self):
+        with self._condition:
+            return [job for _, _, job in self._heap if job.active]
+    
+    def _run(self):
+        heap = self._heap
+        while True:
+            with self._condition:
+                while True:
+                    if not self._running:
+                        return
+                    while heap and not heap[0][2].active:
+                        heapq.heappop(heap)
+                    now_ns = time.perf_counter_ns()
+                    if heap and heap[0][0] <= now_ns:
+                        due_ns, _, job = heapq.heappop(heap)
+                        break
+                    self._condition.wait((heap[0][0] - now_ns) / 1e9 if heap else None)
+            
+            lateness_ms = (now_ns - due_ns) / 1e6
+            job.jitter.record(lateness_ms)
+            self.jitter.record(lateness_ms)
+            job.runs += 1
+            try:
+                job.callback()
+            except Exception as e:
+                job.error = e
+                job.active = False
+                print(f"警告: 排程工作 '{job.name}' 發生錯誤，已停止: {e}")
+                continue
+            
+            job.advance(time.perf_counter_ns())
+            if job.active:
+                with self._condition:
+                    heapq.heappush(heap, (job.next_ns, next(self._sequence), job))
+    
+    def stop(self, timeout=READER_JOIN_TIMEOUT):
+        """停止排程線程並取消所有工作"""
+        with self._condition:
+            self._running = False
+            for _, _, job in self._heap:
+                job.active = False
+            self._heap.clear()
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+串口背景接收模組
+"""
+import threading
+import time
+from collections import namedtuple
+try:
+    from .constants import RING_BUFFER_SIZE, MODBUS_MAX_FRAME_SIZE, READER_JOIN_TIMEOUT
+except ImportError:
+    from constants import RING_BUFFER_SIZE, MODBUS_MAX_FRAME_SIZE, READER_JOIN_TIMEOUT
+
+
+# data 為環形緩衝區的 memoryview 切片，時間戳為 perf_counter_ns
+ReceivedFrame = namedtuple('ReceivedFrame', ['data', 'first_byte_ns', 'last_byte_ns'])
+
+
+class FrameRingBuffer:
+    """預先配置的環形緩衝區，每個訊框都存放於連續區段，可直接以 memoryview 發布"""
+    
+    def __init__(self, size=RING_BUFFER_SIZE):
+        if size < 2 * MODBUS_MAX_FRAME_SIZE:
+            raise ValueError(f"緩衝區大小不得小於{2 * MODBUS_MAX_FRAME_SIZE}")
+        
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.size = size
+        self.frame_start = 0
+        self.write_pos = 0
+    
+    def pending(self):
+        """目前未完成訊框的位元組數"""
+        return self.write_pos - self.frame_start
+    
+    def writable(self, nbytes):
+        """取得可寫入 nbytes 的連續區段，尾端空間不足時將未完成訊框移回開頭"""
+        nbytes = min(nbytes, MODBUS_MAX_FRAME_SIZE)
+        if self.write_pos + nbytes > self.size:
+            # 繞回時只複製未完成的訊框 (最多 256 位元組)
+            pending = self.pending()
+            self.buffer[:pending] = self.buffer[self.frame_start:self.write_pos]
+            self.frame_start = 0
+            self.write_pos = pending
+        return self.view[self.write_pos:self.write_pos + nbytes]
+    
+    def commit(self, nbytes):
+        """確認已寫入的位元組數"""
+        self.write_pos += nbytes
+    
+    def take_frame(self):
+        """取出目前訊框的 memoryview 切片；切片在緩衝區繞回一圈前保持有效"""
+        frame = self.view[self.frame_start:self.write_pos]
+        self.frame_start = self.write_pos
+        return frame
+
+
+class SerialReader:
+    """每個串口一個背景接收線程，以靜默時間切割訊框並發布給訂閱者"""
+    
+    def __init__(self, ser, silence_interval, buffer_size=RING_BUFFER_SIZE):
+        self.ser = ser
+        self.silence_interval = silence_interval
+        self.ring = FrameRingBuffer(buffer_size)
+        self.subscribers = []
+        self.running = False
+        self.thread = None
+        self.error = None
+    
+    def subscribe(self, callback):
+        """訂閱訊框，callback(frame) 於接收線程中呼叫，不應執行耗時工作"""
+        # 以新串列取代，接收線程迭代時不需加鎖
+        self.subscribers = self.subscribers + [callback]
+    
+    def unsubscribe(self, callback):
+        """取消訂閱"""
+        self.subscribers = [cb for cb in self.subscribers if cb is not callback]
+    
+    def start(self):
+        """啟動背景接收"""
+        if self.running:
+            return
+        # 讀取逾時即為訊框間的靜默時間
+        self.ser.timeout = self.silence_interval
+        self.running = True
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """停止背景接收"""
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(READER_JOIN_TIMEOUT)
+        self.thread = None
+    
+    def _run(self):
+        """接收迴圈: readinto 直接寫入環形緩衝區，不做複製與格式化"""
+        ring = self.ring
+        first_byte_ns = 0
+        last_byte_ns = 0
+        while self.running:
+            try:
+                target = ring.writable(max(self.ser.in_waiting, 1))
+                count = self.ser.readinto(target)
+            except Exception as e:
+                self.error = e
+                self.running = False
+                break
+            
+            if count:
+                last_byte_ns = time.perf_counter_ns()
+                if not ring.pending():
+                    first_byte_ns = last_byte_ns
+                ring.commit(count)
+                if ring.pending() < MODBUS_MAX_FRAME_SIZE:
+                    continue
+            
+            # 靜默逾時或達到最大訊框長度即結束目前訊框
+            if ring.pending():
+                self._publish(ReceivedFrame(ring.take_frame(), first_byte_ns, last_byte_ns))
+    
+    def _publish(self, frame):
+        """發布訊框給所有訂閱者"""
+        for callback in self.subscribers:
+            try:
+                callback(frame)
+            except Exception as e:
+                print(f"警告: 訊框訂閱者處理失敗: {e}")
@@ -2,11 +2,32 @@ import serial
 import serial.tools.list_ports
 import datetime
 import time
+import queue
+try:
+    from .constants import MODBUS_MAX_FRAME_SIZE, MODBUS_EXCEPTION_FRAME_SIZE, DEFAULT_TURNAROUND_DELAY
+    from .constants import FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_UNMATCHED, FRAME_BROADCAST
+    from .constants import MODBUS_BROADCAST_ADDRESS, RX_FRAME_QUEUE_SIZE
+    from .data_utils import ModbusPacketAnalyzer
+    from .bus_timing import BusTimer, calc_char_time, calc_silence_interval
+    from .serial_reader import SerialReader
+    from .transaction import TransactionCorrelator, is_broadcast_request, broadcast_transaction
+    from .device_tuning import DeviceTuner
+    from .transport import Transport, TransportError, to_bytes, format_bytes
+except ImportError:
+    from constants import MODBUS_MAX_FRAME_SIZE, MODBUS_EXCEPTION_FRAME_SIZE, DEFAULT_TURNAROUND_DELAY
+    from constants import FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_UNMATCHED, FRAME_BROADCAST
+    from constants import MODBUS_BROADCAST_ADDRESS, RX_FRAME_QUEUE_SIZE
+    from data_utils import ModbusPacketAnalyzer
+    from bus_timing import BusTimer, calc_char_time, calc_silence_interval
+    from serial_reader import SerialReader
+    from transaction import TransactionCorrelator, is_broadcast_request, broadcast_transaction
+    from device_tuning import DeviceTuner
+    from transport import Transport, TransportError, to_bytes, format_bytes
 
 
-
-class RS485Tester:
-    def __init__(self, port, baudrate=9600, bytesize=8, parity='N', stopbits=1, timeout=1,log_file=None):
+class RS485Tester(Transport):
+    def __init__(self, port, baudrate=9600, bytesize=8, parity='N', stopbits=1, timeout=1,log_file=None,
+                 turnaround_delay=DEFAULT_TURNAROUND_DELAY):
         if not port or not port.strip():
             raise ValueError("串口名稱不能為空")
         
@@ -16,6 +37,9 @@ class RS485Tester:
         if timeout <= 0:
             raise ValueError("逾時時間必須大於0")
         
+        if turnaround_delay < 0:
+            raise ValueError("轉換延遲不能小於0")
+        
         try:
             self.ser = serial.Serial(
                 port=port,
@@ -29,6 +53,24 @@ class RS485Tester:
             raise ConnectionError(f"無法開啟串口 {port}: {e}")
         except Exception as e:
             raise ConnectionError(f"串口初始化失敗: {e}")
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.bus_timer = BusTimer(baudrate, bytesize, parity, stopbits, turnaround_delay)
+        self.silence_interval = self.bus_timer.silence_interval
+        self._last_slave_id = None
+        self.last_frame_status = None
+        self.reader = None
+        # 沒有交易等待時 (匯流排上有其他主站或閒置) 訊框會累積，佇列有上限並丟棄最舊的訊框
+        self._frame_queue = queue.Queue(RX_FRAME_QUEUE_SIZE)
+        self.rx_dropped = 0
+        # 最近一次寫入/接收的時間戳 (perf_counter_ns)，供請求/回應配對計算延遲
+        self.correlator = TransactionCorrelator()
+        self.tuner = DeviceTuner(turnaround_delay)
+        self.last_write_start_ns = None
+        self.last_write_done_ns = None
+        self.last_rx_first_ns = None
+        self.last_rx_last_ns = None
         self.log_file = log_file
         if self.log_file:
             try:
@@ -48,51 +90,347 @@ class RS485Tester:
     
 
     def send_hex(self, hex_str):
+        """發送十六進位字串 (使用者輸入)，轉為 bytes 後交給 send()"""
         if not hex_str or not hex_str.strip():
             raise ValueError("十六進位字串不能為空")
-        
-        try:
-            data = bytes.fromhex(hex_str.replace(" ", ""))
-        except ValueError as e:
-            raise ValueError(f"無效的十六進位字串: {e}")
-        
+        return self.send(to_bytes(hex_str))
+    
+    def send(self, data):
+        """發送位元組，回傳實際送出的 bytes"""
+        data = to_bytes(data)
         try:
-            self.ser.write(data)
-            log_message = f"[送出] {hex_str}"
-            print(log_message)
-            self._log_message(log_message) 
-            time.sleep(0.1)  # 等待約 0.1毫秒
+            if self.reader:
+                self._discard_stale_frames()
+            # 等待前一筆訊框的間隔與裝置轉換延遲，取代固定延遲
+            self.bus_timer.wait_bus_free()
+            return self._write_frame(data)
         except serial.SerialException as e:
-            raise ConnectionError(f"發送資料失敗: {e}")
+            raise TransportError(f"發送資料失敗: {e}")
         except Exception as e:
-            raise ConnectionError(f"串口寫入錯誤: {e}") 
+            raise TransportError(f"串口寫入錯誤: {e}") 
+    
+    def _write_frame(self, data):
+        """匯流排空閒後寫入訊框：記錄匯流排時序、時間戳與日誌"""
+        if is_broadcast_request(data):
+            # 廣播沒有回應，下一筆請求需等待從站處理廣播的轉換延遲
+            self.bus_timer.mark_broadcast(len(data))
+        else:
+            self.bus_timer.mark_transmit(len(data))
+        self.last_write_start_ns = time.perf_counter_ns()
+        self.ser.write(data)
+        self.last_write_done_ns = time.perf_counter_ns()
+        self._last_slave_id = data[0]
+        log_message = f"[送出] {format_bytes(data)}"
+        print(log_message)
+        self._log_message(log_message)
+        return data
 
     def receive_response(self, max_bytes=64):
         if max_bytes <= 0:
             raise ValueError("最大接收位元組數必須大於0")
         
+        if self._last_slave_id == MODBUS_BROADCAST_ADDRESS:
+            # 從站不回應廣播，不必等待逾時
+            self._log_message("[接收] 廣播不等待回應")
+            return b''
+        
+        if self.reader:
+            return self._receive_from_reader()
+        
         try:
             response = self.ser.read(max_bytes)
             if response:
+                # 一次讀取無法得知第一個位元組的到達時間，以訊框傳送時間回推
+                self.last_rx_last_ns = time.perf_counter_ns()
+                self.last_rx_first_ns = self.last_rx_last_ns - int(self.bus_timer.frame_time(len(response) - 1) * 1e9)
+                self.bus_timer.mark_receive(self._last_slave_id)
                 received_hex = response.hex(' ').upper()
                 log_message = f"[接收] {received_hex}"
                 print(log_message)
                 self._log_message(log_message)
-                time.sleep(0.1)  
             else:
                 log_message = "[接收] 無回應（可能逾時）"
                 print(log_message)
                 self._log_message(log_message)
             return response  # Optionally return the response bytes for further processing
         except serial.SerialException as e:
-            raise ConnectionError(f"接收資料失敗: {e}")
+            raise TransportError(f"接收資料失敗: {e}")
+        except Exception as e:
+            raise TransportError(f"串口讀取錯誤: {e}")                   
+
+    def receive_frame(self, max_bytes=MODBUS_MAX_FRAME_SIZE):
+        """接收一個 Modbus RTU 訊框，線路靜默 3.5 字元時間即視為訊框結束"""
+        if max_bytes <= 0:
+            raise ValueError("最大接收位元組數必須大於0")
+        
+        if self.reader:
+            return self._receive_from_reader()
+        
+        try:
+            # 第一個位元組使用設定的回應逾時
+            first = self.ser.read(1)
+            if not first:
+                log_message = "[接收] 無回應（可能逾時）"
+                print(log_message)
+                self._log_message(log_message)
+                return b''
+            
+            frame = bytearray(first)
+            self.last_rx_first_ns = time.perf_counter_ns()
+            last_byte_at = time.perf_counter()
+            # 之後每次讀取最多只等待一個靜默間隔，逾時即代表訊框結束
+            self.ser.timeout = self.silence_interval
+            try:
+                while len(frame) < max_bytes:
+                    waiting = self.ser.in_waiting
+                    chunk = self.ser.read(min(max(waiting, 1), max_bytes - len(frame)))
+                    if not chunk:
+                        break
+                    frame += chunk
+                    last_byte_at = time.perf_counter()
+            finally:
+                self.ser.timeout = self.timeout
+            
+            self.bus_timer.mark_receive(self._last_slave_id, last_byte_at)
+            self.last_rx_last_ns = int(last_byte_at * 1e9)
+            response = bytes(frame)
+            log_message = f"[接收] {response.hex(' ').upper()}"
+            print(log_message)
+            self._log_message(log_message)
+            return response
+        except serial.SerialException as e:
+            raise TransportError(f"接收資料失敗: {e}")
+        except Exception as e:
+            raise TransportError(f"串口讀取錯誤: {e}")
+
+    def receive_exact(self, expected_length):
+        """依已知的回應長度接收，收滿即返回；遇到例外回應時提前結束"""
+        if expected_length < MODBUS_EXCEPTION_FRAME_SIZE:
+            raise ValueError(f"預期回應長度不得小於{MODBUS_EXCEPTION_FRAME_SIZE}")
+        
+        if self.reader:
+            return self._receive_from_reader(expected_length)
+        
+        try:
+            # 先讀取位址與功能碼，判斷是否為例外回應
+            response = self.ser.read(2)
+            if len(response) == 2:
+                # 讀取在第二個位元組到達時返回，回推一個字元時間即為第一個位元組
+                self.last_rx_first_ns = time.perf_counter_ns() - int(self.bus_timer.char_time * 1e9)
+                if ModbusPacketAnalyzer.is_exception_response(response[1]):
+                    remaining = MODBUS_EXCEPTION_FRAME_SIZE - 2
+                else:
+                    remaining = expected_length - 2
+                response += self.ser.read(remaining)
+            elif response:
+                self.last_rx_first_ns = time.perf_counter_ns()
+            
+            if response:
+                self.last_rx_last_ns = time.perf_counter_ns()
+                self.bus_timer.mark_receive(self._last_slave_id)
+                log_message = f"[接收] {response.hex(' ').upper()}"
+            else:
+                log_message = "[接收] 無回應（可能逾時）"
+            print(log_message)
+            self._log_message(log_message)
+            return response
+        except serial.SerialException as e:
+            raise TransportError(f"接收資料失敗: {e}")
         except Exception as e:
-            raise ConnectionError(f"串口讀取錯誤: {e}")                   
+            raise TransportError(f"串口讀取錯誤: {e}")
+
+    def start_reader(self):
+        """啟動背景接收線程，之後所有接收都改由背景線程切割的訊框提供"""
+        if self.reader:
+            return
+        self.reader = SerialReader(self.ser, self.silence_interval)
+        self.reader.subscribe(self._enqueue_frame)
+        self.reader.start()
+
+    def stop_reader(self):
+        """停止背景接收線程並恢復原本的讀取逾時"""
+        if not self.reader:
+            return
+        self.reader.stop()
+        self.reader = None
+        try:
+            self.ser.timeout = self.timeout
+        except Exception as e:
+            print(f"警告: 恢復串口逾時設定失敗: {e}")
+
+    def subscribe(self, callback):
+        """訂閱背景接收的訊框 (ReceivedFrame)，需先呼叫 start_reader"""
+        if not self.reader:
+            raise ConnectionError("背景接收線程尚未啟動")
+        self.reader.subscribe(callback)
+
+    def unsubscribe(self, callback):
+        """取消訂閱背景接收的訊框"""
+        if self.reader:
+            self.reader.unsubscribe(callback)
+
+    def _enqueue_frame(self, frame):
+        """背景接收線程的訂閱回呼：複製出環形緩衝區後放入佇列，佇列滿時丟棄最舊的訊框
+        
+        環形緩衝區的切片在繞回一圈後就會被覆寫，佇列中可能久未取走的訊框必須先複製。
+        """
+        frame = frame._replace(data=bytes(frame.data))
+        while True:
+            try:
+                self._frame_queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self._frame_queue.get_nowait()
+                    self.rx_dropped += 1
+                except queue.Empty:
+                    pass
+    
+    def _receive_from_reader(self, expected_length=None):
+        """從背景接收線程取得下一個訊框
+        
+        已知回應長度時持續取出訊框直到收滿 (或收滿例外回應長度) 或逾時再合併：
+        USB-RS485 轉接器的傳輸延遲可能讓一個回應中間出現超過 3.5 字元時間的空檔而被切成多段。
+        """
+        deadline = time.perf_counter() + self.timeout
+        try:
+            frame = self._frame_queue.get(timeout=self.timeout)
+        except queue.Empty:
+            if self.reader.error:
+                raise TransportError(f"接收資料失敗: {self.reader.error}")
+            log_message = "[接收] 無回應（可能逾時）"
+            print(log_message)
+            self._log_message(log_message)
+            return b''
+        
+        response = frame.data
+        first_byte_ns = frame.first_byte_ns
+        if expected_length is not None:
+            while len(response) < self._reply_length(response, expected_length):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    frame = self._frame_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                response += frame.data
+        self.last_rx_first_ns = first_byte_ns
+        self.last_rx_last_ns = frame.last_byte_ns
+        self.bus_timer.mark_receive(self._last_slave_id, frame.last_byte_ns / 1e9)
+        log_message = f"[接收] {response.hex(' ').upper()}"
+        print(log_message)
+        self._log_message(log_message)
+        return response
+
+    @staticmethod
+    def _reply_length(response, expected_length):
+        """回應應有的長度：例外回應為固定長度，其他為由請求推算的長度"""
+        if len(response) >= 2 and ModbusPacketAnalyzer.is_exception_response(response[1]):
+            return MODBUS_EXCEPTION_FRAME_SIZE
+        return expected_length
+    
+    def _discard_stale_frames(self):
+        """發送前丟棄佇列中未被取走的訊框，避免混入下一筆回應"""
+        while True:
+            try:
+                frame = self._frame_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._log_message(f"[接收] {frame.data.hex(' ').upper()} (未預期資料，已丟棄)")
+
+    def set_turnaround_delay(self, slave_id, delay):
+        """設定指定裝置回應後到下一筆請求的轉換延遲（秒），作為自動調校的起點"""
+        self.bus_timer.set_turnaround_delay(slave_id, delay)
+        self.tuner.profile(slave_id).turnaround_delay = delay
+
+    def transact(self, hex_str):
+        """發送 Modbus 請求並接收回應，回應長度可由請求推算時不必等待逾時"""
+        return self.exchange(hex_str).response
+    
+    def receive(self, timeout=None):
+        """接收一個訊框 (bytes)，逾時回傳 b''"""
+        return self._with_timeout(timeout, self.receive_frame)
+    
+    def exchange(self, request, timeout=None):
+        """發送請求 (bytes，或使用者輸入的十六進位字串) 並與回應配對，回傳含各階段時間戳的 Transaction
+        
+        timeout 可只對這一筆請求覆寫回應逾時 (秒)，例如掃描從站時的短探測逾時。
+        """
+        request = to_bytes(request)
+        return self._with_timeout(timeout, self._exchange, request)
+    
+    def _with_timeout(self, timeout, func, *args):
+        """以暫時的回應逾時執行 func，結束後還原
+        
+        背景接收線程執行中時串口逾時固定為靜默間隔 (用來判斷訊框結束)，只覆寫等待訊框佇列的逾時。
+        """
+        if timeout is None:
+            return func(*args)
+        if timeout <= 0:
+            raise ValueError("逾時時間必須大於0")
+        original_timeout = self.timeout
+        original_serial_timeout = self.ser.timeout
+        self.timeout = timeout
+        if not self.reader:
+            self.ser.timeout = timeout
+        try:
+            return func(*args)
+        finally:
+            self.timeout = original_timeout
+            if not self.reader:
+                self.ser.timeout = original_serial_timeout
+    
+    def _exchange(self, request):
+        request = self.send(request)
+        if is_broadcast_request(request):
+            return self._broadcast_transaction(request)
+        transaction = self._begin_transaction(request)
+        expected_length = ModbusPacketAnalyzer.expected_response_length(request)
+        if expected_length is None:
+            response = self.receive_frame()
+        else:
+            response = self.receive_exact(expected_length)
+        return self._finish_exchange(transaction, response, expected_length)
+    
+    def _broadcast_transaction(self, request):
+        """廣播略過接收階段，轉換延遲已在發送時排入匯流排時序"""
+        self.last_frame_status = FRAME_BROADCAST
+        return broadcast_transaction(request, self.last_write_start_ns, self.last_write_done_ns,
+                                     int(self.bus_timer.frame_time(len(request)) * 1e9))
+    
+    def _begin_transaction(self, request):
+        """登記剛送出的請求"""
+        return self.correlator.begin(request, self.last_write_start_ns, self.last_write_done_ns,
+                                     int(self.bus_timer.frame_time(len(request)) * 1e9))
+    
+    def _finish_exchange(self, transaction, response, expected_length):
+        """配對回應、調校轉換延遲並記錄訊框錯誤 (接收時間戳需已寫入 last_rx_*)"""
+        if response and not self.correlator.match(response, self.last_rx_first_ns, self.last_rx_last_ns,
+                                                   expected_length):
+            # 回應來自其他從站或功能碼不符
+            self.correlator.cancel(transaction)
+            transaction.response = response
+            transaction.status = FRAME_UNMATCHED
+        elif not response:
+            self.correlator.cancel(transaction)
+        
+        self.last_frame_status = transaction.status
+        # 依結果調校該從站的轉換延遲，下一筆請求發送前即套用
+        profile = self.tuner.observe(transaction)
+        if profile is not None and profile.turnaround_delay != self.bus_timer.get_turnaround_delay(profile.slave_id):
+            self.bus_timer.set_turnaround_delay(profile.slave_id, profile.turnaround_delay)
+        if transaction.status in (FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_UNMATCHED):
+            log_message = f"[檢查] {transaction.status}: {response.hex(' ').upper()}"
+            print(log_message)
+            self._log_message(log_message)
+        return transaction
     
 
 
 
     def close(self):
+        self.stop_reader()
         try:
             if hasattr(self, 'ser') and self.ser:
                 self.ser.close()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+從站位址掃描模組
+
+依序以短逾時探測每個從站位址：探測逾時由波特率算出 (請求與回應的線路時間加上
+裝置處理餘裕)，找到從站後再依實測延遲調整。掃描結束後以完整逾時再確認一次
+有回應的位址，以及逾時後才到達 (被下一筆探測收到) 的回應所屬位址。
+不同連線各自在獨立線程中掃描，互不等待。
+"""
+import threading
+import time
+from collections import namedtuple
+try:
+    from .constants import (SCAN_PROBE_PDU, SCAN_PROBE_MARGIN, SCAN_LATENCY_FACTOR, SCAN_MAX_PROBE_TIMEOUT,
+                            SCAN_CONFIRMED, SCAN_UNCONFIRMED, MODBUS_MAX_SLAVE_ID, FRAME_OK, FRAME_EXCEPTION,
+                            FRAME_UNMATCHED)
+    from .data_utils import ModbusCRC
+except ImportError:
+    from constants import (SCAN_PROBE_PDU, SCAN_PROBE_MARGIN, SCAN_LATENCY_FACTOR, SCAN_MAX_PROBE_TIMEOUT,
+                           SCAN_CONFIRMED, SCAN_UNCONFIRMED, MODBUS_MAX_SLAVE_ID, FRAME_OK, FRAME_EXCEPTION,
+                           FRAME_UNMATCHED)
+    from data_utils import ModbusCRC
+
+
+# 從站存在的回應：正常回應或例外回應 (不支援探測的功能碼/位址也代表有裝置)
+PRESENT = (FRAME_OK, FRAME_EXCEPTION)
+# 探測請求 8 位元組，讀取 1 個暫存器的回應 7 位元組
+PROBE_REQUEST_SIZE = 8
+PROBE_RESPONSE_SIZE = 7
+
+
+class ScanTarget(namedtuple('ScanTarget', ['name', 'exchange', 'timeout', 'probe_timeout', 'mbap'])):
+    """掃描目標：exchange(frame, timeout) 送出請求並回傳 Transaction
+    
+    timeout 為確認時使用的完整逾時，probe_timeout 為探測的起始逾時 (秒)；mbap 為 Modbus TCP 連線。
+    """
+    __slots__ = ()
+
+
+class ScanResult(namedtuple('ScanResult', ['name', 'slave_id', 'status', 'latency_ms', 'response'])):
+    """單一從站的掃描結果"""
+    __slots__ = ()
+    
+    @property
+    def confirmed(self):
+        return self.status == SCAN_CONFIRMED
+
+
+def parse_id_range(text):
+    """解析位址範圍 (十六進位，例如 "01-F7" 或 "01,05,10-20")"""
+    slave_ids = []
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start, end = (int(value, 16) for value in part.split("-", 1))
+            else:
+                start = end = int(part, 16)
+        except ValueError:
+            raise ValueError(f"無效的位址範圍: {part}")
+        if not 1 <= start <= end <= MODBUS_MAX_SLAVE_ID:
+            raise ValueError(f"位址範圍必須在 01-{MODBUS_MAX_SLAVE_ID:02X} 之間: {part}")
+        slave_ids.extend(range(start, end + 1))
+    if not slave_ids:
+        raise ValueError("位址範圍不能為空")
+    return sorted(set(slave_ids))
+
+
+def probe_timeout(bus_timer, margin=SCAN_PROBE_MARGIN):
+    """依匯流排時序計算探測逾時：請求與回應的傳輸時間、兩段訊框間隔再加上處理餘裕"""
+    return (bus_timer.frame_time(PROBE_REQUEST_SIZE + PROBE_RESPONSE_SIZE)
+            + 2 * bus_timer.silence_interval + margin)
+
+
+class SlaveScanner:
+    """掃描一或多個連線上有回應的從站位址"""
+    
+    def __init__(self, probe_pdu=SCAN_PROBE_PDU, latency_factor=SCAN_LATENCY_FACTOR,
+                 max_probe_timeout=SCAN_MAX_PROBE_TIMEOUT):
+        try:
+            self.probe_pdu = bytes.fromhex(probe_pdu.replace(" ", ""))
+        except ValueError as e:
+            raise ValueError(f"無效的探測請求: {e}")
+        if not self.probe_pdu:
+            raise ValueError("探測請求不能為空")
+        self.latency_factor = latency_factor
+        self.max_probe_timeout = max_probe_timeout
+        self._transaction_id = 0
+        self._lock = threading.Lock()
+    
+    def probe_frame(self, slave_id, mbap=False):
+        """組成探測請求：RTU 加上 CRC，Modbus TCP 加上 MBAP 標頭"""
+        adu = bytes((slave_id,)) + self.probe_pdu
+        if not mbap:
+            return adu + ModbusCRC.to_bytes(ModbusCRC.calculate(adu))
+        with self._lock:
+            self._transaction_id = (self._transaction_id + 1) & 0xFFFF
+            transaction_id = self._transaction_id
+        return transaction_id.to_bytes(2, 'big') + b'\x00\x00' + len(adu).to_bytes(2, 'big') + adu
+    
+    def scan_port(self, target, slave_ids):
+        """掃描單一連線，回傳依位址排序的 ScanResult 清單"""
+        timeout = target.probe_timeout
+        max_latency = 0.0
+        found = {}
+        suspects = set()
+        
+        for slave_id in slave_ids:
+            transaction = target.exchange(self.probe_frame(slave_id, target.mbap), timeout)
+            if transaction.status in PRESENT:
+                found[slave_id] = transaction
+                if transaction.latency_ms is not None:
+                    # 依已找到從站的實測延遲放寬 (或維持) 探測逾時
+                    max_latency = max(max_latency, transaction.latency_ms / 1000)
+                    timeout = min(self.max_probe_timeout,
+                                  max(target.probe_timeout, self.latency_factor * max_latency))
+            elif transaction.response:
+                # 訊框損壞或前一筆探測的遲到回應：記下可疑位址稍後確認
+                suspects.add(slave_id)
+                if (not target.mbap and transaction.status == FRAME_UNMATCHED
+                        and transaction.response[0] in slave_ids):
+                    suspects.add(transaction.response[0])
+        
+        results = []
+        for slave_id in sorted(set(found) | suspects):
+            transaction = target.exchange(self.probe_frame(slave_id, target.mbap), target.timeout)
+            if transaction.status in PRESENT:
+                status = SCAN_CONFIRMED
+            elif slave_id in found:
+                status, transaction = SCAN_UNCONFIRMED, found[slave_id]
+            else:
+                continue
+            results.append(ScanResult(target.name, slave_id, status, transaction.latency_ms, transaction.response))
+        return results
+    
+    def scan(self, targets, slave_ids):
+        """同時掃描多個連線，回傳 (依連線與位址排序的結果, {連線名稱: 錯誤訊息}, 耗時毫秒)"""
+        slave_ids = list(slave_ids)
+        results = {}
+        errors = {}
+        
+        def run(target):
+            try:
+                results[target.name] = self.scan_port(target, slave_ids)
+            except (ValueError, ConnectionError) as e:
+                errors[target.name] = str(e)
+        
+        started_ns = time.perf_counter_ns()
+        threads = [threading.Thread(target=run, args=(target,), daemon=True) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed_ms = (time.perf_counter_ns() - started_ns) / 1e6
+        
+        inventory = [row for target in targets for row in results.get(target.name, [])]
+        return inventory, errors, elapsed_ms
+    
+    @staticmethod
+    def format_inventory(inventory):
+        """將掃描結果轉為裝置清單文字"""
+        if not inventory:
+            return "未找到任何從站"
+        lines = [f"{'連線':<16} {'位址':<8} {'狀態':<6} {'延遲':>9}"]
+        for row in inventory:
+            latency = f"{row.latency_ms:.1f}ms" if row.latency_ms is not None else "-"
+            lines.append(f"{row.name:<16} {row.slave_id:02X} ({row.slave_id:<3}) {row.status:<6} {latency:>9}")
+        return "\n".join(lines)
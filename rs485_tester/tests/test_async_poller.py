@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+async_poller.py 單元測試
+"""
+import unittest
+import asyncio
+import threading
+import time
+from test_config import *
+
+try:
+    from ..async_poller import AsyncEndpoint, AsyncPoller, ResultBridge, PollResult, parse_endpoints
+    from ..data_utils import ModbusCRC
+    from ..constants import FRAME_OK, FRAME_NO_RESPONSE
+    from ..transport import TransportError
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from async_poller import AsyncEndpoint, AsyncPoller, ResultBridge, PollResult, parse_endpoints
+    from data_utils import ModbusCRC
+    from constants import FRAME_OK, FRAME_NO_RESPONSE
+    from transport import TransportError
+
+
+def with_crc(data):
+    return data + ModbusCRC.to_bytes(ModbusCRC.calculate(data))
+
+
+def mbap_reply(request):
+    """讀取請求的回應：資料內容為功能碼，方便檢查配對"""
+    pdu = bytes((request[6], request[7], 0x02, 0x00, request[7]))
+    return request[:2] + b'\x00\x00' + len(pdu).to_bytes(2, 'big') + pdu
+
+
+class FakeGateway:
+    """在獨立線程事件迴圈中執行的 Modbus TCP 閘道
+    
+    收齊 batch 筆請求後一起回應 (reverse 時反向)，silent 內的功能碼不回應，
+    delay 秒後才回應時各請求互不等待；close_after 筆請求後關閉連線。
+    """
+    
+    def __init__(self, batch=1, reverse=False, silent=(), delay=0.0, close_after=None, rtu=False):
+        self.batch = batch
+        self.reverse = reverse
+        self.silent = set(silent)
+        self.delay = delay
+        self.close_after = close_after
+        self.rtu = rtu
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, "127.0.0.1", 0), self.loop).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+    
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        waiting = []
+        try:
+            while True:
+                if self.rtu:
+                    request = await reader.read(256)
+                    if not request:
+                        break
+                    writer.write(with_crc(bytes((request[0], request[1], 0x02, 0x00, 0x01))))
+                    continue
+                header = await reader.readexactly(6)
+                request = header + await reader.readexactly((header[4] << 8) | header[5])
+                self.requests += 1
+                if self.close_after is not None and self.requests > self.close_after:
+                    break
+                if request[7] in self.silent:
+                    continue
+                if self.delay:
+                    asyncio.ensure_future(self._reply_later(writer, request))
+                    continue
+                waiting.append(request)
+                if len(waiting) >= self.batch:
+                    for pending in (reversed(waiting) if self.reverse else waiting):
+                        writer.write(mbap_reply(pending))
+                    waiting = []
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+    
+    async def _reply_later(self, writer, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        writer.write(mbap_reply(request))
+    
+    def close(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(1.0)
+
+
+def read_request(slave_id, function_code=0x03):
+    return bytes((slave_id, function_code, 0x00, 0x00, 0x00, 0x01))
+
+
+class TestAsyncEndpoint(unittest.TestCase):
+    """AsyncEndpoint 測試類"""
+    
+    def tearDown(self):
+        self.gateway.close()
+    
+    def _run(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, 5.0))
+    
+    def _endpoint(self, **kwargs):
+        kwargs.setdefault("timeout", 0.2)
+        return AsyncEndpoint("gw", "127.0.0.1", self.gateway.port, **kwargs)
+    
+    def test_pipelined_out_of_order(self):
+        """測試同時送出的請求在回應反向到達時仍依交易 ID 配對"""
+        self.gateway = FakeGateway(batch=3, reverse=True)
+        endpoint = self._endpoint(concurrency=3)
+        
+        async def run():
+            results = await asyncio.gather(*(endpoint.exchange(read_request(n)) for n in (1, 2, 3)))
+            await endpoint.close()
+            return results
+        
+        results = self._run(run())
+        self.assertEqual([t.status for t in results], [FRAME_OK] * 3)
+        self.assertEqual([t.response[6] for t in results], [1, 2, 3])
+        self.assertEqual(self.gateway.connections, 1)
+    
+    def test_concurrency_limit(self):
+        """測試同時等待回應的請求不超過端點上限"""
+        self.gateway = FakeGateway(delay=0.02)
+        endpoint = self._endpoint(concurrency=2)
+        
+        async def run():
+            results = await asyncio.gather(*(endpoint.exchange(read_request(n)) for n in range(1, 7)))
+            await endpoint.close()
+            return results
+        
+        results = self._run(run())
+        self.assertTrue(all(t.status == FRAME_OK for t in results))
+        self.assertEqual(self.gateway.max_in_flight, 2)
+    
+    def test_timeout(self):
+        """測試無回應的請求逾時，不影響同時進行的其他請求"""
+        self.gateway = FakeGateway(silent={0x04})
+        endpoint = self._endpoint()
+        
+        async def run():
+            results = await asyncio.gather(endpoint.exchange(read_request(1, 0x04)), endpoint.exchange(read_request(2)))
+            await endpoint.close()
+            return results
+        
+        silent, answered = self._run(run())
+        self.assertEqual(silent.status, FRAME_NO_RESPONSE)
+        self.assertEqual(answered.status, FRAME_OK)
+        self.assertEqual(endpoint.correlator.pending, {})
+    
+    def test_reconnect_after_close(self):
+        """測試對方關閉連線時等待中的請求失敗，下一筆請求重新連線"""
+        self.gateway = FakeGateway(close_after=1)
+        endpoint = self._endpoint()
+        
+        async def run():
+            first = await endpoint.exchange(read_request(1))
+            with self.assertRaises(TransportError):
+                await endpoint.exchange(read_request(1))
+            self.assertFalse(endpoint.connected)
+            self.gateway.close_after = None
+            second = await endpoint.exchange(read_request(1))
+            await endpoint.close()
+            return first, second
+        
+        first, second = self._run(run())
+        self.assertEqual((first.status, second.status), (FRAME_OK, FRAME_OK))
+        self.assertEqual(self.gateway.connections, 2)
+    
+    def test_rtu_over_tcp(self):
+        """測試 RTU over TCP 依從站位址與功能碼配對並檢查 CRC"""
+        self.gateway = FakeGateway(rtu=True)
+        endpoint = self._endpoint(rtu_over_tcp=True, concurrency=4)
+        self.assertEqual(endpoint.concurrency, 1)
+        
+        async def run():
+            transaction = await endpoint.exchange(with_crc(read_request(5)))
+            await endpoint.close()
+            return transaction
+        
+        transaction = self._run(run())
+        self.assertEqual(transaction.status, FRAME_OK)
+        self.assertEqual(transaction.slave_id, 5)
+
+
+class TestAsyncPoller(unittest.TestCase):
+    """AsyncPoller 測試類"""
+    
+    def setUp(self):
+        self.gateway = FakeGateway()
+        self.poller = AsyncPoller()
+        self.poller.start()
+    
+    def tearDown(self):
+        self.poller.stop()
+        self.gateway.close()
+    
+    def test_submit_from_other_thread(self):
+        """測試由其他線程送出請求並經由結果佇列取回"""
+        self.poller.add_endpoint(AsyncEndpoint("gw", "127.0.0.1", self.gateway.port))
+        result = self.poller.submit("gw", read_request(1)).result(2.0)
+        
+        self.assertTrue(result.success)
+        self.assertEqual(self.poller.results.drain(), [result])
+    
+    def test_poll_many_endpoints_one_thread(self):
+        """測試多個端點的週期輪詢都在同一個事件迴圈線程中完成"""
+        threads_before = threading.active_count()
+        for index in range(20):
+            self.poller.add_endpoint(AsyncEndpoint(f"gw{index}", "127.0.0.1", self.gateway.port))
+            self.poller.poll(f"gw{index}", [read_request(1), read_request(2)], 0.05, start_delay=index * 0.001)
+        time.sleep(0.3)
+        
+        self.assertEqual(threading.active_count(), threads_before)
+        results = self.poller.results.drain()
+        names = {result.name for result in results}
+        self.assertEqual(len(names), 20)
+        self.assertTrue(all(result.success for result in results))
+        self.assertGreaterEqual(len(results), 20 * 2 * 3)
+        
+        self.poller.remove_endpoint("gw0")
+        self.assertNotIn("gw0", self.poller.endpoints)
+    
+    def test_connect_error_reported(self):
+        """測試無法連線的端點以錯誤結果回報"""
+        self.gateway.close()
+        endpoint = AsyncEndpoint("down", "127.0.0.1", self.gateway.port, connect_timeout=0.5)
+        self.poller.add_endpoint(endpoint)
+        result = self.poller.submit("down", read_request(1)).result(2.0)
+        
+        self.assertFalse(result.success)
+        self.assertIsInstance(result.error, TransportError)
+    
+    def test_not_running(self):
+        """測試引擎停止後不接受請求"""
+        self.poller.add_endpoint(AsyncEndpoint("gw", "127.0.0.1", self.gateway.port))
+        self.poller.stop()
+        with self.assertRaises(ConnectionError):
+            self.poller.submit("gw", read_request(1))
+        with self.assertRaises(ValueError):
+            self.poller.add_endpoint(AsyncEndpoint("gw", "127.0.0.1", self.gateway.port))
+
+
+class TestHelpers(unittest.TestCase):
+    """輔助類別與函式測試類"""
+    
+    def test_parse_endpoints(self):
+        """測試解析端點清單與位址範圍"""
+        self.assertEqual(parse_endpoints("10.0.0.1, 10.0.0.2:1502"), [("10.0.0.1", 502), ("10.0.0.2", 1502)])
+        self.assertEqual(len(parse_endpoints("192.168.1.100-199:502")), 100)
+        for text in ("", "10.0.0.1:abc", "10.0.0.1:70000", "10.0.0.5-300", ":502"):
+            with self.assertRaises(ValueError):
+                parse_endpoints(text)
+    
+    def test_result_bridge_drops_oldest(self):
+        """測試結果佇列滿時丟棄最舊的結果"""
+        bridge = ResultBridge(max_items=2)
+        for index in range(3):
+            bridge.put(PollResult(str(index), None, None))
+        self.assertEqual(bridge.dropped, 1)
+        self.assertEqual([result.name for result in bridge.drain(1)], ["1"])
+        self.assertEqual(len(bridge), 1)
+    
+    def test_invalid_endpoint(self):
+        """測試端點參數檢查"""
+        with self.assertRaises(ValueError):
+            AsyncEndpoint("gw", "127.0.0.1", 502, concurrency=0)
+        with self.assertRaises(ValueError):
+            AsyncEndpoint("gw", "127.0.0.1", 502, timeout=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+async_serial.py 單元測試
+"""
+import unittest
+from unittest.mock import patch, mock_open
+import asyncio
+import os
+import time
+import serial
+from test_config import *
+
+try:
+    from ..async_serial import AsyncRS485Tester
+    from ..async_poller import AsyncPoller
+    from ..data_utils import ModbusCRC
+    from ..constants import FRAME_OK, FRAME_NO_RESPONSE, FRAME_EXCEPTION, FRAME_BROADCAST
+    from ..transport import TransportError
+except ImportError:
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from async_serial import AsyncRS485Tester
+    from async_poller import AsyncPoller
+    from data_utils import ModbusCRC
+    from constants import FRAME_OK, FRAME_NO_RESPONSE, FRAME_EXCEPTION, FRAME_BROADCAST
+    from transport import TransportError
+
+
+def with_crc(data):
+    return data + ModbusCRC.to_bytes(ModbusCRC.calculate(data))
+
+
+READ_REQUEST = with_crc(bytes.fromhex("010300000001"))
+READ_RESPONSE = with_crc(bytes.fromhex("0103020001"))
+
+
+class FakeSerial:
+    """以 pipe 模擬的串口：寫入請求後依 replies 將回應分段寫入 pipe，讀取端可登記到事件迴圈
+    
+    selectable 為 False 時 fileno() 不可用 (如 Windows)，AsyncRS485Tester 需改為輪詢 in_waiting。
+    """
+    
+    def __init__(self, selectable=True):
+        self.selectable = selectable
+        self.replies = {}
+        self.written = []
+        self.timeout = None
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+        self.is_open = True
+    
+    def fileno(self):
+        if not self.selectable:
+            raise AttributeError("fileno")
+        return self._read_fd
+    
+    def write(self, data):
+        self.written.append(bytes(data))
+        for chunk in self.replies.get(bytes(data), ()):
+            os.write(self._write_fd, chunk)
+        return len(data)
+    
+    def inject(self, data):
+        os.write(self._write_fd, data)
+    
+    @property
+    def in_waiting(self):
+        # pipe 無法查詢可讀位元組數，回傳一個足夠大的數值，read() 只會讀到實際存在的資料
+        return 4096 if self._readable() else 0
+    
+    def _readable(self):
+        import select
+        return bool(select.select([self._read_fd], [], [], 0)[0])
+    
+    def read(self, size=1):
+        try:
+            return os.read(self._read_fd, size)
+        except BlockingIOError:
+            return b''
+    
+    def close(self):
+        if self.is_open:
+            os.close(self._read_fd)
+            os.close(self._write_fd)
+            self.is_open = False
+
+
+@unittest.skipUnless(hasattr(os, 'set_blocking'), "需要支援非阻塞 pipe 的平台")
+class TestAsyncRS485Tester(unittest.TestCase):
+    """AsyncRS485Tester 測試類"""
+    
+    def _tester(self, selectable=True, **kwargs):
+        self.fake = FakeSerial(selectable)
+        with patch('serial_utils.serial.Serial', return_value=self.fake):
+            return AsyncRS485Tester("COM1", baudrate=115200, **kwargs)
+    
+    def _run(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, 5.0))
+    
+    def test_validation_inherited(self):
+        """測試沿用 RS485Tester 的參數檢查"""
+        with self.assertRaises(ValueError):
+            AsyncRS485Tester("COM1", baudrate=1234)
+        with self.assertRaises(ValueError):
+            AsyncRS485Tester("COM1", timeout=0)
+        with self.assertRaises(ValueError):
+            AsyncRS485Tester("")
+    
+    def test_transact_with_add_reader(self):
+        """測試以 add_reader 接收分段到達的回應並配對"""
+        tester = self._tester(timeout=0.5)
+        self.fake.replies[READ_REQUEST] = [READ_RESPONSE[:3], READ_RESPONSE[3:]]
+        
+        async def run():
+            transaction = await tester.exchange(READ_REQUEST)
+            self.assertIsNotNone(tester._fd)
+            await tester.close()
+            return transaction
+        
+        transaction = self._run(run())
+        self.assertEqual(transaction.status, FRAME_OK)
+        self.assertEqual(transaction.response, READ_RESPONSE)
+        self.assertIsNotNone(transaction.latency_ms)
+        self.assertEqual(self.fake.timeout, 0)
+    
+    def test_polling_fallback(self):
+        """測試串口無法登記到事件迴圈時改為輪詢"""
+        tester = self._tester(selectable=False, timeout=0.5)
+        self.fake.replies[READ_REQUEST] = [READ_RESPONSE]
+        
+        async def run():
+            response = await tester.transact(READ_REQUEST)
+            self.assertIsNone(tester._fd)
+            await tester.close()
+            return response
+        
+        self.assertEqual(self._run(run()), READ_RESPONSE)
+    
+    def test_timeout_and_exception(self):
+        """測試無回應逾時與例外回應提前結束"""
+        tester = self._tester(timeout=0.05)
+        exception = with_crc(bytes.fromhex("018302"))
+        self.fake.replies[READ_REQUEST] = [exception]
+        
+        async def run():
+            answered = await tester.exchange(READ_REQUEST, timeout=0.5)
+            silent = await tester.exchange(with_crc(bytes.fromhex("020300000001")))
+            await tester.close()
+            return answered, silent
+        
+        started = time.perf_counter()
+        answered, silent = self._run(run())
+        self.assertEqual(answered.status, FRAME_EXCEPTION)
+        self.assertEqual(silent.status, FRAME_NO_RESPONSE)
+        self.assertLess(time.perf_counter() - started, 0.4)
+    
+    def test_stale_bytes_discarded(self):
+        """測試發送前丟棄未預期的資料"""
+        tester = self._tester(timeout=0.5)
+        self.fake.replies[READ_REQUEST] = [READ_RESPONSE]
+        
+        async def run():
+            await tester.receive(timeout=0.01)
+            self.fake.inject(b'\xAA\xBB')
+            await asyncio.sleep(0.01)
+            transaction = await tester.exchange(READ_REQUEST)
+            await tester.close()
+            return transaction
+        
+        self.assertEqual(self._run(run()).response, READ_RESPONSE)
+    
+    def test_broadcast_skips_receive(self):
+        """測試廣播不等待回應"""
+        tester = self._tester(timeout=1.0)
+        
+        async def run():
+            transaction = await tester.exchange(with_crc(bytes.fromhex("000600010001")))
+            await tester.close()
+            return transaction
+        
+        started = time.perf_counter()
+        self.assertEqual(self._run(run()).status, FRAME_BROADCAST)
+        self.assertLess(time.perf_counter() - started, 0.5)
+    
+    def test_read_error_removes_reader(self):
+        """測試讀取錯誤時取消事件迴圈登記，不會反覆呼叫失效的串口"""
+        tester = self._tester(timeout=0.5)
+        self.fake.replies[READ_REQUEST] = [READ_RESPONSE]
+        calls = []
+        
+        def broken_read(size=1):
+            calls.append(size)
+            raise serial.SerialException("device removed")
+        
+        async def run():
+            read = self.fake.read
+            await tester.receive(timeout=0.01)
+            fd = tester._fd
+            self.fake.read = broken_read
+            self.fake.inject(b'\x01')
+            await asyncio.sleep(0.05)
+            registered = asyncio.get_running_loop().remove_reader(fd)
+            with self.assertRaises(TransportError):
+                await tester.exchange(READ_REQUEST)
+            self.fake.read = read
+            read(16)  # 串口恢復，丟棄錯誤前到達的資料
+            transaction = await tester.exchange(READ_REQUEST)
+            await tester.close()
+            return registered, transaction
+        
+        registered, transaction = self._run(run())
+        self.assertFalse(registered)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(transaction.status, FRAME_OK)
+    
+    @patch('builtins.open', new_callable=mock_open)
+    def test_logging_kept(self, mock_file):
+        """測試沿用 RS485Tester 的日誌格式"""
+        tester = self._tester(timeout=0.5, log_file="test.log")
+        self.fake.replies[READ_REQUEST] = [READ_RESPONSE]
+        
+        async def run():
+            await tester.exchange(READ_REQUEST)
+            await tester.close()
+        
+        self._run(run())
+        written = "".join(args[0] for args, _ in mock_file().write.call_args_list)
+        self.assertIn("[送出] 01 03 00 00 00 01 84 0A", written)
+        self.assertIn("[接收] 01 03 02 00 01", written)
+        self.assertIn("Session Ended", written)
+    
+    def test_shares_poller_with_tcp(self):
+        """測試串口可加入 AsyncPoller 與 TCP 端點共用事件迴圈"""
+        tester = self._tester(timeout=0.5, name="rs485")
+        self.fake.replies[READ_REQUEST] = [READ_RESPONSE]
+        poller = AsyncPoller()
+        poller.start()
+        try:
+            poller.add_endpoint(tester)
+            result = poller.submit("rs485", READ_REQUEST).result(2.0)
+        finally:
+            poller.stop()
+        self.assertTrue(result.success)
+        self.assertFalse(self.fake.is_open)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+broadcast.py 單元測試
+"""
+import unittest
+import threading
+import time
+from unittest.mock import Mock
+from test_config import *
+
+try:
+    from ..broadcast import BroadcastExecutor, decode_reply
+    from ..connection_manager import ConnectionManager
+    from ..transaction import Transaction
+    from ..data_utils import ModbusCRC
+    from ..constants import FRAME_OK, BROADCAST_FAILED, BROADCAST_EXPIRED
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from broadcast import BroadcastExecutor, decode_reply
+    from connection_manager import ConnectionManager
+    from transaction import Transaction
+    from data_utils import ModbusCRC
+    from constants import FRAME_OK, BROADCAST_FAILED, BROADCAST_EXPIRED
+
+
+def with_crc(hex_str):
+    data = bytes.fromhex(hex_str)
+    return data + ModbusCRC.to_bytes(ModbusCRC.calculate(data))
+
+
+def ok_transaction(command, response):
+    start_ns = time.perf_counter_ns()
+    transaction = Transaction(bytes.fromhex(command), None, start_ns, start_ns)
+    transaction.response = response
+    transaction.status = FRAME_OK
+    transaction.first_byte_ns = transaction.last_byte_ns = start_ns + 5_000_000
+    return transaction
+
+
+class TestBroadcastExecutor(unittest.TestCase):
+    """BroadcastExecutor 測試類"""
+    
+    def setUp(self):
+        self.manager = ConnectionManager()
+        self.addCleanup(lambda: [self.manager.remove_connection(name)
+                                 for name in list(self.manager.get_all_connections())])
+        self.delays = {}
+        self.failing = set()
+    
+    def _add(self, name, conn_type="TCP", delay=0.0):
+        self.manager.add_connection(name, Mock(), conn_type, name)
+        self.delays[name] = delay
+    
+    def _execute_for(self, name):
+        def execute(command):
+            time.sleep(self.delays[name])
+            if name in self.failing:
+                raise ConnectionError("連線中斷")
+            return ok_transaction(command, with_crc("010302002A"))
+        return execute
+    
+    def test_parallel_across_connections(self):
+        """測試不同連線同時執行，總耗時約等於最慢的連線"""
+        for i in range(8):
+            self._add(f"gw{i}", delay=0.1)
+        executor = BroadcastExecutor(self.manager, self._execute_for)
+        
+        started = time.perf_counter()
+        rows = executor.broadcast("010300000001").wait(2)
+        elapsed = time.perf_counter() - started
+        
+        self.assertEqual([row.name for row in rows], [f"gw{i}" for i in range(8)])
+        self.assertTrue(all(row.success for row in rows))
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(rows[0].decoded.registers.tolist(), [42])
+        self.assertEqual(self.manager.get_statistics("gw0").total_received, 1)
+    
+    def test_deadline_and_failures(self):
+        """測試逾時的連線標示為超過期限，錯誤的連線標示為發送失敗"""
+        self._add("fast")
+        self._add("slow", delay=0.5)
+        self._add("broken")
+        self.failing.add("broken")
+        completed = threading.Event()
+        executor = BroadcastExecutor(self.manager, self._execute_for)
+        
+        broadcast = executor.broadcast("010300000001", deadline=0.2, on_complete=lambda b: completed.set())
+        self.assertTrue(completed.wait(1))
+        statuses = {row.name: row.status for row in broadcast.rows()}
+        self.assertEqual(statuses, {"fast": FRAME_OK, "slow": BROADCAST_EXPIRED, "broken": BROADCAST_FAILED})
+        self.assertEqual(broadcast.summary()["success"], 1)
+        self.assertLess(broadcast.elapsed_ms, 450)
+    
+    def test_sniffer_excluded_and_empty(self):
+        """測試監聽模式不參與廣播，沒有連線時立即完成"""
+        self._add("sniffer", conn_type="Sniffer")
+        executor = BroadcastExecutor(self.manager, self._execute_for)
+        broadcast = executor.broadcast("010300000001")
+        self.assertTrue(broadcast.done)
+        self.assertEqual(broadcast.rows(), [])
+        with self.assertRaises(ValueError):
+            executor.broadcast("01", deadline=0)
+    
+    def test_decode_reply(self):
+        """測試 RTU 與 Modbus TCP 回應解碼"""
+        self.assertEqual(decode_reply(with_crc("010302002A")).registers.tolist(), [42])
+        self.assertEqual(decode_reply(bytes.fromhex("000100000005010302002A")).registers.tolist(), [42])
+        self.assertIsNone(decode_reply(b'\x01\x03'))
+        self.assertIsNone(decode_reply(b''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+bus_sniffer.py 單元測試
+"""
+import unittest
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+from test_config import *
+from test_serial_reader import FakeSerial
+
+try:
+    from ..bus_sniffer import BusSniffer, DIRECTION_REQUEST, DIRECTION_RESPONSE, DIRECTION_UNKNOWN
+except ImportError:
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from bus_sniffer import BusSniffer, DIRECTION_REQUEST, DIRECTION_RESPONSE, DIRECTION_UNKNOWN
+
+
+REQUEST = bytes.fromhex("010300000001840A")
+RESPONSE = bytes.fromhex("01030200017984")
+EXCEPTION = bytes.fromhex("018302C0F1")
+
+
+class TestBusSniffer(unittest.TestCase):
+    """BusSniffer 測試類"""
+    
+    def _run_sniffer(self, chunks, expected_frames, log_file=None):
+        """以模擬串口執行監聽直到收到指定數量的訊框"""
+        fake = FakeSerial(chunks)
+        frames = []
+        done = threading.Event()
+        
+        def on_frame(frame):
+            frames.append(frame)
+            if len(frames) == expected_frames:
+                done.set()
+        
+        with patch('bus_sniffer.serial.Serial', return_value=fake):
+            sniffer = BusSniffer("COM1", log_file=log_file, on_frame=on_frame)
+        sniffer.start()
+        self.assertTrue(done.wait(2))
+        sniffer.close()
+        return sniffer, fake, frames
+    
+    def test_captures_request_and_response(self):
+        """測試擷取並分類主站請求與從站回應"""
+        sniffer, fake, frames = self._run_sniffer([REQUEST, b'', RESPONSE, b''], 2)
+        
+        self.assertEqual([f.data for f in frames], [REQUEST, RESPONSE])
+        self.assertEqual([f.direction for f in frames], [DIRECTION_REQUEST, DIRECTION_RESPONSE])
+        self.assertTrue(all(f.crc_ok for f in frames))
+        self.assertLess(frames[0].last_byte_ns, frames[1].first_byte_ns)
+        self.assertEqual(sniffer.frame_count, 2)
+        self.assertEqual(sniffer.byte_count, len(REQUEST) + len(RESPONSE))
+        # 監聽模式不得發送
+        self.assertEqual(fake.written, [])
+    
+    def test_exception_response_and_crc_error(self):
+        """測試例外回應與 CRC 錯誤的訊框"""
+        corrupted = RESPONSE[:-1] + b'\x00'
+        sniffer, fake, frames = self._run_sniffer([REQUEST, b'', EXCEPTION, b'', corrupted, b''], 3)
+        
+        self.assertEqual(frames[1].direction, DIRECTION_RESPONSE)
+        self.assertFalse(frames[2].crc_ok)
+        self.assertEqual(frames[2].direction, DIRECTION_UNKNOWN)
+        self.assertEqual(sniffer.crc_errors, 1)
+        self.assertIn("CRC 錯誤", BusSniffer.format_frame(frames[2]))
+    
+    def test_splits_glued_frames(self):
+        """測試靜默時間未能分開的相連訊框由 CRC 切割"""
+        sniffer, fake, frames = self._run_sniffer([REQUEST + RESPONSE, b''], 2)
+        
+        self.assertEqual([f.data for f in frames], [REQUEST, RESPONSE])
+        self.assertEqual([f.direction for f in frames], [DIRECTION_REQUEST, DIRECTION_RESPONSE])
+    
+    def test_idle_flush_recovers_frames_behind_fake_header(self):
+        """測試閒置時清出雜訊後，其後的有效訊框仍被切出"""
+        garbage = bytes.fromhex("01100000000AF6")
+        sniffer, fake, frames = self._run_sniffer([garbage + REQUEST + RESPONSE, b''], 3)
+        
+        self.assertEqual([f.data for f in frames], [garbage, REQUEST, RESPONSE])
+        self.assertEqual([f.crc_ok for f in frames], [False, True, True])
+    
+    def test_writes_log_file(self):
+        """測試監聽日誌格式可供匯出"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_file = os.path.join(tmp_dir, "sniff.log")
+            self._run_sniffer([REQUEST, b''], 1, log_file=log_file)
+            
+            with open(log_file, encoding='utf-8') as f:
+                content = f.read()
+        
+        self.assertIn("[接收] 01 03 00 00 00 01 84 0A (主站請求)", content)
+        self.assertIn("Sniffer Session Ended", content)
+    
+    def test_invalid_parameters(self):
+        """測試無效參數"""
+        with self.assertRaises(ValueError):
+            BusSniffer("")
+        with self.assertRaises(ValueError):
+            BusSniffer("COM1", baudrate=1200)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+bus_timing.py 單元測試
+"""
+import unittest
+import time
+from test_config import *
+
+try:
+    from ..bus_timing import BusTimer, precise_sleep, sleep_until
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from bus_timing import BusTimer, precise_sleep, sleep_until
+
+
+class TestPreciseSleep(unittest.TestCase):
+    """精確等待測試類"""
+    
+    def test_precise_sleep_accuracy(self):
+        """測試精確等待的誤差在次毫秒內"""
+        for duration in (0.0005, 0.003):
+            start = time.perf_counter()
+            precise_sleep(duration)
+            elapsed = time.perf_counter() - start
+            self.assertGreaterEqual(elapsed, duration)
+            self.assertLess(elapsed - duration, 0.001)
+    
+    def test_sleep_until_past_deadline(self):
+        """測試已過期的時間點立即返回"""
+        start = time.perf_counter()
+        sleep_until(start - 1.0)
+        self.assertLess(time.perf_counter() - start, 0.001)
+    
+    def test_precise_sleep_zero(self):
+        """測試零等待"""
+        start = time.perf_counter()
+        precise_sleep(0)
+        self.assertLess(time.perf_counter() - start, 0.001)
+
+
+class TestBusTimer(unittest.TestCase):
+    """BusTimer 測試類"""
+    
+    def setUp(self):
+        self.timer = BusTimer(9600)
+    
+    def test_frame_time(self):
+        """測試訊框傳輸時間計算"""
+        self.assertAlmostEqual(self.timer.frame_time(8), 8 * 10 / 9600)
+        
+        timer_115200 = BusTimer(115200)
+        self.assertAlmostEqual(timer_115200.frame_time(8), 8 * 10 / 115200)
+    
+    def test_mark_transmit(self):
+        """測試發送後的匯流排空閒時間"""
+        free_at = self.timer.mark_transmit(8, start_time=100.0)
+        self.assertAlmostEqual(free_at, 100.0 + (8 + 3.5) * 10 / 9600)
+    
+    def test_mark_broadcast_waits_broadcast_delay(self):
+        """測試廣播後等待廣播轉換延遲，不等待回應"""
+        timer = BusTimer(9600, broadcast_delay=0.1)
+        free_at = timer.mark_broadcast(8, start_time=100.0)
+        self.assertAlmostEqual(free_at, 100.0 + 8 * 10 / 9600 + 0.1)
+        with self.assertRaises(ValueError):
+            BusTimer(9600, broadcast_delay=-0.1)
+    
+    def test_mark_receive_uses_turnaround_delay(self):
+        """測試接收後套用裝置轉換延遲"""
+        self.timer.set_turnaround_delay(0x05, 0.02)
+        
+        self.assertAlmostEqual(self.timer.mark_receive(0x05, end_time=100.0), 100.02)
+        # 未設定的裝置只需 3.5 字元間隔
+        self.assertAlmostEqual(self.timer.mark_receive(0x01, end_time=200.0), 200.0 + 3.5 * 10 / 9600)
+    
+    def test_default_turnaround_delay(self):
+        """測試預設轉換延遲"""
+        timer = BusTimer(115200, turnaround_delay=0.01)
+        self.assertEqual(timer.get_turnaround_delay(0x01), 0.01)
+        self.assertAlmostEqual(timer.mark_receive(0x01, end_time=10.0), 10.01)
+    
+    def test_invalid_turnaround_delay(self):
+        """測試無效的轉換延遲"""
+        with self.assertRaises(ValueError):
+            BusTimer(9600, turnaround_delay=-1)
+        with self.assertRaises(ValueError):
+            self.timer.set_turnaround_delay(0x01, -0.1)
+    
+    def test_wait_bus_free(self):
+        """測試等待匯流排空閒"""
+        self.timer.bus_free_at = time.perf_counter() + 0.002
+        self.timer.wait_bus_free()
+        self.assertGreaterEqual(time.perf_counter(), self.timer.bus_free_at)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -6,15 +6,25 @@ import unittest
 from unittest.mock import Mock, patch, MagicMock
 import socket
 import datetime
+import threading
+import time
 from test_config import *
 
 try:
     from ..connection_manager import ConnectionStats, TCPConnection, ConnectionManager
+    from ..constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+    from ..constants import FRAME_BROADCAST
+    from ..transaction import Transaction
+    from ..transport import TransportError
 except ImportError:
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
     from connection_manager import ConnectionStats, TCPConnection, ConnectionManager
+    from constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+    from constants import FRAME_BROADCAST
+    from transaction import Transaction
+    from transport import TransportError
 
 
 class TestConnectionStats(unittest.TestCase):
@@ -54,6 +64,47 @@ class TestConnectionStats(unittest.TestCase):
         self.assertEqual(len(self.stats.response_times), 0)
         self.assertIsNotNone(self.stats.last_activity)
     
+    def test_add_exchange_uses_measured_times(self):
+        """測試以實際量測的交易時間更新統計"""
+        transaction = Transaction(b'\x01\x03', (1, 3), 0, 1_000_000)
+        transaction.first_byte_ns = 5_000_000
+        transaction.last_byte_ns = 9_000_000
+        transaction.status = FRAME_OK
+        
+        self.stats.add_exchange(transaction)
+        
+        self.assertEqual(self.stats.total_received, 1)
+        self.assertEqual(list(self.stats.response_times), [9.0])
+        self.assertEqual(self.stats.get_avg_turnaround_time(), 4.0)
+    
+    def test_latency_percentiles_per_device(self):
+        """測試依連線與從站分別統計延遲分布"""
+        for slave_id, latency_ns in ((1, 10_000_000), (1, 12_000_000), (2, 80_000_000)):
+            transaction = Transaction(bytes([slave_id, 3]), (slave_id, 3), 0, 0)
+            transaction.first_byte_ns = transaction.last_byte_ns = latency_ns
+            transaction.status = FRAME_OK
+            self.stats.add_exchange(transaction)
+        
+        self.assertEqual(self.stats.get_latency_summary()["count"], 3)
+        self.assertAlmostEqual(self.stats.get_latency_summary()["max"], 80.0)
+        self.assertAlmostEqual(self.stats.get_latency_summary(slave_id=1)["max"], 12.0)
+        self.assertEqual(self.stats.get_latency_summary("1 分鐘", slave_id=2)["count"], 1)
+        self.assertEqual(self.stats.get_latency_summary(slave_id=9)["count"], 0)
+    
+    def test_frame_status_counters(self):
+        """測試 CRC 錯誤、不完整訊框與例外回應分開計數"""
+        self.stats.add_transaction(True, 10.0, FRAME_OK)
+        self.stats.add_transaction(False, None, FRAME_CRC_ERROR)
+        self.stats.add_transaction(False, None, FRAME_CRC_ERROR)
+        self.stats.add_transaction(False, None, FRAME_TRUNCATED)
+        self.stats.add_transaction(False, None, FRAME_EXCEPTION)
+        self.stats.add_transaction(False, None, FRAME_NO_RESPONSE)
+        
+        self.assertEqual(self.stats.crc_errors, 2)
+        self.assertEqual(self.stats.truncated_frames, 1)
+        self.assertEqual(self.stats.exception_responses, 1)
+        self.assertEqual(self.stats.errors, 5)
+    
     def test_success_rate_calculation(self):
         """測試成功率計算"""
         # 空狀態
@@ -70,6 +121,18 @@ class TestConnectionStats(unittest.TestCase):
         expected_rate = (5 / 8) * 100  # 5成功/8總數
         self.assertEqual(self.stats.get_success_rate(), expected_rate)
     
+    def test_broadcast_not_counted_as_error(self):
+        """測試廣播只計入發送數，不影響錯誤數與成功率"""
+        self.stats.add_transaction(True, 10.0)
+        transaction = Transaction(bytes.fromhex("000600010001"), None, 0, 0)
+        transaction.status = FRAME_BROADCAST
+        self.stats.add_exchange(transaction)
+        
+        self.assertEqual(self.stats.total_sent, 2)
+        self.assertEqual(self.stats.broadcasts, 1)
+        self.assertEqual(self.stats.errors, 0)
+        self.assertEqual(self.stats.get_success_rate(), 100.0)
+    
     def test_avg_response_time_calculation(self):
         """測試平均回應時間計算"""
         # 空狀態
@@ -204,6 +267,102 @@ class TestTCPConnection(unittest.TestCase):
         
         self.assertEqual(result, "回應逾時")
     
+    @patch('socket.socket')
+    def test_receive_returns_bytes(self, mock_socket_class):
+        """測試位元組介面：接收回傳 bytes，逾時回傳 b''，Socket 錯誤為 TransportError"""
+        mock_socket = Mock()
+        mock_socket.recv.side_effect = [b'\x01\x03\x02\x00\x01', socket.timeout(), socket.error("reset")]
+        mock_socket.gettimeout.return_value = 5.0
+        mock_socket_class.return_value = mock_socket
+        
+        self.tcp_conn.connect()
+        self.assertEqual(self.tcp_conn.send(bytearray(b'\x01\x03')), b'\x01\x03')
+        self.assertEqual(self.tcp_conn.receive(), b'\x01\x03\x02\x00\x01')
+        self.assertEqual(self.tcp_conn.receive(timeout=0.1), b'')
+        with self.assertRaises(TransportError):
+            self.tcp_conn.receive()
+        self.assertFalse(self.tcp_conn.connected)
+    
+    @patch('socket.socket')
+    def test_rtu_over_tcp_checks_crc(self, mock_socket_class):
+        """測試 RTU over TCP 模式檢查每個回應的 CRC"""
+        mock_socket = Mock()
+        mock_socket.recv.side_effect = [b'\x01\x03\x02\x00\x01\x79\x84',
+                                        b'\x01\x03\x02\x00\x01\x79\x85',
+                                        b'\x01\x03\x02']
+        mock_socket.gettimeout.return_value = 5.0
+        mock_socket_class.return_value = mock_socket
+        
+        tcp_conn = TCPConnection("127.0.0.1", 502, rtu_over_tcp=True)
+        tcp_conn.connect()
+        request = bytes.fromhex("010300000001840A")
+        
+        statuses = []
+        for _ in range(3):
+            tcp_conn.send_data(request)
+            tcp_conn.receive_data()
+            statuses.append(tcp_conn.last_frame_status)
+        
+        self.assertEqual(statuses, [FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED])
+    
+    @patch('socket.socket')
+    def test_exchange_mbap_by_transaction_id(self, mock_socket_class):
+        """測試 MBAP 請求依交易 ID 配對並記錄時間"""
+        mock_socket = Mock()
+        mock_socket.recv.return_value = bytes.fromhex("00070000000501030200FF")
+        mock_socket.gettimeout.return_value = 5.0
+        mock_socket_class.return_value = mock_socket
+        
+        self.tcp_conn.connect()
+        transaction = self.tcp_conn.exchange(bytes.fromhex("000700000006010300000001"))
+        
+        self.assertEqual(transaction.key, 7)
+        self.assertEqual(transaction.status, FRAME_OK)
+        self.assertIsNotNone(transaction.latency_ms)
+    
+    @patch('socket.socket')
+    def test_exchange_timeout(self, mock_socket_class):
+        """測試交易逾時"""
+        mock_socket = Mock()
+        mock_socket.recv.side_effect = socket.timeout()
+        mock_socket.gettimeout.return_value = 5.0
+        mock_socket_class.return_value = mock_socket
+        
+        tcp_conn = TCPConnection("127.0.0.1", 502, rtu_over_tcp=True)
+        tcp_conn.connect()
+        transaction = tcp_conn.exchange(bytes.fromhex("010300000001840A"))
+        
+        self.assertEqual(transaction.status, FRAME_NO_RESPONSE)
+        self.assertEqual(tcp_conn.correlator.pending, {})
+        self.assertEqual(tcp_conn.last_frame_status, FRAME_NO_RESPONSE)
+    
+    @patch('socket.socket')
+    def test_exchange_broadcast_skips_receive(self, mock_socket_class):
+        """測試 RTU over TCP 廣播不等待回應"""
+        mock_socket = Mock()
+        mock_socket_class.return_value = mock_socket
+        
+        tcp_conn = TCPConnection("127.0.0.1", 502, rtu_over_tcp=True)
+        tcp_conn.connect()
+        transaction = tcp_conn.exchange(bytes.fromhex("000600010001181B"))
+        
+        mock_socket.recv.assert_not_called()
+        self.assertEqual(transaction.status, FRAME_BROADCAST)
+        self.assertEqual(tcp_conn.correlator.pending, {})
+    
+    @patch('socket.socket')
+    def test_plain_tcp_skips_crc(self, mock_socket_class):
+        """測試一般 Modbus TCP 不檢查 CRC"""
+        mock_socket = Mock()
+        mock_socket.recv.return_value = b'\x01\x03\x02\x00\x01'
+        mock_socket.gettimeout.return_value = 5.0
+        mock_socket_class.return_value = mock_socket
+        
+        self.tcp_conn.connect()
+        self.tcp_conn.receive_data()
+        
+        self.assertIsNone(self.tcp_conn.last_frame_status)
+    
     def test_receive_data_without_connection(self):
         """測試未連線時接收資料"""
         with self.assertRaises(ConnectionError) as context:
@@ -229,6 +388,139 @@ class TestTCPConnection(unittest.TestCase):
         mock_socket.close.assert_called_once()
 
 
+class FakeModbusSocket:
+    """模擬 Modbus TCP 伺服器：收齊 batch 筆請求後依 order 回應，chunks 控制每次 recv_into 可讀的位元組數"""
+    
+    def __init__(self, batch=1, order=None, chunks=None, silent=()):
+        self.batch = batch
+        self.order = order
+        self.chunks = list(chunks or [])
+        self.silent = set(silent)
+        self.requests = []
+        self.stream = bytearray()
+        self.max_in_flight = 0
+        self.answered = 0
+        self.timeout = None
+    
+    def send(self, data):
+        self.requests.append(bytes(data))
+        self.max_in_flight = max(self.max_in_flight, len(self.requests) - self.answered)
+        waiting = self.requests[self.answered:]
+        if len(waiting) >= self.batch:
+            order = self.order or range(len(waiting))
+            for index in order:
+                request = waiting[index]
+                if request[7] in self.silent:
+                    continue
+                pdu = bytes((request[6], request[7], 0x02, 0x00, request[7]))
+                self.stream += request[:2] + b'\x00\x00' + len(pdu).to_bytes(2, 'big') + pdu
+            self.answered = len(self.requests)
+        return len(data)
+    
+    def recv_into(self, view):
+        if not self.stream:
+            raise socket.timeout()
+        size = min(len(view), len(self.stream), self.chunks.pop(0) if self.chunks else len(self.stream))
+        view[:size] = self.stream[:size]
+        del self.stream[:size]
+        return size
+    
+    def settimeout(self, timeout):
+        self.timeout = timeout
+    
+    def gettimeout(self):
+        return self.timeout
+    
+    def connect(self, address):
+        pass
+    
+    def setsockopt(self, level, option, value):
+        pass
+    
+    def close(self):
+        pass
+
+
+class TestModbusTCP(unittest.TestCase):
+    """Modbus TCP (MBAP) 模式測試類"""
+    
+    def _connect(self, fake, **kwargs):
+        with patch('socket.socket', return_value=fake):
+            tcp_conn = TCPConnection("127.0.0.1", 502, mbap=True, timeout=0.05, **kwargs)
+            tcp_conn.connect()
+        return tcp_conn
+    
+    def test_invalid_options(self):
+        """測試模式與管線深度檢查"""
+        with self.assertRaises(ValueError):
+            TCPConnection("127.0.0.1", 502, rtu_over_tcp=True, mbap=True)
+        with self.assertRaises(ValueError):
+            TCPConnection("127.0.0.1", 502, mbap=True, window=0)
+    
+    def test_frame_request_strips_crc(self):
+        """測試 RTU 請求轉為 MBAP 訊框並配發遞增交易 ID"""
+        tcp_conn = TCPConnection("127.0.0.1", 502, mbap=True)
+        first = tcp_conn.frame_request(bytes.fromhex("010300000001840A"))
+        second = tcp_conn.frame_request(bytes.fromhex("010300000001"))
+        self.assertEqual(first.hex().upper(), "000100000006010300000001")
+        self.assertEqual(second[:2], b'\x00\x02')
+        mbap = bytes.fromhex("000700000006010300000001")
+        self.assertEqual(tcp_conn.frame_request(mbap), mbap)
+    
+    def test_split_and_merged_segments(self):
+        """測試回應分段到達或與下一個回應黏在一起時依長度欄位切割"""
+        fake = FakeModbusSocket(batch=2, chunks=[3, 4, 10, 50])
+        tcp_conn = self._connect(fake)
+        results = tcp_conn.exchange_many([bytes.fromhex("0103000000%02X" % n) for n in (1, 2)])
+        
+        self.assertEqual([t.status for t in results], [FRAME_OK, FRAME_OK])
+        self.assertEqual([t.response[-1] for t in results], [0x03, 0x03])
+        self.assertEqual([t.response[:2] for t in results], [t.request[:2] for t in results])
+    
+    def test_pipeline_out_of_order(self):
+        """測試管線化請求的回應不依順序到達仍依交易 ID 配對，且同時等待的請求不超過管線深度"""
+        fake = FakeModbusSocket(batch=3, order=[2, 0, 1])
+        tcp_conn = self._connect(fake, window=3)
+        requests = [bytes((slave_id, 0x03, 0x00, 0x00, 0x00, 0x01)) for slave_id in range(1, 7)]
+        results = tcp_conn.exchange_many(requests)
+        
+        self.assertEqual(fake.max_in_flight, 3)
+        self.assertEqual([t.slave_id for t in results], list(range(1, 7)))
+        self.assertTrue(all(t.status == FRAME_OK and t.response[6] == t.slave_id for t in results))
+        self.assertEqual(tcp_conn.correlator.pending, {})
+    
+    def test_pipeline_timeout(self):
+        """測試無回應的請求逾時而其他請求正常完成"""
+        fake = FakeModbusSocket(batch=2, silent={0x04})
+        tcp_conn = self._connect(fake)
+        results = tcp_conn.exchange_many([bytes.fromhex("010400000001"), bytes.fromhex("010300000001")])
+        
+        self.assertEqual([t.status for t in results], [FRAME_NO_RESPONSE, FRAME_OK])
+        self.assertEqual(tcp_conn.correlator.pending, {})
+        self.assertEqual(tcp_conn.last_frame_status, FRAME_OK)
+    
+    def test_exchange_and_receive(self):
+        """測試單筆交易與讀取完整 MBAP 訊框"""
+        fake = FakeModbusSocket(chunks=[1, 1, 1, 1, 1, 1, 2, 3])
+        tcp_conn = self._connect(fake)
+        transaction = tcp_conn.exchange(bytes.fromhex("110300000001"))
+        self.assertEqual(transaction.status, FRAME_OK)
+        self.assertEqual(transaction.response[6], 0x11)
+        
+        tcp_conn.send(tcp_conn.frame_request(bytes.fromhex("110300000001")))
+        self.assertEqual(len(tcp_conn.receive()), 11)
+        self.assertEqual(tcp_conn.receive(), b'')
+    
+    def test_invalid_header_drops_connection(self):
+        """測試協定 ID 錯誤時視為資料流失去同步"""
+        fake = FakeModbusSocket()
+        tcp_conn = self._connect(fake)
+        fake.stream += bytes.fromhex("00010001000501030200FF")
+        with self.assertRaises(TransportError):
+            tcp_conn.receive()
+        self.assertFalse(tcp_conn.connected)
+
+
 class TestConnectionManager(unittest.TestCase):
     """ConnectionManager 測試類"""
     
@@ -266,6 +558,14 @@ class TestConnectionManager(unittest.TestCase):
         
         self.assertIn("已存在", str(context.exception))
     
+    def test_add_connection_types(self):
+        """測試連線類型驗證"""
+        self.manager.add_connection("sniffer", Mock(), "Sniffer", "COM1 (115200, 監聽)")
+        self.assertEqual(self.manager.get_connection("sniffer")['type'], "Sniffer")
+        
+        with self.assertRaises(ValueError):
+            self.manager.add_connection("udp", Mock(), "UDP", "127.0.0.1:502")
+    
     def test_remove_connection_success(self):
         """測試成功移除連線"""
         name = "test_conn"
@@ -291,6 +591,22 @@ class TestConnectionManager(unittest.TestCase):
         
         self.assertIn("不存在", str(context.exception))
     
+    def test_worker_per_connection(self):
+        """測試每個連線共用一個工作線程，移除連線時一併停止"""
+        name = "test_conn"
+        self.manager.add_connection(name, self.mock_connection, "TCP", "127.0.0.1:8080")
+        
+        worker = self.manager.get_worker(name, lambda command: command)
+        self.assertIs(self.manager.get_worker(name, lambda command: None), worker)
+        self.assertIn(name, self.manager.get_all_workers())
+        
+        self.manager.remove_connection(name)
+        self.assertNotIn(name, self.manager.get_all_workers())
+        with self.assertRaises(ConnectionError):
+            worker.submit("01")
+        with self.assertRaises(ValueError):
+            self.manager.get_worker(name, lambda command: command)
+    
     def test_get_connection_success(self):
         """測試成功取得連線"""
         name = "test_conn"
@@ -354,5 +670,103 @@ class TestConnectionManager(unittest.TestCase):
         self.assertEqual(all_stats[name], stats)
 
 
+
+class TestConcurrentAccess(unittest.TestCase):
+    """多線程同時存取統計與登錄表的壓力測試"""
+    
+    SENDERS = 300
+    TRANSACTIONS = 50
+    
+    def _run_threads(self, targets):
+        errors = []
+        
+        def guarded(target):
+            try:
+                target()
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=guarded, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+    
+    def test_no_lost_counts(self):
+        """測試數百個發送線程同時累加不會遺失計數"""
+        stats = ConnectionStats("stress")
+        done = threading.Event()
+        
+        def sender(index):
+            def run():
+                for count in range(self.TRANSACTIONS):
+                    transaction = Transaction(bytes([index % 4 + 1, 3]), (index % 4 + 1, 3), 0, 0)
+                    transaction.first_byte_ns = transaction.last_byte_ns = (count + 1) * 100_000
+                    transaction.status = FRAME_OK if count % 5 else FRAME_CRC_ERROR
+                    stats.add_exchange(transaction)
+            return run
+        
+        def reader():
+            while not done.is_set():
+                stats.get_success_rate()
+                stats.get_latency_summary("1 分鐘")
+                for slave_id in stats.get_device_ids():
+                    stats.get_latency_summary(slave_id=slave_id)
+                time.sleep(0.0005)
+        
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+        errors = self._run_threads([sender(index) for index in range(self.SENDERS)])
+        done.set()
+        reader_thread.join()
+        
+        total = self.SENDERS * self.TRANSACTIONS
+        self.assertEqual(errors, [])
+        self.assertEqual(stats.total_sent, total)
+        self.assertEqual(stats.crc_errors, total // 5)
+        self.assertEqual(stats.total_received, total - total // 5)
+        self.assertEqual(stats.get_latency_summary()["count"], total - total // 5)
+        self.assertEqual(stats.get_device_ids(), [1, 2, 3, 4])
+        # 已結束線程的分片會被併入，不會隨發送線程數量無限增加
+        self.assertLess(len(stats._shards), self.SENDERS)
+    
+    def test_registry_changes_while_iterating(self):
+        """測試新增/移除連線時，讀取者迭代不會出錯"""
+        manager = ConnectionManager()
+        done = threading.Event()
+        
+        def churn(index):
+            def run():
+                for round_number in range(20):
+                    name = f"conn{index}_{round_number}"
+                    manager.add_connection(name, Mock(), "TCP", "127.0.0.1:502")
+                    manager.set_auto_send_status(name, True)
+                    manager.get_statistics(name).add_transaction(True, 1.0)
+                    manager.remove_connection(name)
+            return run
+        
+        def reader():
+            while not done.is_set():
+                for name, conn_info in manager.get_all_connections().items():
+                    conn_info['type']
+                for name, stats in manager.get_all_statistics().items():
+                    stats.total_sent
+                time.sleep(0.0005)
+        
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        errors = self._run_threads([churn(index) for index in range(100)])
+        done.set()
+        for thread in readers:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        self.assertEqual(len(manager.get_all_connections()), 0)
+        self.assertEqual(len(manager.get_all_statistics()), 0)
+        self.assertFalse(any(manager.auto_send_active.values()))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+connection_pool.py 單元測試
+"""
+import unittest
+import os
+import socket
+import threading
+import time
+from test_config import *
+
+try:
+    from ..connection_pool import Backoff, TCPConnectionPool, configure_socket, socket_alive
+    from ..connection_manager import TCPConnection
+    from ..transport import TransportError
+    from ..constants import FRAME_OK
+except ImportError:
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from connection_pool import Backoff, TCPConnectionPool, configure_socket, socket_alive
+    from connection_manager import TCPConnection
+    from transport import TransportError
+    from constants import FRAME_OK
+
+
+READ_REQUEST = bytes.fromhex("010300000001")
+READ_PDU = bytes.fromhex("01030200FF")
+
+
+class FakeGateway:
+    """本機 Modbus TCP 閘道：回應所有 MBAP 請求，可中斷所有連線或停止接受連線"""
+    
+    def __init__(self, port=0):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", port))
+        self.server.listen(16)
+        self.port = self.server.getsockname()[1]
+        self.clients = []
+        self.accepted = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._accept, daemon=True).start()
+    
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.clients.append(client)
+                self.accepted += 1
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+    
+    def _serve(self, client):
+        try:
+            while True:
+                header = client.recv(6)
+                if len(header) < 6:
+                    return
+                client.recv((header[4] << 8) | header[5])
+                client.sendall(header[:4] + len(READ_PDU).to_bytes(2, 'big') + READ_PDU)
+        except OSError:
+            pass
+    
+    def drop_clients(self):
+        with self._lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            client.shutdown(socket.SHUT_RDWR)
+            client.close()
+    
+    def stop(self):
+        # 先 shutdown 喚醒阻塞中的 accept()，否則監聽 Socket 不會真正關閉
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        self.drop_clients()
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class TestBackoff(unittest.TestCase):
+    """Backoff 測試類"""
+    
+    def test_exponential_growth_with_cap(self):
+        """測試等待時間加倍直到上限，成功後重設"""
+        backoff = Backoff(0.1, 1.0, jitter=0.0)
+        self.assertEqual([round(backoff.next_delay(), 3) for _ in range(6)], [0.1, 0.2, 0.4, 0.8, 1.0, 1.0])
+        backoff.reset()
+        self.assertAlmostEqual(backoff.next_delay(), 0.1)
+    
+    def test_jitter_shortens_delay(self):
+        """測試抖動只會縮短等待時間"""
+        self.assertAlmostEqual(Backoff(0.1, 1.0, jitter=0.5, rng=lambda: 1.0).next_delay(), 0.05)
+        self.assertAlmostEqual(Backoff(0.1, 1.0, jitter=0.5, rng=lambda: 0.0).next_delay(), 0.1)
+    
+    def test_validation(self):
+        """測試參數檢查"""
+        with self.assertRaises(ValueError):
+            Backoff(0, 1.0)
+        with self.assertRaises(ValueError):
+            Backoff(1.0, 0.5)
+        with self.assertRaises(ValueError):
+            Backoff(0.1, 1.0, jitter=1.0)
+
+
+class TestSocketOptions(unittest.TestCase):
+    """Socket 選項測試類"""
+    
+    def test_nodelay_and_keepalive(self):
+        """測試啟用 TCP_NODELAY 與 keepalive"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            configure_socket(sock)
+            self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        finally:
+            sock.close()
+    
+    def test_socket_alive(self):
+        """測試偵測對方已關閉的連線"""
+        gateway = FakeGateway()
+        try:
+            sock = socket.create_connection(("127.0.0.1", gateway.port))
+            self.assertTrue(wait_until(lambda: gateway.accepted == 1))
+            self.assertTrue(socket_alive(sock))
+            gateway.drop_clients()
+            self.assertTrue(wait_until(lambda: not socket_alive(sock)))
+            sock.close()
+        finally:
+            gateway.stop()
+
+
+class TestTCPConnectionPool(unittest.TestCase):
+    """TCPConnectionPool 測試類"""
+    
+    def setUp(self):
+        self.gateway = FakeGateway()
+        self.pool = TCPConnectionPool(spares=1, connect_timeout=0.5,
+                                      backoff=lambda: Backoff(0.01, 0.05, jitter=0.0))
+    
+    def tearDown(self):
+        self.pool.close()
+        self.gateway.stop()
+    
+    def test_spare_prewarmed(self):
+        """測試登記後預先建立備用連線，取走後立即補上"""
+        self.pool.register("127.0.0.1", self.gateway.port)
+        self.assertTrue(wait_until(lambda: self.pool.spare_count("127.0.0.1", self.gateway.port) == 1))
+        sock = self.pool.acquire("127.0.0.1", self.gateway.port, 1.0)
+        self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        self.assertTrue(wait_until(lambda: self.pool.spare_count("127.0.0.1", self.gateway.port) == 1))
+        sock.close()
+    
+    def test_unregistered_key(self):
+        """測試未登記的位址"""
+        with self.assertRaises(ValueError):
+            self.pool.acquire("127.0.0.1", self.gateway.port, 0.1)
+    
+    def test_fail_fast_on_refused(self):
+        """測試連線被拒時立即回報而不等待逾時"""
+        port = self.gateway.port
+        self.gateway.stop()
+        self.pool.register("127.0.0.1", port)
+        started = time.perf_counter()
+        with self.assertRaises(TransportError) as context:
+            self.pool.acquire("127.0.0.1", port, 2.0, fail_fast=True)
+        self.assertIn("TCP 連線失敗", str(context.exception))
+        self.assertLess(time.perf_counter() - started, 1.0)
+    
+    def test_unregister_closes_spares(self):
+        """測試最後一個使用者取消登記後關閉備用連線"""
+        self.pool.register("127.0.0.1", self.gateway.port)
+        self.assertTrue(wait_until(lambda: self.pool.spare_count("127.0.0.1", self.gateway.port) == 1))
+        self.pool.unregister("127.0.0.1", self.gateway.port)
+        self.assertEqual(self.pool.spare_count("127.0.0.1", self.gateway.port), 0)
+        with self.assertRaises(ValueError):
+            self.pool.acquire("127.0.0.1", self.gateway.port, 0.1)
+    
+    def test_connection_resumes_after_drop(self):
+        """測試閘道中斷連線後，下一筆請求自動改用備用連線"""
+        connection = TCPConnection("127.0.0.1", self.gateway.port, mbap=True, timeout=0.5, pool=self.pool)
+        self.assertTrue(connection.connect())
+        self.assertEqual(connection.exchange(READ_REQUEST).status, FRAME_OK)
+        
+        self.gateway.drop_clients()
+        with self.assertRaises(TransportError):
+            connection.exchange(READ_REQUEST)
+        self.assertTrue(connection.reconnecting)
+        
+        started = time.perf_counter()
+        transaction = connection.exchange(READ_REQUEST)
+        self.assertEqual(transaction.status, FRAME_OK)
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self.assertEqual(connection.reconnects, 1)
+        self.assertFalse(connection.reconnecting)
+        connection.close()
+        self.assertEqual(self.pool.spare_count("127.0.0.1", self.gateway.port), 0)
+    
+    def test_reconnect_after_gateway_restart(self):
+        """測試閘道停機期間以退避重試，恢復後輪詢繼續"""
+        port = self.gateway.port
+        connection = TCPConnection("127.0.0.1", port, mbap=True, timeout=0.3, pool=self.pool)
+        connection.connect()
+        self.gateway.stop()
+        with self.assertRaises(TransportError):
+            connection.exchange(READ_REQUEST)
+        with self.assertRaises(TransportError) as context:
+            connection.exchange(READ_REQUEST)
+        self.assertIn("背景重新連線中", str(context.exception))
+        
+        self.gateway = FakeGateway(port)
+        self.assertTrue(wait_until(lambda: self.pool.spare_count("127.0.0.1", port) == 1))
+        self.assertEqual(connection.exchange(READ_REQUEST).status, FRAME_OK)
+        connection.close()
+    
+    def test_connection_without_pool(self):
+        """測試未使用連線池時斷線後仍需重新建立連線"""
+        connection = TCPConnection("127.0.0.1", self.gateway.port, mbap=True, timeout=0.3)
+        connection.connect()
+        self.assertTrue(connection.socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        self.assertTrue(wait_until(lambda: self.gateway.accepted == 1))
+        self.gateway.drop_clients()
+        with self.assertRaises(TransportError):
+            connection.exchange(READ_REQUEST)
+        self.assertFalse(connection.reconnecting)
+        with self.assertRaises(ConnectionError) as context:
+            connection.exchange(READ_REQUEST)
+        self.assertIn("未建立或已中斷", str(context.exception))
+        connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
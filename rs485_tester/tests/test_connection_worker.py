@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+connection_worker.py 單元測試
+"""
+import unittest
+import threading
+import time
+from test_config import *
+
+try:
+    from ..connection_worker import ConnectionWorker
+    from ..connection_manager import ConnectionStats
+    from ..constants import QUEUE_POLICY_BLOCK, QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_COALESCE
+    from ..constants import PRIORITY_INTERACTIVE, PRIORITY_ALARM, PRIORITY_BACKGROUND
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from connection_worker import ConnectionWorker
+    from connection_manager import ConnectionStats
+    from constants import QUEUE_POLICY_BLOCK, QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_COALESCE
+    from constants import PRIORITY_INTERACTIVE, PRIORITY_ALARM, PRIORITY_BACKGROUND
+
+
+class GatedExecutor:
+    """第一筆指令執行時停住，直到測試放行，方便在佇列中堆積請求"""
+    
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.executed = []
+    
+    def __call__(self, command):
+        self.started.set()
+        self.release.wait(5)
+        self.executed.append(command)
+        return command.upper()
+
+
+class TestConnectionWorker(unittest.TestCase):
+    """ConnectionWorker 測試類"""
+    
+    def setUp(self):
+        self.executor = GatedExecutor()
+        self.results = []
+        self.done = threading.Event()
+    
+    def _make_worker(self, policy, queue_size=2):
+        worker = ConnectionWorker("COM1", self.executor, queue_size, policy)
+        self.addCleanup(worker.stop)
+        return worker
+    
+    def _callback(self, result, error):
+        self.results.append((result, error))
+        self.done.set()
+    
+    def _fill(self, worker, commands):
+        """第一筆進入執行後，再把其餘指令放入佇列"""
+        worker.submit(commands[0])
+        self.assertTrue(self.executor.started.wait(1))
+        for command in commands[1:]:
+            worker.submit(command)
+    
+    def _drain(self, worker):
+        self.executor.release.set()
+        worker.submit("end", self._callback, QUEUE_POLICY_BLOCK, priority=PRIORITY_BACKGROUND)
+        self.assertTrue(self.done.wait(2))
+    
+    def test_executes_in_order_on_one_thread(self):
+        """測試指令依序在同一個工作線程執行並回傳結果"""
+        threads = set()
+        
+        def execute(command):
+            threads.add(threading.current_thread())
+            return command * 2
+        
+        worker = ConnectionWorker("COM1", execute)
+        self.addCleanup(worker.stop)
+        for command in ("a", "b", "c"):
+            worker.submit(command, lambda result, error: self.results.append(result))
+        worker.submit("d", self._callback)
+        
+        self.assertTrue(self.done.wait(1))
+        self.assertEqual(self.results[:3], ["aa", "bb", "cc"])
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads.pop(), threading.current_thread())
+    
+    def test_error_reported_to_callback(self):
+        """測試執行時的例外交給回呼，工作線程繼續運作"""
+        def execute(command):
+            raise ConnectionError("連線中斷")
+        
+        worker = ConnectionWorker("COM1", execute)
+        self.addCleanup(worker.stop)
+        worker.submit("a", self._callback)
+        self.assertTrue(self.done.wait(1))
+        result, error = self.results[0]
+        self.assertIsNone(result)
+        self.assertIsInstance(error, ConnectionError)
+    
+    def test_block_rejects_after_timeout(self):
+        """測試阻塞策略在佇列滿時等待逾時後拒絕"""
+        worker = self._make_worker(QUEUE_POLICY_BLOCK)
+        self._fill(worker, ["a", "b", "c"])
+        
+        self.assertFalse(worker.submit("d", timeout=0.05))
+        self.assertEqual(worker.rejected, 1)
+        self._drain(worker)
+        self.assertEqual(self.executor.executed, ["a", "b", "c", "end"])
+    
+    def test_drop_oldest(self):
+        """測試丟棄最舊策略保留最新的請求"""
+        worker = self._make_worker(QUEUE_POLICY_DROP_OLDEST)
+        self._fill(worker, ["a", "b", "c", "d"])
+        
+        self.assertEqual(worker.dropped, 1)
+        self.assertEqual(worker.max_depth, 2)
+        self._drain(worker)
+        self.assertEqual(self.executor.executed, ["a", "c", "d", "end"])
+    
+    def test_coalesce_duplicates(self):
+        """測試合併策略讓重複的輪詢只執行一次，結果通知所有呼叫者"""
+        worker = self._make_worker(QUEUE_POLICY_COALESCE)
+        worker.submit("a")
+        self.assertTrue(self.executor.started.wait(1))
+        
+        results = []
+        for _ in range(5):
+            worker.submit("poll", lambda result, error: results.append(result))
+        
+        self.assertEqual(worker.coalesced, 4)
+        self.assertEqual(worker.depth, 1)
+        self._drain(worker)
+        self.assertEqual(self.executor.executed, ["a", "poll", "end"])
+        self.assertEqual(results, ["POLL"] * 5)
+    
+    def test_coalesced_stats_recorded_once(self):
+        """測試合併的請求共用一次執行，on_complete 只呼叫一次，統計不重複計入"""
+        worker = self._make_worker(QUEUE_POLICY_COALESCE)
+        stats = ConnectionStats("COM1")
+        worker.submit("a")
+        self.assertTrue(self.executor.started.wait(1))
+        
+        results = []
+        for _ in range(3):
+            worker.submit("poll", lambda result, error: results.append(result),
+                          on_complete=lambda result, error: stats.add_transaction(error is None, 1.0))
+        self._drain(worker)
+        
+        self.assertEqual(self.executor.executed, ["a", "poll", "end"])
+        self.assertEqual(results, ["POLL"] * 3)
+        self.assertEqual(stats.total_sent, 1)
+        self.assertEqual(stats.total_received, 1)
+    
+    def test_priority_order(self):
+        """測試手動指令優先於警報監控，警報監控優先於背景輪詢"""
+        worker = self._make_worker(QUEUE_POLICY_BLOCK, queue_size=8)
+        worker.submit("first")
+        self.assertTrue(self.executor.started.wait(1))
+        worker.submit("poll", priority=PRIORITY_BACKGROUND)
+        worker.submit("alarm", priority=PRIORITY_ALARM)
+        worker.submit("manual", priority=PRIORITY_INTERACTIVE)
+        self.assertEqual(worker.depth_by_priority(),
+                         {PRIORITY_INTERACTIVE: 1, PRIORITY_ALARM: 1, PRIORITY_BACKGROUND: 1})
+        
+        self._drain(worker)
+        self.assertEqual(self.executor.executed, ["first", "manual", "alarm", "poll", "end"])
+    
+    def test_stale_background_poll_dropped(self):
+        """測試過期的背景輪詢不佔用匯流排"""
+        worker = self._make_worker(QUEUE_POLICY_BLOCK, queue_size=8)
+        worker.submit("first")
+        self.assertTrue(self.executor.started.wait(1))
+        worker.submit("stale", priority=PRIORITY_BACKGROUND, deadline=0.01)
+        worker.submit("fresh", priority=PRIORITY_BACKGROUND, deadline=10)
+        time.sleep(0.05)
+        
+        self._drain(worker)
+        self.assertEqual(self.executor.executed, ["first", "fresh", "end"])
+        self.assertEqual(worker.metrics()["expired"], 1)
+    
+    def test_interactive_preempts_background_when_full(self):
+        """測試佇列被背景輪詢佔滿時，手動指令不需等待"""
+        worker = self._make_worker(QUEUE_POLICY_BLOCK)
+        worker.submit("first")
+        self.assertTrue(self.executor.started.wait(1))
+        worker.submit("poll1", priority=PRIORITY_BACKGROUND)
+        worker.submit("poll2", priority=PRIORITY_BACKGROUND)
+        
+        self.assertTrue(worker.submit("manual", timeout=0))
+        self.assertEqual(worker.preempted, 1)
+        # 背景輪詢不能搶先
+        self.assertFalse(worker.submit("poll3", priority=PRIORITY_BACKGROUND, timeout=0))
+        
+        self.executor.release.set()
+        worker.submit("end", self._callback, QUEUE_POLICY_BLOCK, priority=PRIORITY_BACKGROUND)
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(self.executor.executed, ["first", "manual", "poll2", "end"])
+    
+    def test_metrics(self):
+        """測試佇列深度與排隊時間統計"""
+        worker = self._make_worker(QUEUE_POLICY_BLOCK)
+        self._fill(worker, ["a", "b"])
+        self.assertEqual(worker.metrics()["depth"], 1)
+        
+        self._drain(worker)
+        metrics = worker.metrics()
+        self.assertEqual(metrics["completed"], 3)
+        self.assertGreater(metrics["wait_max"], 0)
+        self.assertGreaterEqual(metrics["wait_max"], metrics["wait_p95"])
+    
+    def test_stop_rejects_new_commands(self):
+        """測試停止後不再接受指令"""
+        worker = self._make_worker(QUEUE_POLICY_BLOCK)
+        worker.stop()
+        with self.assertRaises(ConnectionError):
+            worker.submit("a")
+    
+    def test_invalid_settings(self):
+        """測試無效的佇列設定"""
+        with self.assertRaises(ValueError):
+            ConnectionWorker("COM1", self.executor, queue_size=0)
+        with self.assertRaises(ValueError):
+            ConnectionWorker("COM1", self.executor, policy="unknown")
+        worker = self._make_worker(QUEUE_POLICY_BLOCK)
+        with self.assertRaises(ValueError):
+            worker.submit("a", priority=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
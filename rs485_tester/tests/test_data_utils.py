@@ -6,12 +6,12 @@ import unittest
 from test_config import *
 
 try:
-    from ..data_utils import DataFormatter, ModbusPacketAnalyzer
+    from ..data_utils import DataFormatter, ModbusPacketAnalyzer, ModbusCRC, ModbusStreamFramer
 except ImportError:
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-    from data_utils import DataFormatter, ModbusPacketAnalyzer
+    from data_utils import DataFormatter, ModbusPacketAnalyzer, ModbusCRC, ModbusStreamFramer
 
 
 class TestDataFormatter(unittest.TestCase):
@@ -95,6 +95,122 @@ class TestDataFormatter(unittest.TestCase):
         self.assertEqual(DataFormatter.hex_to_binary("41"), "01000001")
 
 
+class TestModbusCRC(unittest.TestCase):
+    """ModbusCRC 測試類"""
+    
+    def test_calculate(self):
+        """測試 CRC 計算 (低位元組在前傳送)"""
+        self.assertEqual(ModbusCRC.calculate(bytes.fromhex("010300000001")), 0x0A84)
+        self.assertEqual(ModbusCRC.calculate(bytes.fromhex("0103020001")), 0x8479)
+    
+    def test_check(self):
+        """測試訊框 CRC 檢查"""
+        self.assertTrue(ModbusCRC.check(bytes.fromhex("010300000001840A")))
+        self.assertFalse(ModbusCRC.check(bytes.fromhex("010300000001840B")))
+        self.assertFalse(ModbusCRC.check(b'\x01\x03'))
+    
+    def test_table_matches_bitwise(self):
+        """測試查表法與逐位元計算結果一致"""
+        def bitwise(data):
+            crc = 0xFFFF
+            for byte in data:
+                crc ^= byte
+                for _ in range(8):
+                    crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+            return crc
+        
+        data = bytes(range(256))
+        for size in (0, 1, 7, 64, 256):
+            self.assertEqual(ModbusCRC.calculate(data[:size]), bitwise(data[:size]))
+    
+    def test_incremental_update(self):
+        """測試分段串流計算結果與一次計算相同"""
+        data = bytes.fromhex("0103020001")
+        crc = ModbusCRC.update(ModbusCRC.INITIAL, data[:2])
+        crc = ModbusCRC.update(crc, memoryview(data)[2:4])
+        crc = ModbusCRC.update_byte(crc, data[4])
+        self.assertEqual(crc, ModbusCRC.calculate(data))
+        self.assertEqual(ModbusCRC.to_bytes(crc), bytes.fromhex("7984"))
+    
+    def test_verify_many(self):
+        """測試批次檢查 CRC"""
+        frames = [
+            bytes.fromhex("010300000001840A"),
+            bytearray.fromhex("010300000001840B"),
+            memoryview(bytes.fromhex("01030200017984")),
+            b'\x01',
+        ]
+        self.assertEqual(ModbusCRC.verify_many(frames), [True, False, True, False])
+
+
+def with_crc(hex_str):
+    """為十六進位封包附加 CRC"""
+    data = bytes.fromhex(hex_str)
+    crc = ModbusCRC.calculate(data)
+    return data + bytes([crc & 0xFF, crc >> 8])
+
+
+class TestModbusStreamFramer(unittest.TestCase):
+    """ModbusStreamFramer 測試類"""
+    
+    REQUEST = bytes.fromhex("010300000001840A")
+    RESPONSE = bytes.fromhex("01030200017984")
+    
+    def setUp(self):
+        self.framer = ModbusStreamFramer()
+    
+    def test_glued_frames(self):
+        """測試多個相連的訊框"""
+        results = self.framer.feed(self.REQUEST + self.RESPONSE)
+        self.assertEqual(results, [(self.REQUEST, True), (self.RESPONSE, True)])
+        self.assertEqual(len(self.framer.buffer), 0)
+    
+    def test_frame_split_across_chunks(self):
+        """測試被拆成多段的訊框"""
+        self.assertEqual(self.framer.feed(self.RESPONSE[:3]), [])
+        self.assertEqual(self.framer.feed(self.RESPONSE[3:]), [(self.RESPONSE, True)])
+    
+    def test_byte_by_byte_stream(self):
+        """測試逐位元組輸入"""
+        write_multiple = with_crc("011000010002040001000A")
+        stream = self.REQUEST + write_multiple + self.RESPONSE
+        results = []
+        for i in range(len(stream)):
+            results += self.framer.feed(stream[i:i + 1])
+        self.assertEqual([data for data, valid in results], [self.REQUEST, write_multiple, self.RESPONSE])
+    
+    def test_resync_after_garbage(self):
+        """測試垃圾位元組後重新同步"""
+        results = self.framer.feed(b'\xFF\x00\x13' + self.REQUEST)
+        self.assertEqual(results, [(b'\xFF\x00\x13', False), (self.REQUEST, True)])
+        self.assertEqual(self.framer.discarded, 3)
+    
+    def test_exception_response(self):
+        """測試例外回應"""
+        exception = bytes.fromhex("018302C0F1")
+        self.assertEqual(self.framer.feed(exception + self.REQUEST), [(exception, True), (self.REQUEST, True)])
+    
+    def test_unknown_function_uses_rolling_crc(self):
+        """測試無長度規則的功能碼以滾動 CRC 判斷結尾"""
+        report_id = with_crc("0111")
+        results = self.framer.feed(report_id[:2])
+        results += self.framer.feed(report_id[2:] + self.REQUEST)
+        self.assertEqual(results, [(report_id, True), (self.REQUEST, True)])
+    
+    def test_flush_returns_incomplete_data(self):
+        """測試取出無法成框的剩餘資料"""
+        self.framer.feed(self.RESPONSE[:-1])
+        self.assertEqual(self.framer.flush(), [(self.RESPONSE[:-1], False)])
+        self.assertEqual(self.framer.flush(), [])
+    
+    def test_flush_resyncs_after_long_fake_header(self):
+        """測試看似長請求表頭的雜訊不會在閒置時吞掉其後的有效訊框"""
+        garbage = bytes.fromhex("01100000000AF6")  # 推算長度 255，永遠收不齊
+        self.assertEqual(self.framer.feed(garbage + self.REQUEST + self.RESPONSE), [])
+        self.assertEqual(self.framer.flush(), [(garbage, False), (self.REQUEST, True), (self.RESPONSE, True)])
+        self.assertEqual(self.framer.flush(), [])
+
+
 class TestModbusPacketAnalyzer(unittest.TestCase):
     """ModbusPacketAnalyzer 測試類"""
     
@@ -234,6 +350,51 @@ class TestModbusPacketAnalyzer(unittest.TestCase):
         self.assertIsInstance(result, str)
         self.assertIn("封包長度不足", result)
     
+    def test_expected_response_length(self):
+        """測試依請求推算回應長度"""
+        # 讀取 n 個暫存器: 5 + 2n
+        self.assertEqual(ModbusPacketAnalyzer.expected_response_length(bytes.fromhex("010300000001840A")), 7)
+        self.assertEqual(ModbusPacketAnalyzer.expected_response_length(bytes.fromhex("01040000000A")), 25)
+        # 讀取 n 個線圈: 5 + ceil(n/8)
+        self.assertEqual(ModbusPacketAnalyzer.expected_response_length(bytes.fromhex("010100000009")), 7)
+        self.assertEqual(ModbusPacketAnalyzer.expected_response_length(bytes.fromhex("010200000008")), 6)
+        # 寫入指令回應固定 8 位元組
+        for func_code in ("05", "06", "0F", "10"):
+            request = bytes.fromhex(f"01{func_code}00000001")
+            self.assertEqual(ModbusPacketAnalyzer.expected_response_length(request), 8)
+    
+    def test_expected_response_length_unknown(self):
+        """測試無法推算回應長度的請求"""
+        self.assertIsNone(ModbusPacketAnalyzer.expected_response_length(bytes.fromhex("0103")))
+        self.assertIsNone(ModbusPacketAnalyzer.expected_response_length(bytes.fromhex("012B0E010000")))
+    
+    def test_validate_frame(self):
+        """測試接收訊框檢查結果"""
+        validate = ModbusPacketAnalyzer.validate_frame
+        self.assertEqual(validate(bytes.fromhex("01030200017984"), 7), "正常")
+        self.assertEqual(validate(bytes.fromhex("01030200017985"), 7), "CRC 錯誤")
+        self.assertEqual(validate(bytes.fromhex("0103020001"), 7), "訊框不完整")
+        self.assertEqual(validate(bytes.fromhex("0183"), 7), "訊框不完整")
+        self.assertEqual(validate(bytes.fromhex("018302C0F1"), 7), "例外回應")
+        self.assertEqual(validate(b'', 7), "無回應")
+    
+    def test_analyze_response_and_exception(self):
+        """測試封包分析可解碼回應與例外回應"""
+        result = ModbusPacketAnalyzer.analyze_packet("01 03 02 00 01 79 84")
+        self.assertEqual(result["暫存器值"], "0001")
+        result = ModbusPacketAnalyzer.analyze_packet("01 83 02 C0 F1")
+        self.assertIn("非法資料位址", result["例外碼"])
+    
+    def test_analyze_packet_reports_crc_check(self):
+        """測試封包分析顯示 CRC 檢查結果"""
+        self.assertEqual(ModbusPacketAnalyzer.analyze_packet("01 03 00 00 00 01 84 0A")["CRC 檢查"], "正確")
+        self.assertEqual(ModbusPacketAnalyzer.analyze_packet("01 03 00 00 00 01 84 0B")["CRC 檢查"], "錯誤")
+    
+    def test_is_exception_response(self):
+        """測試例外回應判斷"""
+        self.assertTrue(ModbusPacketAnalyzer.is_exception_response(0x83))
+        self.assertFalse(ModbusPacketAnalyzer.is_exception_response(0x03))
+    
     def test_packet_with_spaces(self):
         """測試包含多種空格格式的封包"""
         packets = [
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+device_tuning.py 單元測試
+"""
+import unittest
+from test_config import *
+
+try:
+    from ..device_tuning import DeviceTuner, ReadLimit
+    from ..transaction import Transaction
+    from ..data_utils import ModbusCRC
+    from ..constants import (FRAME_OK, FRAME_NO_RESPONSE, FRAME_EXCEPTION, TUNING_MIN_QUANTITY,
+                             TUNING_PROBE_AFTER, TUNING_DELAY_STEP)
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from device_tuning import DeviceTuner, ReadLimit
+    from transaction import Transaction
+    from data_utils import ModbusCRC
+    from constants import (FRAME_OK, FRAME_NO_RESPONSE, FRAME_EXCEPTION, TUNING_MIN_QUANTITY,
+                           TUNING_PROBE_AFTER, TUNING_DELAY_STEP)
+
+
+def with_crc(data):
+    return data + ModbusCRC.to_bytes(ModbusCRC.calculate(data))
+
+
+def read_transaction(quantity, status, slave_id=1, response=b'', latency_ns=10_000_000):
+    request = with_crc(bytes((slave_id, 0x03, 0, 0, quantity >> 8, quantity & 0xFF)))
+    transaction = Transaction(request, (slave_id, 3), 0, 0)
+    transaction.status = status
+    if status != FRAME_NO_RESPONSE:
+        transaction.response = response
+        transaction.first_byte_ns = transaction.last_byte_ns = latency_ns
+    return transaction
+
+
+class TestReadLimit(unittest.TestCase):
+    """ReadLimit 測試類"""
+    
+    def test_failure_halves_and_caps(self):
+        """測試失敗時減半，之後加大不超過曾失敗的數量"""
+        limit = ReadLimit(125)
+        limit.success(40)
+        self.assertTrue(limit.failure(125))
+        self.assertEqual(limit.limit, 62)
+        self.assertEqual(limit.ceiling, 125)
+        
+        for _ in range(TUNING_PROBE_AFTER * 20):
+            limit.success(limit.limit)
+        self.assertEqual(limit.limit, 124)
+    
+    def test_failure_within_reliable_size_ignored(self):
+        """測試曾成功過的大小失敗時不縮小上限"""
+        limit = ReadLimit(125)
+        limit.success(100)
+        self.assertFalse(limit.failure(80))
+        self.assertEqual(limit.limit, 125)
+    
+    def test_never_below_minimum(self):
+        """測試上限不低於下限"""
+        limit = ReadLimit(125)
+        limit.failure(10)
+        self.assertEqual(limit.limit, TUNING_MIN_QUANTITY)
+
+
+class TestDeviceTuner(unittest.TestCase):
+    """DeviceTuner 測試類"""
+    
+    def setUp(self):
+        self.tuner = DeviceTuner()
+    
+    def test_large_read_timeout_shrinks_limit(self):
+        """測試大量讀取逾時縮小該從站的合併上限"""
+        self.tuner.observe(read_transaction(125, FRAME_NO_RESPONSE))
+        self.assertEqual(self.tuner.read_limits(1)[0x03], 62)
+        self.assertEqual(self.tuner.read_limits(1)[0x04], 125)
+        # 其他從站不受影響
+        self.assertEqual(self.tuner.read_limits(2)[0x03], 125)
+        self.assertEqual(self.tuner.profile(1).turnaround_delay, 0.0)
+    
+    def test_size_exception_shrinks_limit(self):
+        """測試非法資料值例外縮小讀取數量"""
+        transaction = read_transaction(100, FRAME_EXCEPTION, response=with_crc(b'\x01\x83\x03'))
+        self.tuner.observe(transaction)
+        self.assertEqual(self.tuner.read_limits(1)[0x03], 50)
+    
+    def test_small_read_timeout_raises_turnaround(self):
+        """測試已知可行大小的請求逾時時調高轉換延遲，連續成功後回降但維持在逾時值之上"""
+        self.tuner.observe(read_transaction(1, FRAME_OK, response=with_crc(b'\x01\x03\x02\x00\x01')))
+        self.tuner.observe(read_transaction(1, FRAME_NO_RESPONSE))
+        profile = self.tuner.profile(1)
+        self.assertEqual(profile.turnaround_delay, TUNING_DELAY_STEP)
+        self.tuner.observe(read_transaction(1, FRAME_NO_RESPONSE))
+        self.assertEqual(profile.turnaround_delay, 2 * TUNING_DELAY_STEP)
+        
+        for _ in range(TUNING_PROBE_AFTER * 5):
+            self.tuner.observe(read_transaction(1, FRAME_OK, response=with_crc(b'\x01\x03\x02\x00\x01')))
+        self.assertAlmostEqual(profile.turnaround_delay, 2 * TUNING_DELAY_STEP)
+    
+    def test_latency_learned(self):
+        """測試記錄典型延遲"""
+        for latency_ns in (10_000_000, 12_000_000, 50_000_000):
+            self.tuner.observe(read_transaction(1, FRAME_OK, latency_ns=latency_ns,
+                                                response=with_crc(b'\x01\x03\x02\x00\x01')))
+        summary = self.tuner.profile(1).summary()
+        self.assertAlmostEqual(summary["p50"], 12.0, delta=0.4)
+        self.assertEqual(summary["successes"], 3)
+    
+    def test_broadcast_ignored(self):
+        """測試廣播不用於學習"""
+        self.assertIsNone(self.tuner.observe(read_transaction(1, FRAME_NO_RESPONSE, slave_id=0)))
+        self.assertEqual(self.tuner.profiles, {})
+    
+    def test_mbap_request(self):
+        """測試 Modbus TCP 請求去除 MBAP 標頭後判斷讀取數量"""
+        request = bytes.fromhex("00010000000601030000007D")
+        transaction = Transaction(request, 1, 0, 0)
+        self.tuner.observe(transaction)
+        self.assertEqual(self.tuner.read_limits(1)[0x03], 62)
+
+
+if __name__ == '__main__':
+    unittest.main()
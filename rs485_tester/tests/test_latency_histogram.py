@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+latency_histogram.py 單元測試
+"""
+import unittest
+import random
+from test_config import *
+
+try:
+    from ..latency_histogram import (LatencyHistogram, WindowedHistogram, LatencyTracker,
+                                     bucket_index, bucket_upper_bound)
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from latency_histogram import (LatencyHistogram, WindowedHistogram, LatencyTracker,
+                                   bucket_index, bucket_upper_bound)
+
+
+class TestBuckets(unittest.TestCase):
+    """分桶計算測試類"""
+    
+    def test_buckets_are_contiguous(self):
+        """測試桶編號連續且上界包含原值"""
+        previous = -1
+        for value in range(100000):
+            index = bucket_index(value)
+            self.assertIn(index - previous, (0, 1))
+            self.assertLessEqual(value, bucket_upper_bound(index))
+            previous = index
+    
+    def test_relative_error(self):
+        """測試上界相對誤差不超過約 3%"""
+        for value in (100, 999, 12345, 5000000):
+            upper = bucket_upper_bound(bucket_index(value))
+            self.assertLessEqual((upper - value) / value, 1 / 32)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """LatencyHistogram 測試類"""
+    
+    def test_percentiles_against_sorted_samples(self):
+        """測試百分位數與排序後的實際值誤差在 3% 內"""
+        rng = random.Random(1)
+        samples = [rng.lognormvariate(2, 0.8) for _ in range(5000)]
+        histogram = LatencyHistogram()
+        for sample in samples:
+            histogram.record(sample)
+        
+        ordered = sorted(samples)
+        for percent, value in zip((50, 95, 99), histogram.percentiles(50, 95, 99)):
+            exact = ordered[int(len(ordered) * percent / 100) - 1]
+            self.assertAlmostEqual(value, exact, delta=exact * 0.04)
+        self.assertAlmostEqual(histogram.summary()["max"], max(samples), places=2)
+    
+    def test_tail_is_visible(self):
+        """測試少數慢回應出現在 p99 與最大值"""
+        histogram = LatencyHistogram()
+        for _ in range(980):
+            histogram.record(10.0)
+        for _ in range(20):
+            histogram.record(500.0)
+        
+        summary = histogram.summary()
+        self.assertAlmostEqual(summary["p50"], 10.0, delta=0.4)
+        self.assertAlmostEqual(summary["p99"], 500.0, delta=16)
+        self.assertEqual(summary["max"], 500.0)
+        self.assertEqual(summary["count"], 1000)
+    
+    def test_empty(self):
+        """測試沒有資料時回傳 0"""
+        self.assertEqual(LatencyHistogram().summary(), {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0})
+    
+    def test_merge(self):
+        """測試合併直方圖"""
+        first, second = LatencyHistogram(), LatencyHistogram()
+        first.record(1.0)
+        second.record(3.0)
+        first.merge(second)
+        self.assertEqual(first.total, 2)
+        self.assertEqual(first.summary()["max"], 3.0)
+
+
+class TestWindowedHistogram(unittest.TestCase):
+    """WindowedHistogram 測試類"""
+    
+    def test_old_samples_leave_window(self):
+        """測試超出時間窗的資料不再計入"""
+        window = WindowedHistogram(60, 12)
+        window.record(100.0, now=0)
+        window.record(5.0, now=30)
+        
+        self.assertEqual(window.snapshot(now=30).total, 2)
+        snapshot = window.snapshot(now=65)
+        self.assertEqual(snapshot.total, 1)
+        self.assertEqual(snapshot.summary()["max"], 5.0)
+        self.assertEqual(window.snapshot(now=200).total, 0)
+    
+    def test_invalid_window(self):
+        """測試無效的時間窗設定"""
+        with self.assertRaises(ValueError):
+            WindowedHistogram(0, 12)
+
+
+class TestLatencyTracker(unittest.TestCase):
+    """LatencyTracker 測試類"""
+    
+    def test_session_keeps_history(self):
+        """測試整個連線期間保留所有資料，時間窗只保留近期資料"""
+        tracker = LatencyTracker({"1 分鐘": (60, 12)})
+        tracker.record(50.0, now=0)
+        tracker.record(10.0, now=120)
+        
+        self.assertEqual(tracker.summary(LatencyTracker.SESSION)["count"], 2)
+        self.assertEqual(tracker.summary("1 分鐘", now=120)["count"], 1)
+        self.assertEqual(tracker.window_names(), ["1 分鐘", LatencyTracker.SESSION])
+        with self.assertRaises(ValueError):
+            tracker.summary("1 小時")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+pdu_decoder.py 單元測試
+"""
+import unittest
+from test_config import *
+
+try:
+    from ..pdu_decoder import (ModbusPduDecoder, ReadRequest, ReadBitsResponse, RegistersResponse, WriteSingle,
+                               WriteCoilsRequest, WriteRegistersRequest, WriteMultipleResponse,
+                               ExceptionResponse, RawPdu)
+    from ..data_utils import ModbusCRC
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from pdu_decoder import (ModbusPduDecoder, ReadRequest, ReadBitsResponse, RegistersResponse, WriteSingle,
+                             WriteCoilsRequest, WriteRegistersRequest, WriteMultipleResponse,
+                             ExceptionResponse, RawPdu)
+    from data_utils import ModbusCRC
+
+
+def with_crc(hex_str):
+    """為十六進位封包附加 CRC"""
+    data = bytes.fromhex(hex_str)
+    return data + ModbusCRC.to_bytes(ModbusCRC.calculate(data))
+
+
+class TestDecodeRequest(unittest.TestCase):
+    """請求解碼測試類"""
+    
+    def test_read_request(self):
+        """測試 0x01-0x04 讀取請求"""
+        for func_code in (0x01, 0x02, 0x03, 0x04):
+            record = ModbusPduDecoder.decode_request(with_crc(f"11{func_code:02X}006B0003"))
+            self.assertEqual(record, ReadRequest(0x11, func_code, 0x006B, 3))
+    
+    def test_write_single(self):
+        """測試 0x05/0x06 寫入單一請求"""
+        self.assertEqual(ModbusPduDecoder.decode_request(with_crc("110500ACFF00")),
+                         WriteSingle(0x11, 0x05, 0x00AC, 0xFF00))
+        self.assertEqual(ModbusPduDecoder.decode_request(with_crc("110600010003")),
+                         WriteSingle(0x11, 0x06, 0x0001, 0x0003))
+    
+    def test_write_multiple_coils(self):
+        """測試 0x0F 請求位元圖展開"""
+        record = ModbusPduDecoder.decode_request(with_crc("110F0013000A02CD01"))
+        self.assertIsInstance(record, WriteCoilsRequest)
+        self.assertEqual((record.address, record.quantity), (0x13, 10))
+        self.assertEqual(record.bits(), [1, 0, 1, 1, 0, 0, 1, 1, 1, 0])
+    
+    def test_write_multiple_registers(self):
+        """測試 0x10 請求暫存器陣列"""
+        record = ModbusPduDecoder.decode_request(with_crc("11100001000204000A0102"))
+        self.assertIsInstance(record, WriteRegistersRequest)
+        self.assertEqual(list(record.registers), [0x000A, 0x0102])
+    
+    def test_truncated_request(self):
+        """測試長度不足的請求"""
+        with self.assertRaises(ValueError):
+            ModbusPduDecoder.decode_request(with_crc("1110000100020400"))
+        with self.assertRaises(ValueError):
+            ModbusPduDecoder.decode_request(b'\x01\x03')
+    
+    def test_unknown_function(self):
+        """測試未支援的功能碼保留原始資料"""
+        record = ModbusPduDecoder.decode_request(with_crc("012B0E01"))
+        self.assertIsInstance(record, RawPdu)
+        self.assertEqual(bytes(record.payload), b'\x0E\x01')
+
+
+class TestDecodeResponse(unittest.TestCase):
+    """回應解碼測試類"""
+    
+    def test_read_bits_response(self):
+        """測試 0x01/0x02 回應位元圖"""
+        record = ModbusPduDecoder.decode_response(with_crc("110103CD6B05"))
+        self.assertIsInstance(record, ReadBitsResponse)
+        self.assertEqual(record.bits(19), [1, 0, 1, 1, 0, 0, 1, 1,
+                                           1, 1, 0, 1, 0, 1, 1, 0,
+                                           1, 0, 1])
+    
+    def test_registers_response(self):
+        """測試 0x03/0x04 回應暫存器值"""
+        record = ModbusPduDecoder.decode_response(with_crc("110306022B00000064"))
+        self.assertEqual(record, RegistersResponse(0x11, 0x03, record.registers))
+        self.assertEqual(list(record.registers), [0x022B, 0x0000, 0x0064])
+    
+    def test_odd_register_byte_count(self):
+        """測試暫存器資料位元組數為奇數"""
+        with self.assertRaises(ValueError):
+            ModbusPduDecoder.decode_response(with_crc("110303022B00"))
+    
+    def test_write_responses(self):
+        """測試寫入回應"""
+        self.assertEqual(ModbusPduDecoder.decode_response(with_crc("110600010003")),
+                         WriteSingle(0x11, 0x06, 1, 3))
+        self.assertEqual(ModbusPduDecoder.decode_response(with_crc("110F0013000A")),
+                         WriteMultipleResponse(0x11, 0x0F, 0x13, 10))
+        self.assertEqual(ModbusPduDecoder.decode_response(with_crc("111000010002")),
+                         WriteMultipleResponse(0x11, 0x10, 1, 2))
+    
+    def test_exception_response(self):
+        """測試例外回應"""
+        record = ModbusPduDecoder.decode_response(bytes.fromhex("018302C0F1"))
+        self.assertEqual(record, ExceptionResponse(0x01, 0x03, 0x02))
+        self.assertIn("非法資料位址", record.describe()["例外碼"])
+    
+    def test_memoryview_input(self):
+        """測試直接解碼 memoryview 切片"""
+        buffer = bytearray(b'\xAA' + with_crc("0103020001") + b'\xBB')
+        record = ModbusPduDecoder.decode_response(memoryview(buffer)[1:-1])
+        self.assertEqual(list(record.registers), [1])
+    
+    def test_without_crc(self):
+        """測試不含 CRC 的 PDU (例如 Modbus TCP)"""
+        record = ModbusPduDecoder.decode_response(bytes.fromhex("0103020001"), has_crc=False)
+        self.assertEqual(list(record.registers), [1])
+
+
+class TestAutoDecode(unittest.TestCase):
+    """自動判斷方向測試類"""
+    
+    def test_direction_guess(self):
+        """測試依長度推斷請求或回應"""
+        self.assertIsInstance(ModbusPduDecoder.decode(with_crc("010300000001")), ReadRequest)
+        self.assertIsInstance(ModbusPduDecoder.decode(with_crc("0103020001")), RegistersResponse)
+        self.assertIsInstance(ModbusPduDecoder.decode(with_crc("0110000100020400010002")), WriteRegistersRequest)
+        self.assertIsInstance(ModbusPduDecoder.decode(with_crc("011000010002")), WriteMultipleResponse)
+        self.assertIsInstance(ModbusPduDecoder.decode(bytes.fromhex("018302C0F1")), ExceptionResponse)
+    
+    def test_describe_is_lazy_text(self):
+        """測試文字格式只在 describe() 時產生"""
+        record = ModbusPduDecoder.decode(with_crc("0103040001FFFF"))
+        self.assertEqual(record.registers.tolist(), [1, 0xFFFF])
+        self.assertEqual(record.describe()["暫存器值"], "0001 FFFF")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+poll_plan.py 單元測試
+"""
+import unittest
+from test_config import *
+
+try:
+    from ..poll_plan import PollPlanCompiler, PollPoint, PollRequest
+    from ..data_utils import ModbusCRC
+    from ..constants import POLL_POINTS
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from poll_plan import PollPlanCompiler, PollPoint, PollRequest
+    from data_utils import ModbusCRC
+    from constants import POLL_POINTS
+
+
+def with_crc(hex_str):
+    data = bytes.fromhex(hex_str)
+    return data + ModbusCRC.to_bytes(ModbusCRC.calculate(data))
+
+
+class TestPollPlanCompiler(unittest.TestCase):
+    """PollPlanCompiler 測試類"""
+    
+    def setUp(self):
+        self.compiler = PollPlanCompiler(gap=4)
+    
+    def test_merge_near_adjacent(self):
+        """測試相鄰與間隔不超過容許值的點位合併"""
+        points = [PollPoint(f"r{address}", 1, 0x03, address, 1) for address in (0, 1, 2, 7, 20, 21)]
+        plan = self.compiler.compile(points)
+        
+        self.assertEqual([(r.address, r.quantity) for r in plan], [(0, 8), (20, 2)])
+        self.assertEqual(plan.point_count, 6)
+    
+    def test_scattered_registers_reduce_requests(self):
+        """測試 60 個分散的暫存器合併為少數幾筆請求"""
+        points = [PollPoint(f"r{i}", 1, 0x03, i * 3, 1) for i in range(60)]
+        plan = PollPlanCompiler().compile(points)
+        
+        self.assertEqual(len(plan), 2)
+        self.assertTrue(all(request.quantity <= 125 for request in plan))
+        covered = {p.name for request in plan for p in request.points}
+        self.assertEqual(len(covered), 60)
+    
+    def test_register_limit(self):
+        """測試單筆請求不超過 125 個暫存器"""
+        points = [PollPoint(f"r{i}", 1, 0x04, i, 1) for i in range(300)]
+        plan = self.compiler.compile(points)
+        self.assertEqual([request.quantity for request in plan], [125, 125, 50])
+    
+    def test_coil_limit(self):
+        """測試線圈單筆請求不超過 2000 點"""
+        points = [PollPoint(f"c{i}", 1, 0x01, i * 100, 1) for i in range(50)]
+        plan = PollPlanCompiler(gap=100).compile(points)
+        self.assertTrue(all(request.quantity <= 2000 for request in plan))
+        self.assertEqual(len(plan), 3)
+    
+    def test_groups_by_slave_and_function(self):
+        """測試不同從站或功能碼不會合併"""
+        points = [PollPoint("a", 1, 0x03, 0, 1), PollPoint("b", 2, 0x03, 1, 1), PollPoint("c", 1, 0x04, 1, 1)]
+        plan = self.compiler.compile(points)
+        self.assertEqual([(r.slave_id, r.function_code) for r in plan], [(1, 3), (1, 4), (2, 3)])
+    
+    def test_invalid_points(self):
+        """測試無效的點位"""
+        with self.assertRaises(ValueError):
+            self.compiler.compile([PollPoint("w", 1, 0x06, 0, 1)])
+        with self.assertRaises(ValueError):
+            self.compiler.compile([PollPoint("big", 1, 0x03, 0, 126)])
+        with self.assertRaises(ValueError):
+            PollPlanCompiler(gap=-1)
+    
+    def test_parse_points(self):
+        """測試解析常用指令格式的點位定義"""
+        points = PollPlanCompiler.parse_points({"溫度": "{ID} 04 00 10", "計數": "{ID} 03 00 20 00 02"}, 0x0A)
+        self.assertEqual(points, [PollPoint("溫度", 10, 0x04, 0x10, 1), PollPoint("計數", 10, 0x03, 0x20, 2)])
+        with self.assertRaises(ValueError):
+            PollPlanCompiler.parse_points({"錯誤": "{ID} 03 00"}, 1)
+    
+    def test_default_points_keep_status_query(self):
+        """測試預設監控點位編譯後與原本的查詢指令相同"""
+        plan = PollPlanCompiler().compile(PollPlanCompiler.parse_points(POLL_POINTS, 1))
+        self.assertEqual([request.hex for request in plan], ["01 03 00 00 00 01 84 0A"])
+
+
+class TestPollRequest(unittest.TestCase):
+    """PollRequest 回應拆解測試類"""
+    
+    def test_split_registers(self):
+        """測試暫存器回應拆回各點位"""
+        request = PollRequest(1, 0x03, 0, 4, (PollPoint("a", 1, 3, 0, 1), PollPoint("b", 1, 3, 2, 2)))
+        values = request.split(with_crc("010308000100020003FFFF"))
+        self.assertEqual(values, {"a": 1, "b": (3, 0xFFFF)})
+    
+    def test_split_bits(self):
+        """測試線圈回應拆回各點位"""
+        request = PollRequest(1, 0x01, 10, 10, (PollPoint("x", 1, 1, 10, 1), PollPoint("y", 1, 1, 19, 1)))
+        self.assertEqual(request.split(with_crc("0101020102")), {"x": 1, "y": 1})
+    
+    def test_split_errors(self):
+        """測試例外回應與不符的回應"""
+        request = PollRequest(1, 0x03, 0, 2, (PollPoint("a", 1, 3, 0, 1),))
+        with self.assertRaises(ValueError):
+            request.split(with_crc("018302"))
+        with self.assertRaises(ValueError):
+            request.split(with_crc("02030400010002"))
+        with self.assertRaises(ValueError):
+            request.split(with_crc("0103020001"))
+    
+    def test_split_mbap_response(self):
+        """測試 Modbus TCP 回應去除 MBAP 標頭且不檢查 CRC"""
+        request = PollRequest(1, 0x03, 0, 2, (PollPoint("a", 1, 3, 0, 1), PollPoint("b", 1, 3, 1, 1)))
+        response = bytes.fromhex("000700000007" "010304000A000B")
+        self.assertEqual(request.split(response), {"a": 10, "b": 11})
+        with self.assertRaises(ValueError):
+            request.split(bytes.fromhex("000700000003" "018302"))
+    
+    def test_plan_split_responses(self):
+        """測試整個計畫的回應合併為點位數值"""
+        compiler = PollPlanCompiler(gap=0)
+        plan = compiler.compile([PollPoint("a", 1, 3, 0, 1), PollPoint("b", 1, 3, 50, 1)])
+        values = plan.split_responses([with_crc("0103020007"), None])
+        self.assertEqual(values, {"a": 7})
+
+
+if __name__ == '__main__':
+    unittest.main()
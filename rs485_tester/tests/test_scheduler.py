@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+scheduler.py 單元測試
+"""
+import unittest
+import threading
+import time
+from test_config import *
+
+try:
+    from ..scheduler import PeriodicScheduler, PeriodicJob
+    from ..constants import SCHEDULE_SKIP, SCHEDULE_CATCH_UP, SCHEDULER_MAX_CATCH_UP
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from scheduler import PeriodicScheduler, PeriodicJob
+    from constants import SCHEDULE_SKIP, SCHEDULE_CATCH_UP, SCHEDULER_MAX_CATCH_UP
+
+
+class TestPeriodicJob(unittest.TestCase):
+    """PeriodicJob 週期推進測試類"""
+    
+    def test_on_time_keeps_grid(self):
+        """測試下一次時間點由排定時間計算，不受執行時間影響"""
+        job = PeriodicJob("a", 100, None, SCHEDULE_SKIP, 1000)
+        job.advance(now_ns=1040)
+        self.assertEqual(job.next_ns, 1100)
+        self.assertEqual(job.skipped, 0)
+    
+    def test_skip_policy(self):
+        """測試跳過策略對齊下一個未來的時間點"""
+        job = PeriodicJob("a", 100, None, SCHEDULE_SKIP, 1000)
+        job.advance(now_ns=1350)
+        self.assertEqual(job.next_ns, 1400)
+        self.assertEqual(job.skipped, 3)
+    
+    def test_catch_up_policy(self):
+        """測試補發策略保留有限個延誤的週期"""
+        job = PeriodicJob("a", 100, None, SCHEDULE_CATCH_UP, 1000)
+        job.advance(now_ns=1350)
+        self.assertEqual(job.next_ns, 1100)
+        self.assertEqual(job.skipped, 0)
+        
+        job = PeriodicJob("a", 100, None, SCHEDULE_CATCH_UP, 1000)
+        job.advance(now_ns=1000 + 100 * (SCHEDULER_MAX_CATCH_UP + 5))
+        self.assertEqual(job.skipped, 5)
+        self.assertEqual(job.next_ns, 1000 + 100 * 6)
+
+
+class TestPeriodicScheduler(unittest.TestCase):
+    """PeriodicScheduler 測試類"""
+    
+    def setUp(self):
+        self.scheduler = PeriodicScheduler()
+        self.addCleanup(self.scheduler.stop)
+    
+    def test_no_drift_with_slow_callback(self):
+        """測試回呼耗時不會讓週期漂移"""
+        times = []
+        
+        def work():
+            times.append(time.perf_counter())
+            time.sleep(0.01)
+        
+        job = self.scheduler.add("slow", 0.03, work, start_delay=0)
+        time.sleep(0.32)
+        self.scheduler.cancel(job)
+        time.sleep(0.02)
+        
+        # 若每次在工作後才睡一個週期，實際週期會是 40ms
+        self.assertGreaterEqual(len(times), 9)
+        period = (times[-1] - times[0]) / (len(times) - 1)
+        self.assertAlmostEqual(period, 0.03, delta=0.005)
+        self.assertEqual(job.runs, len(times))
+        self.assertEqual(self.scheduler.jitter.summary()["count"], len(times))
+    
+    def test_many_jobs_on_one_thread(self):
+        """測試數百個工作由同一個線程驅動"""
+        counts = [0] * 300
+        threads = set()
+        
+        def make(index):
+            def work():
+                counts[index] += 1
+                threads.add(threading.current_thread())
+            return work
+        
+        before = threading.active_count()
+        for index in range(300):
+            self.scheduler.add(f"job{index}", 0.02, make(index), start_delay=index / 30000)
+        self.assertLessEqual(threading.active_count(), before + 1)
+        time.sleep(0.15)
+        
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(all(count >= 3 for count in counts))
+    
+    def test_cancel(self):
+        """測試取消後不再執行"""
+        calls = []
+        job = self.scheduler.add("a", 0.01, lambda: calls.append(1), start_delay=0)
+        time.sleep(0.05)
+        self.scheduler.cancel(job)
+        count = len(calls)
+        time.sleep(0.05)
+        self.assertEqual(len(calls), count)
+        self.assertEqual(self.scheduler.jobs(), [])
+    
+    def test_failing_job_stops(self):
+        """測試回呼發生例外時只停止該工作"""
+        calls = []
+        
+        def fail():
+            raise ValueError("連線不存在")
+        
+        failing = self.scheduler.add("bad", 0.01, fail, start_delay=0)
+        self.scheduler.add("good", 0.01, lambda: calls.append(1), start_delay=0)
+        time.sleep(0.05)
+        
+        self.assertFalse(failing.active)
+        self.assertIsInstance(failing.error, ValueError)
+        self.assertEqual(failing.runs, 1)
+        self.assertGreater(len(calls), 1)
+    
+    def test_invalid_settings(self):
+        """測試無效的排程設定"""
+        with self.assertRaises(ValueError):
+            self.scheduler.add("a", 0, lambda: None)
+        with self.assertRaises(ValueError):
+            self.scheduler.add("a", 1, lambda: None, policy="unknown")
+        self.scheduler.stop()
+        with self.assertRaises(RuntimeError):
+            self.scheduler.add("a", 1, lambda: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
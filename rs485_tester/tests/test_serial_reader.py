@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+serial_reader.py 單元測試
+"""
+import unittest
+import threading
+import time
+from unittest.mock import patch
+from test_config import *
+
+try:
+    from ..serial_reader import FrameRingBuffer, SerialReader, ReceivedFrame
+    from ..serial_utils import RS485Tester
+    from ..constants import RX_FRAME_QUEUE_SIZE
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from serial_reader import FrameRingBuffer, SerialReader, ReceivedFrame
+    from serial_utils import RS485Tester
+    from constants import RX_FRAME_QUEUE_SIZE
+
+
+class FakeSerial:
+    """模擬串口: 依序送出預先排定的資料塊，無資料時等待逾時；replies 於每次寫入後送出"""
+    
+    def __init__(self, chunks=None, replies=None):
+        self.chunks = list(chunks or [])
+        self.replies = list(replies or [])
+        self.timeout = 1
+        self.written = []
+        self.lock = threading.Lock()
+    
+    @property
+    def in_waiting(self):
+        with self.lock:
+            return len(self.chunks[0]) if self.chunks and self.chunks[0] else 0
+    
+    def feed(self, *chunks):
+        with self.lock:
+            self.chunks.extend(chunks)
+    
+    def readinto(self, buffer):
+        with self.lock:
+            chunk = self.chunks.pop(0) if self.chunks else None
+        if not chunk:
+            time.sleep(self.timeout)
+            return 0
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+    
+    def write(self, data):
+        self.written.append(data)
+        if self.replies:
+            self.feed(self.replies.pop(0))
+    
+    def close(self):
+        pass
+
+
+class TestFrameRingBuffer(unittest.TestCase):
+    """FrameRingBuffer 測試類"""
+    
+    def test_take_frame_is_zero_copy(self):
+        """測試取出的訊框為緩衝區的 memoryview"""
+        ring = FrameRingBuffer(1024)
+        target = ring.writable(3)
+        target[:3] = b'\x01\x03\x02'
+        ring.commit(3)
+        
+        frame = ring.take_frame()
+        self.assertIsInstance(frame, memoryview)
+        self.assertEqual(bytes(frame), b'\x01\x03\x02')
+        self.assertIs(frame.obj, ring.buffer)
+        self.assertEqual(ring.pending(), 0)
+    
+    def test_wraparound_keeps_frame_contiguous(self):
+        """測試繞回時未完成訊框仍保持連續"""
+        ring = FrameRingBuffer(512)
+        ring.commit(500)
+        ring.take_frame()
+        
+        ring.writable(4)[:4] = b'\xAA\xBB\xCC\xDD'
+        ring.commit(4)
+        # 尾端空間不足，未完成訊框移回開頭
+        ring.writable(16)[:2] = b'\xEE\xFF'
+        ring.commit(2)
+        
+        self.assertEqual(bytes(ring.take_frame()), b'\xAA\xBB\xCC\xDD\xEE\xFF')
+        self.assertEqual(ring.frame_start, 6)
+    
+    def test_buffer_too_small(self):
+        """測試緩衝區過小"""
+        with self.assertRaises(ValueError):
+            FrameRingBuffer(100)
+
+
+class TestSerialReader(unittest.TestCase):
+    """SerialReader 測試類"""
+    
+    def test_publishes_frames_split_by_silence(self):
+        """測試以靜默時間切割並發布訊框"""
+        fake = FakeSerial([b'\x01\x03', b'\x02\x00\x01\x79\x84', b'', b'\x02\x06', b''])
+        reader = SerialReader(fake, 0.002)
+        frames = []
+        done = threading.Event()
+        
+        def on_frame(frame):
+            frames.append((bytes(frame.data), frame.first_byte_ns, frame.last_byte_ns))
+            if len(frames) == 2:
+                done.set()
+        
+        reader.subscribe(on_frame)
+        reader.start()
+        self.assertTrue(done.wait(2))
+        reader.stop()
+        
+        self.assertEqual(frames[0][0], b'\x01\x03\x02\x00\x01\x79\x84')
+        self.assertEqual(frames[1][0], b'\x02\x06')
+        self.assertLessEqual(frames[0][1], frames[0][2])
+        self.assertEqual(fake.timeout, 0.002)
+    
+    def test_unsubscribe(self):
+        """測試取消訂閱"""
+        reader = SerialReader(FakeSerial(), 0.002)
+        callback = lambda frame: None
+        reader.subscribe(callback)
+        reader.unsubscribe(callback)
+        self.assertEqual(reader.subscribers, [])
+    
+    def test_read_error_stops_reader(self):
+        """測試讀取錯誤時停止接收並記錄錯誤"""
+        fake = FakeSerial()
+        fake.readinto = lambda buffer: (_ for _ in ()).throw(OSError("device removed"))
+        reader = SerialReader(fake, 0.002)
+        reader.start()
+        reader.thread.join(1)
+        
+        self.assertFalse(reader.running)
+        self.assertIsInstance(reader.error, OSError)
+
+
+class TestRS485TesterWithReader(unittest.TestCase):
+    """RS485Tester 背景接收整合測試"""
+    
+    def setUp(self):
+        self.fake = FakeSerial()
+        with patch('serial_utils.serial.Serial', return_value=self.fake):
+            self.tester = RS485Tester("COM1", baudrate=115200, timeout=0.5)
+        self.tester.start_reader()
+    
+    def tearDown(self):
+        with patch('builtins.print'):
+            self.tester.close()
+    
+    def test_transact_uses_reader(self):
+        """測試交易由背景接收取得回應"""
+        self.fake.replies.append(b'\x01\x03\x02\x00\x01\x79\x84')
+        
+        with patch('builtins.print'):
+            result = self.tester.transact("01 03 00 00 00 01 84 0A")
+        
+        self.assertEqual(result, b'\x01\x03\x02\x00\x01\x79\x84')
+        self.assertEqual(self.fake.written, [bytes.fromhex("010300000001840A")])
+    
+    def test_exchange_records_timestamps(self):
+        """測試交易記錄寫入與接收時間戳並計算延遲"""
+        self.fake.replies.append(b'\x01\x03\x02\x00\x01\x79\x84')
+        
+        with patch('builtins.print'):
+            transaction = self.tester.exchange("01 03 00 00 00 01 84 0A")
+        
+        self.assertTrue(transaction.success)
+        self.assertLessEqual(transaction.write_start_ns, transaction.write_done_ns)
+        self.assertLessEqual(transaction.write_done_ns, transaction.first_byte_ns)
+        self.assertLessEqual(transaction.first_byte_ns, transaction.last_byte_ns)
+        self.assertGreater(transaction.latency_ms, 0)
+        self.assertGreaterEqual(transaction.turnaround_ms, 0)
+    
+    def test_exchange_unmatched_reply(self):
+        """測試其他從站的回應標記為未配對"""
+        self.fake.replies.append(b'\x02\x03\x02\x00\x01\x3D\x84')
+        
+        with patch('builtins.print'):
+            transaction = self.tester.exchange("01 03 00 00 00 01 84 0A")
+        
+        self.assertEqual(transaction.status, "未配對回應")
+        self.assertEqual(transaction.response, b'\x02\x03\x02\x00\x01\x3D\x84')
+        self.assertEqual(self.tester.correlator.pending, {})
+    
+    def test_split_reply_reassembled(self):
+        """測試回應中間的空檔超過靜默間隔被切成兩段時，依預期長度合併"""
+        reply = b'\x01\x03\x04\x00\x01\x00\x02\x2A\x32'
+        self.fake.replies.append(reply[:4])
+        threading.Timer(0.05, self.fake.feed, args=(reply[4:],)).start()
+        
+        with patch('builtins.print'):
+            transaction = self.tester.exchange("01 03 00 00 00 02 C4 0B")
+        
+        self.assertEqual(transaction.status, "正常")
+        self.assertEqual(transaction.response, reply)
+        self.assertTrue(self.tester._frame_queue.empty())
+    
+    def test_frame_queue_bounded_and_copied(self):
+        """測試未被取走的訊框複製出環形緩衝區，佇列滿時丟棄最舊的訊框"""
+        buffer = bytearray(b'\x00\x00')
+        for index in range(RX_FRAME_QUEUE_SIZE + 10):
+            buffer[:] = bytes((index >> 8, index & 0xFF))
+            self.tester._enqueue_frame(ReceivedFrame(memoryview(buffer), index, index))
+        buffer[:] = b'\xFF\xFF'  # 模擬緩衝區繞回後被覆寫
+        
+        self.assertEqual(self.tester._frame_queue.qsize(), RX_FRAME_QUEUE_SIZE)
+        self.assertEqual(self.tester.rx_dropped, 10)
+        oldest = self.tester._frame_queue.get_nowait()
+        self.assertEqual(oldest.data, b'\x00\x0A')
+        self.assertIsInstance(oldest.data, bytes)
+    
+    def test_stale_frames_discarded_before_send(self):
+        """測試發送前丟棄延遲到達的訊框"""
+        self.fake.feed(b'\x09\x09\x09')
+        deadline = time.time() + 1
+        while self.tester._frame_queue.empty() and time.time() < deadline:
+            time.sleep(0.005)
+        
+        self.fake.replies.append(b'\x01\x06\x00\x01\x00\x01\x19\xCA')
+        with patch('builtins.print'):
+            result = self.tester.transact("01 06 00 01 00 01 19 CA")
+        
+        self.assertEqual(result, b'\x01\x06\x00\x01\x00\x01\x19\xCA')
+    
+    def test_receive_timeout_with_reader(self):
+        """測試背景接收模式下的逾時"""
+        with patch('builtins.print'):
+            result = self.tester.receive_frame()
+        self.assertEqual(result, b'')
+    
+    def test_exchange_timeout_override_keeps_silence_interval(self):
+        """測試背景接收模式下覆寫回應逾時不改變串口的靜默間隔逾時"""
+        self.assertEqual(self.fake.timeout, self.tester.silence_interval)
+        started = time.perf_counter()
+        with patch('builtins.print'):
+            transaction = self.tester.exchange("01 03 00 00 00 01 84 0A", timeout=0.05)
+        
+        self.assertEqual(transaction.status, "無回應")
+        self.assertLess(time.perf_counter() - started, 0.4)
+        self.assertEqual(self.fake.timeout, self.tester.silence_interval)
+        self.assertEqual(self.tester.timeout, 0.5)
+        
+        self.fake.replies.append(b'\x01\x03\x02\x00\x01\x79\x84')
+        with patch('builtins.print'):
+            self.assertTrue(self.tester.exchange("01 03 00 00 00 01 84 0A").success)
+    
+    def test_stop_reader_restores_timeout(self):
+        """測試停止背景接收後恢復逾時設定"""
+        self.tester.stop_reader()
+        self.assertIsNone(self.tester.reader)
+        self.assertEqual(self.fake.timeout, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
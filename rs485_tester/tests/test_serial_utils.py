@@ -3,18 +3,19 @@
 serial_utils.py 單元測試
 """
 import unittest
-from unittest.mock import Mock, patch, mock_open, MagicMock
+from unittest.mock import Mock, patch, mock_open, MagicMock, call
 import io
+import time
 import datetime
 from test_config import *
 
 try:
-    from ..serial_utils import RS485Tester, list_available_ports
+    from ..serial_utils import RS485Tester, list_available_ports, calc_char_time, calc_silence_interval
 except ImportError:
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-    from serial_utils import RS485Tester, list_available_ports
+    from serial_utils import RS485Tester, list_available_ports, calc_char_time, calc_silence_interval
 
 
 class TestRS485Tester(unittest.TestCase):
@@ -85,6 +86,17 @@ class TestRS485Tester(unittest.TestCase):
             mock_print.assert_called()
             mock_log.assert_called()
     
+    def test_send_bytes(self):
+        """測試位元組介面直接送出 bytes 與 buffer"""
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message') as mock_log:
+            
+            sent = self.tester.send(memoryview(b'\x01\x03\x00\x00'))
+        
+        self.assertEqual(sent, b'\x01\x03\x00\x00')
+        self.mock_serial_instance.write.assert_called_with(b'\x01\x03\x00\x00')
+        mock_log.assert_called_with("[送出] 01 03 00 00")
+    
     def test_send_hex_invalid(self):
         """測試發送無效的十六進位資料"""
         hex_str = "ZZ"
@@ -199,29 +211,35 @@ class TestRS485Tester(unittest.TestCase):
     
     @patch('serial_utils.time.sleep')
     def test_send_hex_timing(self, mock_sleep):
-        """測試發送資料的時間延遲"""
+        """測試發送資料依實際傳輸時間排程，不使用固定延遲"""
         hex_str = "01 03"
         
         with patch('builtins.print'), \
              patch.object(self.tester, '_log_message'):
             
+            before = time.perf_counter()
             self.tester.send_hex(hex_str)
             
-            # 驗證延遲調用
-            mock_sleep.assert_called_with(0.1)
+            # 9600 8N1: 2 位元組傳輸時間 + 3.5 字元間隔
+            expected = before + (2 + 3.5) * 10 / 9600
+            self.assertAlmostEqual(self.tester.bus_timer.bus_free_at, expected, delta=0.01)
+            self.assertNotIn(call(0.1), mock_sleep.call_args_list)
     
     @patch('serial_utils.time.sleep')
     def test_receive_response_timing(self, mock_sleep):
-        """測試接收資料的時間延遲"""
+        """測試接收資料後套用裝置轉換延遲，不使用固定延遲"""
         self.mock_serial_instance.read.return_value = b'\x01\x03'
+        self.tester.set_turnaround_delay(0x01, 0.05)
         
         with patch('builtins.print'), \
              patch.object(self.tester, '_log_message'):
             
+            self.tester.send_hex("01 03")
+            before = time.perf_counter()
             self.tester.receive_response()
             
-            # 驗證延遲調用
-            mock_sleep.assert_called_with(0.1)
+            self.assertGreaterEqual(self.tester.bus_timer.bus_free_at, before + 0.05)
+            self.assertNotIn(call(0.1), mock_sleep.call_args_list)
     
     def test_hex_formatting_in_receive(self):
         """測試接收資料的十六進位格式化"""
@@ -236,6 +254,205 @@ class TestRS485Tester(unittest.TestCase):
             # 驗證十六進位格式化（大寫，空格分隔）
             expected_hex = "01 03 02 00 01 79 84"
             mock_log.assert_called_with(f"[接收] {expected_hex}")
+    
+    def test_receive_frame_ends_on_silence(self):
+        """測試訊框於線路靜默時結束"""
+        self.mock_serial_instance.in_waiting = 0
+        self.mock_serial_instance.read.side_effect = [b'\x01', b'\x03', b'\x02\x00\x01\x79\x84', b'']
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message') as mock_log:
+            
+            result = self.tester.receive_frame()
+            
+            self.assertEqual(result, b'\x01\x03\x02\x00\x01\x79\x84')
+            mock_log.assert_called_with("[接收] 01 03 02 00 01 79 84")
+        
+        # 讀取結束後恢復原本的逾時設定
+        self.assertEqual(self.mock_serial_instance.timeout, self.tester.timeout)
+    
+    def test_receive_frame_reads_waiting_bytes(self):
+        """測試一次讀取緩衝區中已到達的位元組"""
+        self.mock_serial_instance.in_waiting = 6
+        self.mock_serial_instance.read.side_effect = [b'\x01', b'\x03\x02\x00\x01\x79\x84', b'']
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message'):
+            
+            self.tester.receive_frame()
+        
+        self.mock_serial_instance.read.assert_any_call(6)
+    
+    def test_receive_frame_longer_than_64_bytes(self):
+        """測試接收超過 64 位元組的長訊框"""
+        payload = bytes(range(200))
+        self.mock_serial_instance.in_waiting = 0
+        self.mock_serial_instance.read.side_effect = [payload[i:i + 1] for i in range(len(payload))] + [b'']
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message'):
+            
+            result = self.tester.receive_frame()
+        
+        self.assertEqual(result, payload)
+    
+    def test_receive_frame_no_data(self):
+        """測試訊框接收逾時"""
+        self.mock_serial_instance.read.return_value = b''
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message') as mock_log:
+            
+            result = self.tester.receive_frame()
+            
+            self.assertEqual(result, b'')
+            mock_log.assert_called_with("[接收] 無回應（可能逾時）")
+    
+    def test_receive_frame_invalid_max_bytes(self):
+        """測試無效的最大接收位元組數"""
+        with self.assertRaises(ValueError):
+            self.tester.receive_frame(max_bytes=0)
+    
+    def test_transact_reads_expected_length(self):
+        """測試依請求推算長度讀取回應"""
+        self.mock_serial_instance.read.side_effect = [b'\x01\x03', b'\x02\x00\x01\x79\x84']
+        
+        with patch('builtins.print'), \
+             patch('serial_utils.time.sleep'), \
+             patch.object(self.tester, '_log_message'):
+            
+            result = self.tester.transact("01 03 00 00 00 01 84 0A")
+        
+        self.assertEqual(result, b'\x01\x03\x02\x00\x01\x79\x84')
+        self.mock_serial_instance.read.assert_called_with(5)
+        self.assertEqual(self.tester.last_frame_status, "正常")
+    
+    def test_exchange_broadcast_skips_receive(self):
+        """測試廣播不進入接收階段且不記為逾時"""
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message'):
+            
+            transaction = self.tester.exchange("00 06 00 01 00 01 18 1B")
+            response = self.tester.receive_response()
+        
+        self.mock_serial_instance.read.assert_not_called()
+        self.assertEqual(transaction.status, "廣播")
+        self.assertEqual(response, b'')
+        self.assertEqual(self.tester.correlator.pending, {})
+        self.assertEqual(self.tester.tuner.profiles, {})
+        # 下一筆請求需等待廣播轉換延遲
+        self.assertGreaterEqual(self.tester.bus_timer.bus_free_at - time.perf_counter(), 0.05)
+    
+    def test_exchange_timeout_override(self):
+        """測試單筆請求覆寫回應逾時後還原"""
+        self.tester.timeout = self.mock_serial_instance.timeout = 1
+        timeouts = []
+        self.mock_serial_instance.read.side_effect = lambda size: timeouts.append(self.mock_serial_instance.timeout) or b''
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message'):
+            
+            transaction = self.tester.exchange("01 03 00 00 00 01 84 0A", timeout=0.03)
+        
+        self.assertEqual(transaction.status, "無回應")
+        self.assertEqual(timeouts, [0.03])
+        self.assertEqual(self.tester.timeout, 1)
+        self.assertEqual(self.mock_serial_instance.timeout, 1)
+        with self.assertRaises(ValueError):
+            self.tester.exchange("01 03 00 00 00 01 84 0A", timeout=0)
+    
+    def test_transact_flags_crc_error(self):
+        """測試回應 CRC 錯誤時標記並記錄"""
+        self.mock_serial_instance.read.side_effect = [b'\x01\x03', b'\x02\x00\x01\x79\x85']
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message') as mock_log:
+            
+            result = self.tester.transact("01 03 00 00 00 01 84 0A")
+        
+        self.assertEqual(result, b'\x01\x03\x02\x00\x01\x79\x85')
+        self.assertEqual(self.tester.last_frame_status, "CRC 錯誤")
+        mock_log.assert_called_with("[檢查] CRC 錯誤: 01 03 02 00 01 79 85")
+    
+    def test_transact_flags_truncated(self):
+        """測試回應長度不足時標記為不完整訊框"""
+        self.mock_serial_instance.read.side_effect = [b'\x01\x03', b'\x02\x00']
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message'):
+            
+            self.tester.transact("01 03 00 00 00 01 84 0A")
+        
+        self.assertEqual(self.tester.last_frame_status, "訊框不完整")
+    
+    def test_transact_exception_response(self):
+        """測試例外回應提前結束"""
+        self.mock_serial_instance.read.side_effect = [b'\x01\x83', b'\x02\xC0\xF1']
+        
+        with patch('builtins.print'), \
+             patch('serial_utils.time.sleep'), \
+             patch.object(self.tester, '_log_message'):
+            
+            result = self.tester.transact("01 03 00 00 00 0A C5 CD")
+        
+        self.assertEqual(result, b'\x01\x83\x02\xC0\xF1')
+        self.mock_serial_instance.read.assert_called_with(3)
+        self.assertEqual(self.tester.last_frame_status, "例外回應")
+    
+    def test_transact_unknown_length_uses_silence(self):
+        """測試無法推算長度時改用靜默判定"""
+        with patch('builtins.print'), \
+             patch('serial_utils.time.sleep'), \
+             patch.object(self.tester, '_log_message'), \
+             patch.object(self.tester, 'receive_frame', return_value=b'\x01\x2B') as mock_frame:
+            
+            result = self.tester.transact("01 2B")
+        
+        mock_frame.assert_called_once()
+        self.assertEqual(result, b'\x01\x2B')
+    
+    def test_timeout_raises_learned_turnaround(self):
+        """測試小請求逾時後調高該從站的轉換延遲"""
+        self.mock_serial_instance.read.return_value = b''
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message'):
+            
+            self.tester.transact("01 03 00 00 00 01 84 0A")
+        
+        self.assertGreater(self.tester.bus_timer.get_turnaround_delay(1), 0)
+        self.assertEqual(self.tester.tuner.profile(1).failures, 1)
+    
+    def test_receive_exact_no_data(self):
+        """測試依長度接收逾時"""
+        self.mock_serial_instance.read.return_value = b''
+        
+        with patch('builtins.print'), \
+             patch.object(self.tester, '_log_message') as mock_log:
+            
+            result = self.tester.receive_exact(7)
+            
+            self.assertEqual(result, b'')
+            mock_log.assert_called_with("[接收] 無回應（可能逾時）")
+
+
+class TestSilenceInterval(unittest.TestCase):
+    """訊框靜默時間計算測試類"""
+    
+    def test_char_time(self):
+        """測試字元時間計算 (8N1 為 10 位元)"""
+        self.assertAlmostEqual(calc_char_time(9600), 10 / 9600)
+        self.assertAlmostEqual(calc_char_time(9600, parity='E'), 11 / 9600)
+        self.assertAlmostEqual(calc_char_time(9600, stopbits=2), 11 / 9600)
+    
+    def test_silence_interval_low_baudrate(self):
+        """測試低波特率使用 3.5 字元時間"""
+        self.assertAlmostEqual(calc_silence_interval(9600), 3.5 * 10 / 9600)
+    
+    def test_silence_interval_high_baudrate(self):
+        """測試高波特率使用固定 1.75ms"""
+        self.assertAlmostEqual(calc_silence_interval(115200), 0.00175)
+        self.assertAlmostEqual(calc_silence_interval(38400), 0.00175)
 
 
 class TestListAvailablePorts(unittest.TestCase):
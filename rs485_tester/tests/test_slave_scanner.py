@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+slave_scanner.py 單元測試
+"""
+import unittest
+import time
+from test_config import *
+
+try:
+    from ..slave_scanner import SlaveScanner, ScanTarget, parse_id_range, probe_timeout
+    from ..bus_timing import BusTimer
+    from ..transaction import Transaction
+    from ..data_utils import ModbusCRC
+    from ..constants import (FRAME_OK, FRAME_EXCEPTION, FRAME_UNMATCHED, SCAN_CONFIRMED,
+                             SCAN_PROBE_MARGIN)
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from slave_scanner import SlaveScanner, ScanTarget, parse_id_range, probe_timeout
+    from bus_timing import BusTimer
+    from transaction import Transaction
+    from data_utils import ModbusCRC
+    from constants import (FRAME_OK, FRAME_EXCEPTION, FRAME_UNMATCHED, SCAN_CONFIRMED,
+                           SCAN_PROBE_MARGIN)
+
+
+def with_crc(data):
+    return data + ModbusCRC.to_bytes(ModbusCRC.calculate(data))
+
+
+class FakeBus:
+    """模擬匯流排：devices 為 {位址: 延遲秒數}，延遲超過逾時的回應由下一筆探測收到"""
+    
+    def __init__(self, devices, exceptions=()):
+        self.devices = devices
+        self.exceptions = set(exceptions)
+        self.late = None
+        self.timeouts = []
+    
+    def exchange(self, frame, timeout):
+        self.timeouts.append(timeout)
+        slave_id = frame[0]
+        transaction = Transaction(frame, (slave_id, frame[1]), 0, 0)
+        late, self.late = self.late, None
+        latency = self.devices.get(slave_id)
+        if latency is not None and latency <= timeout:
+            if slave_id in self.exceptions:
+                transaction.response = with_crc(bytes((slave_id, 0x83, 0x02)))
+                transaction.status = FRAME_EXCEPTION
+            else:
+                transaction.response = with_crc(bytes((slave_id, 0x03, 0x02, 0x00, 0x01)))
+                transaction.status = FRAME_OK
+            transaction.first_byte_ns = transaction.last_byte_ns = int(latency * 1e9)
+        elif latency is not None:
+            self.late = slave_id
+        if late is not None and not transaction.response:
+            transaction.response = with_crc(bytes((late, 0x03, 0x02, 0x00, 0x01)))
+            transaction.status = FRAME_UNMATCHED
+        return transaction
+
+
+class TestSlaveScanner(unittest.TestCase):
+    """SlaveScanner 測試類"""
+    
+    def setUp(self):
+        self.scanner = SlaveScanner()
+    
+    def _target(self, bus, name="COM1", probe=0.05):
+        return ScanTarget(name, bus.exchange, 1.0, probe, False)
+    
+    def test_finds_responders_and_exceptions(self):
+        """測試找到正常回應與例外回應的從站並以完整逾時確認"""
+        bus = FakeBus({3: 0.01, 10: 0.02}, exceptions={10})
+        results = self.scanner.scan_port(self._target(bus), range(1, 21))
+        
+        self.assertEqual([(r.slave_id, r.status) for r in results], [(3, SCAN_CONFIRMED), (10, SCAN_CONFIRMED)])
+        self.assertAlmostEqual(results[0].latency_ms, 10.0)
+        # 20 筆探測 + 2 筆確認，只有確認使用完整逾時
+        self.assertEqual(len(bus.timeouts), 22)
+        self.assertEqual(bus.timeouts[-2:], [1.0, 1.0])
+    
+    def test_probe_timeout_adapts_to_latency(self):
+        """測試找到從站後探測逾時依實測延遲調整"""
+        bus = FakeBus({1: 0.04})
+        self.scanner.scan_port(self._target(bus), range(1, 4))
+        self.assertAlmostEqual(bus.timeouts[1], 0.12)
+    
+    def test_late_reply_confirmed(self):
+        """測試逾時後才到達的回應在確認階段找到"""
+        bus = FakeBus({5: 0.2})
+        results = self.scanner.scan_port(self._target(bus), range(1, 10))
+        self.assertEqual([r.slave_id for r in results], [5])
+        self.assertTrue(results[0].confirmed)
+    
+    def test_parallel_ports(self):
+        """測試多個連線同時掃描並彙整裝置清單"""
+        class SlowBus(FakeBus):
+            def exchange(self, frame, timeout):
+                time.sleep(0.005)
+                return super().exchange(frame, timeout)
+        
+        buses = [SlowBus({1: 0.01}), SlowBus({2: 0.01}), SlowBus({})]
+        targets = [self._target(bus, f"COM{i}") for i, bus in enumerate(buses)]
+        started = time.perf_counter()
+        inventory, errors, elapsed_ms = self.scanner.scan(targets, range(1, 21))
+        
+        self.assertLess(time.perf_counter() - started, 0.25)
+        self.assertEqual([(r.name, r.slave_id) for r in inventory], [("COM0", 1), ("COM1", 2)])
+        self.assertEqual(errors, {})
+        self.assertIn("COM1", SlaveScanner.format_inventory(inventory))
+    
+    def test_port_error_reported(self):
+        """測試單一連線錯誤不影響其他連線"""
+        def broken(frame, timeout):
+            raise ConnectionError("串口中斷")
+        targets = [ScanTarget("bad", broken, 1.0, 0.05, False), self._target(FakeBus({1: 0.01}))]
+        inventory, errors, _ = self.scanner.scan(targets, [1])
+        self.assertEqual(len(inventory), 1)
+        self.assertEqual(errors, {"bad": "串口中斷"})
+    
+    def test_probe_frames(self):
+        """測試 RTU 與 Modbus TCP 探測請求"""
+        self.assertEqual(self.scanner.probe_frame(1).hex().upper(), "010300000001840A")
+        frame = self.scanner.probe_frame(1, mbap=True)
+        self.assertEqual(frame[2:].hex().upper(), "000000060103" + "00000001")
+        self.assertNotEqual(self.scanner.probe_frame(1, mbap=True)[:2], frame[:2])
+
+
+class TestScanHelpers(unittest.TestCase):
+    """掃描輔助函式測試類"""
+    
+    def test_parse_id_range(self):
+        """測試解析位址範圍"""
+        self.assertEqual(parse_id_range("01-03, 0A"), [1, 2, 3, 10])
+        self.assertEqual(len(parse_id_range("01-F7")), 247)
+        for text in ("", "00-05", "01-F8", "ZZ"):
+            with self.assertRaises(ValueError):
+                parse_id_range(text)
+    
+    def test_probe_timeout_from_baudrate(self):
+        """測試探測逾時遠小於預設逾時且隨波特率縮短"""
+        slow = probe_timeout(BusTimer(9600))
+        fast = probe_timeout(BusTimer(115200))
+        self.assertAlmostEqual(slow, 15 * 10 / 9600 + 7 * 10 / 9600 + SCAN_PROBE_MARGIN)
+        self.assertLess(fast, slow)
+        self.assertLess(slow, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+transaction.py 單元測試
+"""
+import unittest
+from test_config import *
+
+try:
+    from ..transaction import Transaction, TransactionCorrelator, is_mbap_frame
+    from ..data_utils import ModbusCRC
+    from ..constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from transaction import Transaction, TransactionCorrelator, is_mbap_frame
+    from data_utils import ModbusCRC
+    from constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+
+
+REQUEST = bytes.fromhex("010300000001840A")
+RESPONSE = bytes.fromhex("01030200017984")
+
+
+class TestTransaction(unittest.TestCase):
+    """Transaction 測試類"""
+    
+    def test_latency_and_turnaround(self):
+        """測試延遲與轉換時間由時間戳計算"""
+        transaction = Transaction(REQUEST, (1, 3), 1_000_000, 1_200_000, tx_time_ns=8_000_000)
+        transaction.first_byte_ns = 12_000_000
+        transaction.last_byte_ns = 19_000_000
+        
+        self.assertEqual(transaction.latency_ms, 18.0)
+        # write() 提早返回，轉換時間以寫入開始 + 傳送時間為基準
+        self.assertEqual(transaction.turnaround_ms, 3.0)
+    
+    def test_unanswered(self):
+        """測試未收到回應時沒有延遲數值"""
+        transaction = Transaction(REQUEST, (1, 3), 0, 0)
+        self.assertFalse(transaction.answered)
+        self.assertIsNone(transaction.latency_ms)
+        self.assertIsNone(transaction.turnaround_ms)
+        self.assertEqual(transaction.status, FRAME_NO_RESPONSE)
+
+
+class TestTransactionCorrelator(unittest.TestCase):
+    """TransactionCorrelator 測試類"""
+    
+    def test_match_by_slave_and_function(self):
+        """測試依從站位址與功能碼配對"""
+        correlator = TransactionCorrelator()
+        first = correlator.begin(REQUEST, 0, 0)
+        second = correlator.begin(bytes.fromhex("020300000001840A"), 0, 0)
+        
+        matched = correlator.match(bytes.fromhex("02030200017984"), 5, 6)
+        self.assertIs(matched, second)
+        matched = correlator.match(RESPONSE, 7, 8, 7)
+        self.assertIs(matched, first)
+        self.assertEqual(first.status, FRAME_OK)
+        self.assertEqual((first.first_byte_ns, first.last_byte_ns), (7, 8))
+        self.assertEqual(correlator.pending, {})
+    
+    def test_exception_response_matches_request(self):
+        """測試例外回應配對到原功能碼"""
+        correlator = TransactionCorrelator()
+        transaction = correlator.begin(REQUEST, 0, 0)
+        self.assertIs(correlator.match(bytes.fromhex("018302C0F1"), 1, 2), transaction)
+        self.assertEqual(transaction.status, FRAME_EXCEPTION)
+    
+    def test_corrupted_reply_attributed_to_single_pending(self):
+        """測試唯一等待中的請求承接 CRC 錯誤的回應"""
+        correlator = TransactionCorrelator()
+        transaction = correlator.begin(REQUEST, 0, 0)
+        self.assertIs(correlator.match(bytes.fromhex("05030200017984"), 1, 2, 7), transaction)
+        self.assertEqual(transaction.status, FRAME_CRC_ERROR)
+    
+    def test_unmatched_reply(self):
+        """測試其他從站的有效回應不會配對"""
+        correlator = TransactionCorrelator()
+        correlator.begin(REQUEST, 0, 0)
+        other = bytes.fromhex("0203020001")
+        other += ModbusCRC.to_bytes(ModbusCRC.calculate(other))
+        self.assertIsNone(correlator.match(other, 1, 2))
+        self.assertEqual(correlator.unmatched, 1)
+        self.assertEqual(len(correlator.pending), 1)
+    
+    def test_match_by_transaction_id(self):
+        """測試 MBAP 依交易 ID 配對"""
+        correlator = TransactionCorrelator(mbap=True)
+        first = correlator.begin(bytes.fromhex("000100000006010300000001"), 0, 0)
+        second = correlator.begin(bytes.fromhex("000200000006010300000001"), 0, 0)
+        
+        self.assertIs(correlator.match(bytes.fromhex("00020000000501030200FF"), 1, 2), second)
+        self.assertIs(correlator.match(bytes.fromhex("000100000003018302"), 3, 4), first)
+        self.assertEqual(second.status, FRAME_OK)
+        self.assertEqual(first.status, FRAME_EXCEPTION)
+    
+    def test_expire(self):
+        """測試移除逾時的請求"""
+        correlator = TransactionCorrelator()
+        old = correlator.begin(REQUEST, 0, 0)
+        correlator.begin(bytes.fromhex("020300000001840A"), 900, 900)
+        
+        self.assertEqual(correlator.expire(500, now_ns=1000), [old])
+        self.assertEqual(len(correlator.pending), 1)
+    
+    def test_is_mbap_frame(self):
+        """測試 MBAP 訊框判斷"""
+        self.assertTrue(is_mbap_frame(bytes.fromhex("000100000006010300000001")))
+        self.assertFalse(is_mbap_frame(REQUEST))
+
+
+if __name__ == '__main__':
+    unittest.main()
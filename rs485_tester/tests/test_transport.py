@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+transport.py 單元測試
+"""
+import unittest
+from test_config import *
+
+try:
+    from ..transport import Transport, TransportError, to_bytes, format_bytes
+    from ..serial_utils import RS485Tester
+    from ..connection_manager import TCPConnection
+except ImportError:
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from transport import Transport, TransportError, to_bytes, format_bytes
+    from serial_utils import RS485Tester
+    from connection_manager import TCPConnection
+
+
+class TestTransport(unittest.TestCase):
+    """Transport 介面測試類"""
+    
+    def test_to_bytes(self):
+        """測試十六進位字串與 buffer 轉為 bytes"""
+        self.assertEqual(to_bytes("01 03 00 00"), b'\x01\x03\x00\x00')
+        self.assertEqual(to_bytes(bytearray(b'\x01\x03')), b'\x01\x03')
+        self.assertEqual(to_bytes(memoryview(b'\x00\x01\x02')[1:]), b'\x01\x02')
+        data = b'\x01\x03'
+        self.assertIs(to_bytes(data), data)
+        for invalid in ("ZZ", "", b''):
+            with self.assertRaises(ValueError):
+                to_bytes(invalid)
+    
+    def test_format_bytes(self):
+        """測試日誌顯示格式"""
+        self.assertEqual(format_bytes(b'\x01\xab'), "01 AB")
+    
+    def test_connections_share_interface(self):
+        """測試串口與 TCP 連線實作相同介面，傳輸錯誤仍為 ConnectionError"""
+        self.assertTrue(issubclass(RS485Tester, Transport))
+        self.assertTrue(issubclass(TCPConnection, Transport))
+        self.assertTrue(issubclass(TransportError, ConnectionError))
+
+
+if __name__ == '__main__':
+    unittest.main()
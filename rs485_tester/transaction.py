@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+請求/回應配對模組
+
+RTU 依 (從站位址, 功能碼) 配對，Modbus TCP (MBAP) 依交易 ID 配對；
+各階段時間戳皆為 time.perf_counter_ns()，用於計算實際延遲與匯流排轉換時間。
+"""
+import time
+try:
+    from .constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+    from .constants import FRAME_BROADCAST, MODBUS_BROADCAST_ADDRESS
+    from .data_utils import ModbusPacketAnalyzer, ModbusCRC
+except ImportError:
+    from constants import FRAME_OK, FRAME_CRC_ERROR, FRAME_TRUNCATED, FRAME_EXCEPTION, FRAME_NO_RESPONSE
+    from constants import FRAME_BROADCAST, MODBUS_BROADCAST_ADDRESS
+    from data_utils import ModbusPacketAnalyzer, ModbusCRC
+
+
+def is_mbap_frame(frame):
+    """檢查是否為 Modbus TCP 訊框：協定 ID 為 0 且長度欄位與實際長度相符"""
+    return (len(frame) >= 8 and frame[2] == 0 and frame[3] == 0
+            and ((frame[4] << 8) | frame[5]) == len(frame) - 6)
+
+
+def is_broadcast_request(frame):
+    """檢查是否為 RTU 廣播請求 (從站位址 0)，從站不會回應"""
+    return len(frame) >= 2 and frame[0] == MODBUS_BROADCAST_ADDRESS
+
+
+def broadcast_transaction(request, write_start_ns, write_done_ns, tx_time_ns=0):
+    """建立已送出的廣播紀錄：不等待回應，也不視為逾時"""
+    transaction = Transaction(request, None, write_start_ns, write_done_ns, tx_time_ns)
+    transaction.status = FRAME_BROADCAST
+    return transaction
+
+
+class Transaction:
+    """一筆請求與其回應 (或逾時) 的紀錄"""
+    
+    __slots__ = ('request', 'response', 'key', 'write_start_ns', 'write_done_ns', 'tx_time_ns',
+                 'first_byte_ns', 'last_byte_ns', 'status')
+    
+    def __init__(self, request, key, write_start_ns, write_done_ns, tx_time_ns=0):
+        self.request = request
+        self.response = b''
+        self.key = key
+        self.write_start_ns = write_start_ns
+        self.write_done_ns = write_done_ns
+        self.tx_time_ns = tx_time_ns
+        self.first_byte_ns = None
+        self.last_byte_ns = None
+        self.status = FRAME_NO_RESPONSE
+    
+    @property
+    def slave_id(self):
+        """請求的從站位址 (MBAP 為單元 ID)"""
+        if isinstance(self.key, tuple):
+            return self.key[0]
+        if is_mbap_frame(self.request):
+            return self.request[6]
+        return self.request[0] if self.request else None
+    
+    @property
+    def answered(self):
+        return self.last_byte_ns is not None
+    
+    @property
+    def success(self):
+        return self.status == FRAME_OK
+    
+    @property
+    def latency_ms(self):
+        """請求開始寫入到收到最後一個位元組 (毫秒)，未收到回應時為 None"""
+        if self.last_byte_ns is None:
+            return None
+        return (self.last_byte_ns - self.write_start_ns) / 1e6
+    
+    @property
+    def turnaround_ms(self):
+        """請求最後一個位元組送出到回應第一個位元組 (毫秒)，即裝置的處理/轉換時間
+        
+        串口 write() 可能在資料仍在傳送緩衝區時就返回，因此以傳送時間補足。
+        """
+        if self.first_byte_ns is None:
+            return None
+        tx_end_ns = max(self.write_done_ns, self.write_start_ns + self.tx_time_ns)
+        return max(self.first_byte_ns - tx_end_ns, 0) / 1e6
+
+
+class TransactionCorrelator:
+    """將收到的回應與等待中的請求配對"""
+    
+    def __init__(self, mbap=False):
+        self.mbap = mbap
+        self.pending = {}
+        self.unmatched = 0
+        self._transaction_id = 0
+    
+    def key_for(self, frame):
+        """取得配對鍵：MBAP 為交易 ID，RTU 為 (從站位址, 功能碼去除例外位元)"""
+        if self.mbap:
+            return (frame[0] << 8) | frame[1]
+        return (frame[0], frame[1] & 0x7F)
+    
+    def frame_mbap(self, request):
+        """將 RTU 請求 (可含 CRC) 包裝為 MBAP 訊框並配發交易 ID；已是 MBAP 訊框時原樣回傳
+        
+        交易 ID 16 位元循環遞增，略過仍在等待回應的 ID。
+        """
+        if is_mbap_frame(request):
+            return request
+        adu = request[:-2] if ModbusCRC.check(request) else request
+        if len(adu) < 2:
+            raise ValueError("請求封包長度不足")
+        for _ in range(0x10000):
+            self._transaction_id = (self._transaction_id + 1) & 0xFFFF
+            if self._transaction_id not in self.pending:
+                break
+        else:
+            raise ValueError("沒有可用的交易 ID")
+        return self._transaction_id.to_bytes(2, 'big') + b'\x00\x00' + len(adu).to_bytes(2, 'big') + adu
+    
+    def begin(self, request, write_start_ns, write_done_ns, tx_time_ns=0):
+        """登記已送出的請求，同一配對鍵的舊請求視為已逾時而被取代"""
+        if len(request) < 2:
+            raise ValueError("請求封包長度不足，無法配對")
+        transaction = Transaction(request, self.key_for(request), write_start_ns, write_done_ns, tx_time_ns)
+        self.pending[transaction.key] = transaction
+        return transaction
+    
+    def match(self, response, first_byte_ns, last_byte_ns, expected_length=None):
+        """配對回應並填入時間戳與訊框狀態，找不到對應請求時回傳 None"""
+        if self.mbap:
+            if len(response) < 8:
+                self.unmatched += 1
+                return None
+            status = FRAME_EXCEPTION if response[7] & 0x80 else FRAME_OK
+        else:
+            status = ModbusPacketAnalyzer.validate_frame(response, expected_length)
+        
+        transaction = self.pending.pop(self.key_for(response), None) if len(response) >= 2 else None
+        if transaction is None and len(self.pending) == 1 and status in (FRAME_CRC_ERROR, FRAME_TRUNCATED):
+            # 損壞訊框的位址/功能碼不可信；半雙工匯流排上只有一筆等待中的請求時仍歸屬於它
+            transaction = self.pending.popitem()[1]
+        if transaction is None:
+            self.unmatched += 1
+            return None
+        
+        transaction.response = response
+        transaction.first_byte_ns = first_byte_ns
+        transaction.last_byte_ns = last_byte_ns
+        transaction.status = status
+        return transaction
+    
+    def cancel(self, transaction):
+        """放棄等待 (逾時)，回應若之後才到達將被視為未配對"""
+        if self.pending.get(transaction.key) is transaction:
+            del self.pending[transaction.key]
+    
+    def expire(self, timeout_ns, now_ns=None):
+        """移除等待超過 timeout_ns 的請求並回傳"""
+        if now_ns is None:
+            now_ns = time.perf_counter_ns()
+        expired = [t for t in self.pending.values() if now_ns - t.write_start_ns > timeout_ns]
+        for transaction in expired:
+            del self.pending[transaction.key]
+        return expired
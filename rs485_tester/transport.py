@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+連線傳輸介面
+
+串口 (RS485Tester) 與 TCP (TCPConnection) 共用的位元組介面：請求與回應一律是
+bytes (或任何支援 buffer 協定的物件)，十六進位字串只在使用者輸入與日誌顯示時轉換。
+逾時不是錯誤，而是狀態為 FRAME_NO_RESPONSE 的 Transaction；串口或 Socket 失敗
+則拋出 TransportError (ConnectionError 的子類別，既有的錯誤處理不需修改)。
+"""
+
+
+class TransportError(ConnectionError):
+    """串口或 Socket 層的傳輸錯誤"""
+
+
+def to_bytes(data):
+    """將請求轉為 bytes：十六進位字串 (使用者輸入) 只在此轉換一次，其餘 buffer 直接複製"""
+    if isinstance(data, str):
+        try:
+            data = bytes.fromhex(data.replace(" ", ""))
+        except ValueError as e:
+            raise ValueError(f"無效的十六進位字串: {e}")
+    elif not isinstance(data, bytes):
+        data = bytes(data)
+    if not data:
+        raise ValueError("發送資料不能為空")
+    return data
+
+
+def format_bytes(data):
+    """日誌顯示用的十六進位文字"""
+    return bytes(data).hex(' ').upper()
+
+
+class Transport:
+    """連線傳輸介面
+    
+    send(data): 送出位元組，回傳實際送出的 bytes
+    receive(timeout=None): 接收一個訊框，逾時回傳 b''
+    exchange(request, timeout=None): 送出請求並配對回應，回傳 Transaction
+    timeout 為 None 時使用連線本身的回應逾時 (self.timeout)。
+    """
+    
+    timeout = None
+    
+    def send(self, data):
+        raise NotImplementedError
+    
+    def receive(self, timeout=None):
+        raise NotImplementedError
+    
+    def exchange(self, request, timeout=None):
+        raise NotImplementedError
+    
+    def close(self):
+        raise NotImplementedError
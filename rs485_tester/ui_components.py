@@ -4,10 +4,11 @@ UI 組件模組
 """
 import tkinter as tk
 from tkinter import ttk, scrolledtext
+from collections import deque
 try:
-    from .constants import THEMES, AUTO_ANALYSIS_DELAY
+    from .constants import THEMES, AUTO_ANALYSIS_DELAY, LOG_FLUSH_INTERVAL, MAX_PENDING_LOG_LINES
 except ImportError:
-    from constants import THEMES, AUTO_ANALYSIS_DELAY
+    from constants import THEMES, AUTO_ANALYSIS_DELAY, LOG_FLUSH_INTERVAL, MAX_PENDING_LOG_LINES
 
 
 class ThemeManager:
@@ -89,6 +90,38 @@ class LogManager:
             del self.log_boxes[name]
 
 
+class BufferedLogWriter:
+    """跨線程批次日誌寫入器: 背景線程只加入佇列，由 UI 線程定期一次寫入"""
+    
+    def __init__(self, root, log_manager, tab_id, interval=LOG_FLUSH_INTERVAL, max_lines=MAX_PENDING_LOG_LINES):
+        self.root = root
+        self.log_manager = log_manager
+        self.tab_id = tab_id
+        self.interval = interval
+        self.pending = deque(maxlen=max_lines)
+        self.active = True
+        self.root.after(self.interval, self._flush)
+        
+    def write(self, message):
+        """加入一行日誌 (可於任意線程呼叫)"""
+        self.pending.append(message)
+        
+    def stop(self):
+        """停止定期寫入"""
+        self.active = False
+        
+    def _flush(self):
+        """將累積的日誌一次寫入分頁"""
+        if not self.active:
+            return
+        if self.pending:
+            lines = []
+            while self.pending:
+                lines.append(self.pending.popleft())
+            self.log_manager.add_log("\n".join(lines), self.tab_id)
+        self.root.after(self.interval, self._flush)
+
+
 class StatusBar:
     """狀態列組件"""
     